@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Cargar variables de entorno desde el archivo .env
@@ -94,9 +95,34 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Esperar el bloqueo de escritura en lugar de fallar cuando varios procesos escriben a la vez
+        'OPTIONS': {'timeout': 20},
+        # Base de pruebas en archivo (no en memoria compartida) para poder probar escrituras concurrentes
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
+# La caché 'rankings' guarda los tokens de versión de las listas ordenadas de profesores
+# (profesores/rankings.py) y debe ser común a todos los procesos del servidor (workers web,
+# moderate_reviews, comandos), así una invalidación hecha en un proceso la ven los demás. Con
+# varios servidores conviene un backend común a todos (Redis, Memcached o la base de datos).
+# La caché por defecto sigue siendo la de Django, en memoria de cada proceso.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'rankings': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('RANKINGS_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'rankings')),
+    },
+}
+if sys.argv[1:2] == ['test']:
+    # Las pruebas no comparten tokens con la carpeta del desarrollador ni entre corridas
+    CACHES['rankings'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rankings',
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -143,6 +169,83 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login/'
 
-
-
-
+# Número máximo de gráficas renderizadas que se guardan en memoria por proceso
+CHART_CACHE_MAX_ENTRIES = int(os.getenv('CHART_CACHE_MAX_ENTRIES', '256'))
+
+# Hilos usados por ChartFactory.create_charts para dibujar varias gráficas en paralelo
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '4'))
+
+# Segundos que el navegador puede reutilizar una gráfica cuya URL incluye la versión de los datos
+CHART_MAX_AGE = int(os.getenv('CHART_MAX_AGE', '86400'))
+
+# 'servidor': las gráficas se generan como PNG con matplotlib.
+# 'cliente': las páginas reciben los datos en JSON y el navegador dibuja las gráficas.
+CHART_RENDER_MODE = os.getenv('CHART_RENDER_MODE', 'servidor')
+
+# matplotlib y openai se importan la primera vez que se usan. En los workers web se
+# puede activar la precarga en AppConfig.ready() para no pagarla en la primera petición.
+PRECARGAR_DEPENDENCIAS = os.getenv('PRECARGAR_DEPENDENCIAS', 'False') == 'True'
+
+# Profesores por página en la lista (paginación por cursor)
+PROFESORES_POR_PAGINA = int(os.getenv('PROFESORES_POR_PAGINA', '24'))
+
+# Puntaje bayesiano de la recomendación 'balanced': cada profesor parte de PESO reseñas
+# ficticias con calificación MEDIA, así que con pocas reseñas su puntaje se acerca a la media
+# y con muchas a su propio promedio. MEDIA debería ser la media global del sitio (la reporta
+# reconcile_stats); después de cambiar estos valores, reconcile_stats reescribe los puntajes.
+PUNTAJE_BAYESIANO_MEDIA = float(os.getenv('PUNTAJE_BAYESIANO_MEDIA', '3.0'))
+PUNTAJE_BAYESIANO_PESO = int(os.getenv('PUNTAJE_BAYESIANO_PESO', '3'))  # Debe ser mayor que 0
+
+# Segundos entre recargas completas del índice de autocompletado, que refrescan los pesos
+# (numcomentarios) y recogen los cambios hechos desde otros procesos
+AUTOCOMPLETADO_REFRESCO = int(os.getenv('AUTOCOMPLETADO_REFRESCO', '300'))
+
+# Segundos que un proceso reutiliza una lista ordenada de profesores (rankings.py) aunque su
+# token no haya cambiado; acota el tiempo con datos viejos si una invalidación no llega
+RANKINGS_REFRESCO = int(os.getenv('RANKINGS_REFRESCO', '300'))
+
+# Archivo con el modelo de filtrado colaborativo (orden "Recomendados para ti").
+# Lo genera el comando train_recommendations; mientras no exista se usa el orden balanceado.
+RECOMENDACIONES_MODELO = os.getenv('RECOMENDACIONES_MODELO', str(BASE_DIR / 'recomendaciones.npz'))
+
+# Profesores similares que se muestran en la página de cada profesor (de los que guarda
+# el comando build_similar_profesores)
+PROFESORES_SIMILARES = int(os.getenv('PROFESORES_SIMILARES', '5'))
+
+# Moderación de reseñas (review/moderacion.py). Con MODERACION_ASINCRONA las reseñas se guardan
+# pendientes y las revisa el comando moderate_reviews en otro proceso, sin bloquear la petición.
+MODERACION_ASINCRONA = os.getenv('MODERACION_ASINCRONA', 'True') == 'True'
+# Reseñas que un worker revisa a la vez. Con lotes, las llamadas simultáneas a la API son
+# unas MODERACION_CONCURRENCIA / MODERACION_LOTE_TAMANO
+MODERACION_CONCURRENCIA = int(os.getenv('MODERACION_CONCURRENCIA', '20'))
+MODERACION_MAX_INTENTOS = int(os.getenv('MODERACION_MAX_INTENTOS', '5'))
+# Segundos que un worker tiene para terminar una tarea antes de que otro la retome
+MODERACION_PLAZO = int(os.getenv('MODERACION_PLAZO', '120'))
+# Espera antes del primer reintento, en segundos; se duplica en cada intento
+MODERACION_REINTENTO_BASE = int(os.getenv('MODERACION_REINTENTO_BASE', '30'))
+# Caché de veredictos de moderación por contenido (CacheVeredictos en review/aprobadores.py)
+MODERACION_CACHE = os.getenv('MODERACION_CACHE', 'True') == 'True'
+MODERACION_CACHE_TTL = int(os.getenv('MODERACION_CACHE_TTL', str(30 * 24 * 3600)))
+MODERACION_CACHE_MAXIMO = int(os.getenv('MODERACION_CACHE_MAXIMO', '100000'))
+# Reseñas por llamada a la API (AprobadorPorLotes; 1 desactiva los lotes) y segundos que
+# se espera a que se junten
+MODERACION_LOTE_TAMANO = int(os.getenv('MODERACION_LOTE_TAMANO', '10'))
+MODERACION_LOTE_VENTANA = float(os.getenv('MODERACION_LOTE_VENTANA', '0.05'))
+# Filtro léxico previo a la IA (review/lexico.py): rechaza las reseñas con términos de la lista
+# 'bloquear' y, con MODERACION_LEXICO_APROBAR, aprueba las que no tienen ninguna coincidencia,
+# miden hasta MODERACION_LEXICO_MAX_CARACTERES y no traen enlaces. Una ruta vacía lo desactiva
+MODERACION_LEXICO = os.getenv('MODERACION_LEXICO', os.path.join(BASE_DIR, 'review', 'lexico_moderacion.txt'))
+MODERACION_LEXICO_APROBAR = os.getenv('MODERACION_LEXICO_APROBAR', 'True') == 'True'
+MODERACION_LEXICO_MAX_CARACTERES = int(os.getenv('MODERACION_LEXICO_MAX_CARACTERES', '600'))
+# Llamadas a la API de moderación (ProveedorResiliente): segundos por intento, plazo total de
+# la llamada con sus reintentos, reintentos y espera base (con jitter) antes del primero
+MODERACION_API_TIMEOUT = float(os.getenv('MODERACION_API_TIMEOUT', '15'))
+MODERACION_API_PLAZO = float(os.getenv('MODERACION_API_PLAZO', '30'))
+MODERACION_API_REINTENTOS = int(os.getenv('MODERACION_API_REINTENTOS', '2'))
+MODERACION_API_ESPERA = float(os.getenv('MODERACION_API_ESPERA', '0.5'))
+# Intentos fallidos seguidos que abren el circuito y segundos que permanece abierto
+MODERACION_CIRCUITO_UMBRAL = int(os.getenv('MODERACION_CIRCUITO_UMBRAL', '5'))
+MODERACION_CIRCUITO_ENFRIAMIENTO = float(os.getenv('MODERACION_CIRCUITO_ENFRIAMIENTO', '30'))
+# Qué hacer mientras la API no está disponible: 'encolar' (la reseña queda pendiente y se
+# revisa más tarde), 'manual' (se aprueba) o 'lexico' (se decide con el léxico si se puede)
+MODERACION_DEGRADACION = os.getenv('MODERACION_DEGRADACION', 'encolar')
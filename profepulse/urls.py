@@ -12,7 +12,12 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', reviewViews.home, name='home'),
     path('profesores/', profesoresViews.lista_profesores, name='lista_profesores'),
+    path('autocompletar/', profesoresViews.autocompletar, name='autocompletar'),
     path('profesor/<int:profesor_id>/', profesoresViews.detalle_profesor, name='detalle_profesor'),
+    path('profesor/<int:profesor_id>/chart/<str:chart_type>.png', profesoresViews.grafica_profesor, name='grafica_profesor'),
+    path('materia/<int:materia_id>/chart/<str:chart_type>.png', profesoresViews.grafica_materia, name='grafica_materia'),
+    path('profesor/<int:profesor_id>/chart/<str:chart_type>.json', profesoresViews.datos_grafica_profesor, name='datos_grafica_profesor'),
+    path('materia/<int:materia_id>/chart/<str:chart_type>.json', profesoresViews.datos_grafica_materia, name='datos_grafica_materia'),
     path('profesor/<int:profesor_id>/comentar/', reviewViews.agregar_comentario, name='agregar_comentario'),
     path('agregarprofesor/', profesoresViews.upload_csv, name='agregar_profesor'),
     path('profile/<int:user_id>/', accountViews.user_profile, name='user_profile'),
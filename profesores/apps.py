@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ProfesoresConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'profesores'
+
+    def ready(self):
+        # matplotlib se importa de forma perezosa; con PRECARGAR_DEPENDENCIAS se
+        # calienta al arrancar el proceso para que la primera gráfica no pague ese costo.
+        if settings.PRECARGAR_DEPENDENCIAS:
+            from .chart_factory import precargar_matplotlib
+            precargar_matplotlib()
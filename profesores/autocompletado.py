@@ -0,0 +1,238 @@
+"""
+Autocompletado de profesores, departamentos y materias mientras se escribe.
+Las sugerencias salen de un índice en memoria del proceso: una lista ordenada con las
+palabras normalizadas (sin tildes, en minúsculas) de cada nombre, donde las palabras que
+empiezan por un prefijo forman un rango contiguo que se encuentra con bisect. Cada
+sugerencia pesa según su numcomentarios, así que las más reseñadas aparecen primero.
+
+Un prefijo corto o muy común ('a', 'garcia') abarca miles de palabras; para no ordenarlas
+en cada consulta, los prefijos con más de PREFIJO_AMPLIO candidatas guardan sus sugerencias
+ya ordenadas por peso (todas y por tipo) y la consulta se detiene al reunir el límite.
+
+El índice se carga completo la primera vez que se consulta. Después los signals de
+profesores/models.py actualizan solo las entradas de lo que cambió, al confirmarse la
+transacción. Los contadores de reseñas se actualizan con F() sin pasar por los signals,
+por eso el índice se recarga completo cada AUTOCOMPLETADO_REFRESCO segundos para refrescar
+los pesos (y para recoger los cambios hechos desde otros procesos).
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+
+from .busqueda import normalizar, terminos
+
+
+PREFIJO_AMPLIO = 256
+
+Sugerencia = namedtuple('Sugerencia', ['tipo', 'id', 'texto', 'peso', 'palabras'])
+
+
+class IndicePrefijos:
+    # Índice compartido por los hilos del proceso. Las consultas y los cambios toman el lock;
+    # la recarga completa construye un estado nuevo sin él y lo reemplaza al terminar.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._estado = None
+        self._cargado_en = None
+        self._recargando = False
+
+    def reiniciar(self):
+        # Descarta el índice; la próxima consulta lo vuelve a cargar
+        with self._lock:
+            self._estado = None
+            self._cargado_en = None
+
+    def cargar(self):
+        from .models import Profesor, Materia
+
+        estado = _Estado()
+        for pk, nombre, departamento, peso in Profesor.objects.values_list(
+            'pk', 'nombre', 'departamento', 'numcomentarios'
+        ):
+            estado.sugerencias[('profesor', pk)] = _sugerencia('profesor', pk, nombre, peso)
+            estado.asignar_departamento(pk, departamento, peso)
+        for pk, nombre, peso in Materia.objects.values_list('pk', 'nombre', 'numcomentarios'):
+            estado.sugerencias[('materia', pk)] = _sugerencia('materia', pk, nombre, peso)
+        for clave in list(estado.departamentos):
+            estado.sugerencias[('departamento', clave)] = estado.sugerencia_departamento(clave)
+        estado.palabras = sorted(
+            (palabra, *clave) for clave, sugerencia in estado.sugerencias.items() for palabra in sugerencia.palabras
+        )
+        # Los prefijos de una letra son los más amplios y los primeros que se escriben
+        for letra in {palabra[0] for palabra, _, _ in estado.palabras}:
+            estado.candidatas(letra)
+        with self._lock:
+            self._estado = estado
+            self._cargado_en = time.monotonic()
+
+    def buscar(self, texto, limite=8, tipos=None):
+        # Sugerencias cuyas palabras empiezan por cada término del texto, de mayor a menor peso.
+        consulta = terminos(texto)
+        if not consulta:
+            return []
+        self._cargar_si_hace_falta()
+        # El rango del término más largo es el más corto; los demás términos se comprueban después
+        prefijo = max(consulta, key=len)
+        # Con un solo tipo se recorren solo las sugerencias de ese tipo
+        tipo = next(iter(tipos)) if tipos is not None and len(tipos) == 1 else None
+        encontradas = []
+        with self._lock:
+            for orden in self._estado.candidatas(prefijo, tipo):
+                sugerencia = self._estado.sugerencias[orden[2:]]
+                if tipos is not None and sugerencia.tipo not in tipos:
+                    continue
+                if all(any(palabra.startswith(termino) for palabra in sugerencia.palabras) for termino in consulta):
+                    encontradas.append(sugerencia)
+                    if len(encontradas) == limite:
+                        break
+        return encontradas
+
+    def actualizar_profesores(self, profesor_ids):
+        # Vuelve a leer los profesores indicados; los que ya no existen salen del índice.
+        # Se rehacen los departamentos que tenían y los que tienen ahora.
+        from .models import Profesor
+
+        if self._estado is None:
+            return
+        filas = {
+            pk: (nombre, departamento, peso)
+            for pk, nombre, departamento, peso in Profesor.objects.filter(pk__in=profesor_ids).values_list(
+                'pk', 'nombre', 'departamento', 'numcomentarios'
+            )
+        }
+        with self._lock:
+            estado = self._estado
+            if estado is None:
+                return
+            departamentos = set()
+            for pk in profesor_ids:
+                departamentos.add(estado.quitar_departamento(pk))
+                nombre, departamento, peso = filas.get(pk, (None, None, 0))
+                estado.reemplazar(('profesor', pk), nombre and _sugerencia('profesor', pk, nombre, peso))
+                if nombre is not None:
+                    departamentos.add(estado.asignar_departamento(pk, departamento, peso))
+            for clave in departamentos - {None}:
+                estado.reemplazar(('departamento', clave), estado.sugerencia_departamento(clave))
+
+    def actualizar_materias(self, materia_ids):
+        from .models import Materia
+
+        if self._estado is None:
+            return
+        filas = {
+            pk: (nombre, peso)
+            for pk, nombre, peso in Materia.objects.filter(pk__in=materia_ids).values_list('pk', 'nombre', 'numcomentarios')
+        }
+        with self._lock:
+            estado = self._estado
+            if estado is None:
+                return
+            for pk in materia_ids:
+                nombre, peso = filas.get(pk, (None, 0))
+                estado.reemplazar(('materia', pk), nombre and _sugerencia('materia', pk, nombre, peso))
+
+    def _cargar_si_hace_falta(self):
+        # La primera carga bloquea la consulta; las recargas las hace un solo hilo mientras
+        # los demás siguen respondiendo con el estado anterior.
+        with self._lock:
+            if self._estado is not None:
+                vencido = time.monotonic() - self._cargado_en > settings.AUTOCOMPLETADO_REFRESCO
+                if not vencido or self._recargando:
+                    return
+            self._recargando = True
+        try:
+            self.cargar()
+        finally:
+            self._recargando = False
+
+
+class _Estado:
+    # Palabras ordenadas (palabra, tipo, id) y, por (tipo, id), la sugerencia que se muestra.
+
+    def __init__(self):
+        self.palabras = []
+        self.sugerencias = {}
+        # Por (tipo o None, prefijo amplio), sus sugerencias como (-peso, texto, tipo, id) ordenadas
+        self.por_prefijo = {}
+        # Departamento (normalizado) de cada profesor, para rehacer el que deja al cambiar
+        self.departamento_de = {}
+        self.departamentos = {}
+
+    def candidatas(self, prefijo, tipo=None):
+        if (tipo, prefijo) in self.por_prefijo:
+            return self.por_prefijo[(tipo, prefijo)]
+        desde = bisect_left(self.palabras, (prefijo,))
+        hasta = bisect_left(self.palabras, (prefijo + '\uffff',), lo=desde)
+        claves = {(t, pk) for _, t, pk in self.palabras[desde:hasta] if tipo is None or t == tipo}
+        ordenadas = sorted(_orden(self.sugerencias[clave]) for clave in claves)
+        if hasta - desde > PREFIJO_AMPLIO:
+            self.por_prefijo[(tipo, prefijo)] = ordenadas
+        return ordenadas
+
+    def reemplazar(self, clave, sugerencia):
+        # Cambia una sugerencia en la lista de palabras y en los prefijos amplios; None la elimina
+        anterior = self.sugerencias.pop(clave, None)
+        if anterior is not None:
+            for palabra in anterior.palabras:
+                del self.palabras[bisect_left(self.palabras, (palabra, *clave))]
+            orden = _orden(anterior)
+            for clave_prefijo in self._prefijos_amplios(anterior):
+                ordenadas = self.por_prefijo[clave_prefijo]
+                del ordenadas[bisect_left(ordenadas, orden)]
+        if sugerencia:
+            self.sugerencias[clave] = sugerencia
+            for palabra in sugerencia.palabras:
+                insort(self.palabras, (palabra, *clave))
+            orden = _orden(sugerencia)
+            for clave_prefijo in self._prefijos_amplios(sugerencia):
+                insort(self.por_prefijo[clave_prefijo], orden)
+
+    def _prefijos_amplios(self, sugerencia):
+        # Una sugerencia aparece una sola vez por prefijo aunque varias de sus palabras lo compartan
+        return {
+            (tipo, palabra[:n])
+            for palabra in sugerencia.palabras
+            for n in range(1, len(palabra) + 1)
+            for tipo in (None, sugerencia.tipo)
+        } & self.por_prefijo.keys()
+
+    def asignar_departamento(self, profesor_id, texto, peso):
+        # Departamentos escritos con otras tildes o mayúsculas cuentan como el mismo
+        clave = normalizar(texto).strip()
+        if not clave:
+            return None
+        self.departamento_de[profesor_id] = clave
+        self.departamentos.setdefault(clave, {})[profesor_id] = (texto, peso)
+        return clave
+
+    def quitar_departamento(self, profesor_id):
+        clave = self.departamento_de.pop(profesor_id, None)
+        if clave is not None:
+            self.departamentos[clave].pop(profesor_id)
+        return clave
+
+    def sugerencia_departamento(self, clave):
+        # Se muestra como lo escribió el primer profesor y pesa la suma de sus profesores
+        profesores = self.departamentos.get(clave)
+        if not profesores:
+            self.departamentos.pop(clave, None)
+            return None
+        texto = profesores[min(profesores)][0]
+        return _sugerencia('departamento', clave, texto, sum(peso for _, peso in profesores.values()))
+
+
+def _sugerencia(tipo, pk, texto, peso):
+    return Sugerencia(tipo, pk, texto, peso, frozenset(terminos(texto)))
+
+
+def _orden(sugerencia):
+    # De mayor a menor peso y, con el mismo peso, por texto
+    return (-sugerencia.peso, sugerencia.texto, sugerencia.tipo, sugerencia.id)
+
+
+indice = IndicePrefijos()
@@ -0,0 +1,104 @@
+"""
+Búsqueda de profesores por nombre, departamento y materias, sin distinguir tildes.
+En SQLite con FTS5 se usa una tabla virtual (profesores_busqueda_fts) con el tokenizador
+unicode61 remove_diacritics, que responde con índice invertido.
+En otras bases de datos, o si SQLite no trae FTS5, se busca sobre Profesor.texto_busqueda,
+una columna con los mismos textos en minúsculas y sin tildes.
+
+Los signals de profesores/models.py mantienen ambos índices al guardar profesores y
+materias o al cambiar las materias de un profesor.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+TABLA_FTS = 'profesores_busqueda_fts'
+
+# Si existe la tabla FTS, por base de datos (la de pruebas es otra)
+_fts_disponible = {}
+
+
+def normalizar(texto):
+    # Minúsculas y sin tildes: 'García' -> 'garcia'
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def terminos(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+def fts_disponible():
+    # Se consulta una sola vez por proceso si existe la tabla FTS (la crea la migración)
+    nombre = connection.settings_dict['NAME']
+    if nombre not in _fts_disponible:
+        _fts_disponible[nombre] = (
+            connection.vendor == 'sqlite'
+            and TABLA_FTS in connection.introspection.table_names()
+        )
+    return _fts_disponible[nombre]
+
+
+def filtrar(queryset, nombre='', materia='', departamento=''):
+    # Restringe el queryset de profesores a los que coinciden con todos los términos.
+    # No cambia el orden, así que se combina con cualquier estrategia de RecommendationEngine.
+    campos = {'nombre': nombre, 'materias': materia, 'departamento': departamento}
+    if not any(terminos(texto) for texto in campos.values()):
+        return queryset
+    if fts_disponible():
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', (_consulta_fts(campos),)
+        ))
+    condicion = Q()
+    for texto in campos.values():
+        for termino in terminos(texto):
+            condicion &= Q(texto_busqueda__contains=termino)
+    return queryset.filter(condicion)
+
+
+def _consulta_fts(campos):
+    # {'nombre': 'jose gar'} -> 'nombre : ("jose"* "gar"*)'; cada término se busca como prefijo
+    partes = []
+    for columna, texto in campos.items():
+        frases = ' '.join(f'"{termino}"*' for termino in terminos(texto))
+        if frases:
+            partes.append(f'{columna} : ({frases})')
+    return ' AND '.join(partes)
+
+
+def indexar_profesores(profesor_ids):
+    # Recalcula texto_busqueda y las filas FTS de los profesores indicados.
+    # Los ids que ya no existen se eliminan del índice.
+    from .models import Profesor
+
+    profesor_ids = set(profesor_ids)
+    if not profesor_ids:
+        return
+    materias = {}
+    relaciones = Profesor.materias.through.objects.filter(profesor_id__in=profesor_ids)
+    for profesor_id, nombre in relaciones.values_list('profesor_id', 'materia__nombre').order_by('materia__nombre'):
+        materias.setdefault(profesor_id, []).append(nombre)
+
+    profesores = list(Profesor.objects.filter(pk__in=profesor_ids).only('nombre', 'departamento'))
+    for profesor in profesores:
+        profesor.texto_busqueda = normalizar(
+            ' '.join([profesor.nombre, profesor.departamento, *materias.get(profesor.pk, [])])
+        )
+    Profesor.objects.bulk_update(profesores, ['texto_busqueda'])
+
+    if fts_disponible():
+        with connection.cursor() as cursor:
+            marcadores = ', '.join(['%s'] * len(profesor_ids))
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcadores})', list(profesor_ids))
+            cursor.executemany(
+                f'INSERT INTO {TABLA_FTS} (rowid, nombre, departamento, materias) VALUES (%s, %s, %s, %s)',
+                [
+                    (profesor.pk, profesor.nombre, profesor.departamento, ' '.join(materias.get(profesor.pk, [])))
+                    for profesor in profesores
+                ],
+            )
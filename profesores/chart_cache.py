@@ -0,0 +1,86 @@
+# profesores/chart_cache.py
+"""
+Caché de renderizado delante de ChartFactory.
+Evita volver a ejecutar matplotlib cuando los datos de una gráfica no han cambiado.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .chart_factory import ChartFactory
+
+
+class ChartRenderCache:
+    # Caché LRU acotada de gráficas ya generadas, guardadas como bytes PNG.
+    # La llave combina el tipo de gráfica con una huella de la entrada:
+    # profesor/materia, filtros aplicados y versión de los datos. Como los signals
+    # de Comentario incrementan la versión, una imagen vieja nunca vuelve a servirse.
+
+    def __init__(self, max_entries=None):
+        # Por defecto, el límite de settings.CHART_CACHE_MAX_ENTRIES
+        self.max_entries = settings.CHART_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(chart_type, **fingerprint):
+        # Los valores se ordenan por nombre para que la llave no dependa del orden de los argumentos.
+        return (chart_type,) + tuple(sorted(fingerprint.items()))
+
+    def get_or_create(self, chart_type, data, **fingerprint):
+        # Retorna los bytes PNG de la gráfica cacheada o la genera con ChartFactory.
+        # `data` puede ser un callable para no consultar la base de datos si hay acierto.
+        return self.get_or_create_many({chart_type: (chart_type, data, fingerprint)})[chart_type]
+
+    def get_or_create_many(self, batch):
+        # Versión por lotes: `batch` es {clave: (tipo, datos, huella)}.
+        # Las gráficas que no están en caché se generan en paralelo con ChartFactory.create_charts.
+        resultados = {}
+        faltantes = {}
+        with self._lock:
+            for clave, (chart_type, data, fingerprint) in batch.items():
+                key = self.make_key(chart_type, **fingerprint)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    resultados[clave] = self._entries[key]
+                else:
+                    self.misses += 1
+                    faltantes[clave] = (key, chart_type, data)
+
+        if not faltantes:
+            return resultados
+
+        generadas = ChartFactory.create_charts({
+            clave: (chart_type, data() if callable(data) else data)
+            for clave, (_, chart_type, data) in faltantes.items()
+        }, png=True)
+
+        with self._lock:
+            for clave, (key, _, _) in faltantes.items():
+                chart = generadas[clave]
+                resultados[clave] = chart
+                # Las gráficas vacías o fallidas no se guardan para no fijar un error en la caché.
+                if chart is not None:
+                    self._entries[key] = chart
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return resultados
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Instancia compartida por las vistas del proceso
+chart_cache = ChartRenderCache()
@@ -5,173 +5,238 @@ Centraliza la lógica de creación de diferentes tipos de gráficas estadística
 """
 
 from abc import ABC, abstractmethod
-import matplotlib
-import matplotlib.pyplot as plt
 import io
 import base64
-from collections import Counter, defaultdict
-import numpy as np
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from django.conf import settings
 
-# Configurar matplotlib para trabajar sin entorno gráfico
-matplotlib.use('Agg')
+
+logger = logging.getLogger(__name__)
+
+
+def _matplotlib():
+    # matplotlib se importa la primera vez que se dibuja una gráfica, no al cargar el módulo,
+    # para que los procesos que nunca grafican (comandos, modo cliente) no paguen la importación.
+    # API orientada a objetos de matplotlib: cada llamada usa su propia Figure y su
+    # propio canvas Agg, sin el estado global de pyplot, así que es segura entre hilos.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    return Figure, FigureCanvasAgg
+
+
+def precargar_matplotlib():
+    # Calentamiento opcional (ver AppConfig.ready): importa matplotlib y dibuja una figura
+    # vacía para que la caché de fuentes quede lista antes de la primera petición.
+    Figure, FigureCanvasAgg = _matplotlib()
+    figure = Figure(figsize=(1, 1))
+    FigureCanvasAgg(figure)
+    figure.savefig(io.BytesIO(), format='png')
 
 
 class ChartGenerator(ABC):
     # Clase base abstracta para generadores de gráficas.
     # Define la interfaz común para todos los tipos de gráficas.
+    # La generación se divide en dos pasos: prepare (puede consultar la base de datos,
+    # se ejecuta en el hilo de la petición) y draw (solo matplotlib, puede ir en otro hilo).
+
+    figsize = (10, 6)
+
+    @abstractmethod
+    def prepare(self, data):
+        # Convierte los datos de entrada en las series a dibujar.
+        # Retorna None si no hay nada que graficar.
+        pass
 
-    
     @abstractmethod
+    def draw(self, figure, series):
+        # Dibuja las series preparadas sobre la figura recibida.
+        pass
+
+    @abstractmethod
+    def payload(self, series):
+        # Representa las series como un diccionario compacto serializable a JSON,
+        # para que el navegador dibuje la gráfica sin pasar por matplotlib.
+        pass
+
+    def render(self, series):
+        # Dibuja las series y retorna la imagen en base64.
+        return base64.b64encode(self.render_png(series)).decode('utf-8')
+
+    def render_png(self, series):
+        # Dibuja las series en una figura propia de esta llamada y retorna los bytes PNG.
+        Figure, FigureCanvasAgg = _matplotlib()
+        figure = Figure(figsize=self.figsize)
+        FigureCanvasAgg(figure)
+        self.draw(figure, series)
+        return self.to_png(figure)
+
     def generate(self, data):
         # Genera una gráfica específica basada en los datos proporcionados.
-        
-        pass
-    
-    def to_base64(self, plt_figure):
-        # Método común para convertir una figura de matplotlib a base64.
+        series = self.prepare(data)
+        if series is None:
+            return None
+        return self.render(series)
+
+    def to_png(self, figure):
+        # Método común para convertir una figura de matplotlib a bytes PNG.
         buffer = io.BytesIO()
-        plt_figure.savefig(buffer, format='png', bbox_inches='tight')
-        buffer.seek(0)
+        figure.savefig(buffer, format='png', bbox_inches='tight')
         image_png = buffer.getvalue()
         buffer.close()
-        plt.close()
-        return base64.b64encode(image_png).decode('utf-8')
+        return image_png
+    
+    def to_base64(self, figure):
+        # Método común para convertir una figura de matplotlib a base64.
+        return base64.b64encode(self.to_png(figure)).decode('utf-8')
 
 
 class BarChartGenerator(ChartGenerator):
     # Muestra la frecuencia de cada calificación (1-5 estrellas).
+    # Recibe las tuplas (rating, cantidad) de review.agregaciones.conteo_ratings.
+
+    figsize = (12, 6)
     
-    
-    def generate(self, ratings):
-        if not ratings:
+    def prepare(self, conteos):
+        if not conteos:
             return None
-            
-        counts = dict(Counter(ratings))
+        counts = dict(conteos)
+        return [counts.get(label, 0) for label in range(1, 6)]
+
+    def draw(self, figure, values):
         labels = list(range(1, 6))
-        values = [counts.get(label, 0) for label in labels]
-        
-        plt.figure(figsize=(12, 6))
-        plt.bar(labels, values, color='skyblue', edgecolor='black', width=0.8)
-        plt.xlabel('Calificación', fontsize=14, fontweight='bold')
-        plt.ylabel('Frecuencia', fontsize=14, fontweight='bold')
-        plt.xticks(labels, fontsize=12)
+        ax = figure.subplots()
+        ax.bar(labels, values, color='skyblue', edgecolor='black', width=0.8)
+        ax.set_xlabel('Calificación', fontsize=14, fontweight='bold')
+        ax.set_ylabel('Frecuencia', fontsize=14, fontweight='bold')
+        ax.set_xticks(labels)
         
-        max_y = max(counts.values()) if counts else 1
-        plt.yticks(range(0, int(max_y) + 2), fontsize=12)
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        
-        return self.to_base64(plt)
+        max_y = max(values) if values else 1
+        ax.set_yticks(range(0, int(max_y) + 2))
+        ax.tick_params(labelsize=12)
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    def payload(self, values):
+        return {'labels': list(range(1, 6)), 'values': values}
+
+
+def _series_por_semestre(promedios):
+    # Separa las tuplas (fecha, promedio, cantidad) en los ejes de la gráfica
+    semestres_ordenados = [fecha for fecha, _, _ in promedios]
+    calificaciones_promedio = [promedio for _, promedio, _ in promedios]
+    return semestres_ordenados, calificaciones_promedio
 
 
 class LineChartGenerator(ChartGenerator):
 
     # Muestra cómo varía la calificación promedio a lo largo de los semestres.
+    # Recibe las tuplas (fecha, promedio, cantidad) de review.agregaciones.promedios_por_semestre.
 
+    figsize = (10, 5)
     
-    def generate(self, comentarios):
-        if not comentarios or not comentarios.exists():
+    def prepare(self, promedios):
+        if not promedios:
             return None
-            
-        # Agrupar calificaciones por semestre
-        calificaciones_por_semestre = defaultdict(list)
-        for comentario in comentarios:
-            calificaciones_por_semestre[comentario.fecha].append(comentario.rating)
-        
-        # Calcular el promedio por semestre
-        semestres_ordenados = sorted(calificaciones_por_semestre.keys())
-        calificaciones_promedio = [
-            sum(calificaciones_por_semestre[semestre]) / len(calificaciones_por_semestre[semestre])
-            for semestre in semestres_ordenados
-        ]
-        
-        plt.figure(figsize=(10, 5))
-        plt.plot(semestres_ordenados, calificaciones_promedio, marker='o', linestyle='-', color='blue')
-        plt.xlabel('Semestre', fontsize=12)
-        plt.ylabel('Rating Promedio', fontsize=12)
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.xticks(rotation=45)
-        
-        return self.to_base64(plt)
+        return _series_por_semestre(promedios)
+
+    def draw(self, figure, series):
+        semestres_ordenados, calificaciones_promedio = series
+        ax = figure.subplots()
+        ax.plot(semestres_ordenados, calificaciones_promedio, marker='o', linestyle='-', color='blue')
+        ax.set_xlabel('Semestre', fontsize=12)
+        ax.set_ylabel('Rating Promedio', fontsize=12)
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+        ax.tick_params(axis='x', labelrotation=45)
+
+    def payload(self, series):
+        semestres_ordenados, calificaciones_promedio = series
+        return {'labels': semestres_ordenados, 'values': [round(v, 2) for v in calificaciones_promedio]}
 
 
 class ScatterChartGenerator(ChartGenerator):
     # El tamaño de cada punto representa el número de reseñas.
+    # Recibe las tuplas (nombre, promedio, cantidad) de review.agregaciones.promedios_por_profesor.
     
-    def generate(self, profesores_data):
-        if not profesores_data or not profesores_data.exists():
+    def prepare(self, profesores_data):
+        if not profesores_data:
             return None
-            
-        nombres = [prof.nombre for prof in profesores_data]
-        calificaciones = [prof.calificacion_promedio if prof.calificacion_promedio else 0 for prof in profesores_data]
-        num_reviews = [prof.num_reviews for prof in profesores_data]
-        
-        if not nombres:
-            return None
-        
-        plt.figure(figsize=(10, 6))
-        plt.scatter(nombres, calificaciones, s=[n * 10 for n in num_reviews], alpha=0.5)
-        plt.xlabel("Profesor", fontsize=12)
-        plt.ylabel("Calificación promedio", fontsize=12)
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        
-        return self.to_base64(plt)
+        return [(nombre, promedio if promedio else 0, cantidad) for nombre, promedio, cantidad in profesores_data]
+
+    def draw(self, figure, puntos):
+        nombres = [nombre for nombre, _, _ in puntos]
+        calificaciones = [calificacion for _, calificacion, _ in puntos]
+        num_reviews = [n for _, _, n in puntos]
+        posiciones = range(len(nombres))
+
+        ax = figure.subplots()
+        ax.scatter(posiciones, calificaciones, s=[n * 10 for n in num_reviews], alpha=0.5)
+        ax.set_xlabel("Profesor", fontsize=12)
+        ax.set_ylabel("Calificación promedio", fontsize=12)
+        ax.set_xticks(posiciones, nombres, rotation=45, ha='right')
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    def payload(self, puntos):
+        # Un punto por profesor: (nombre, promedio, cantidad de reseñas)
+        return {'points': [[nombre, round(calificacion, 2), n] for nombre, calificacion, n in puntos]}
 
 
 class FrequencyDistributionChartGenerator(ChartGenerator):
     # Generador de gráficas de distribución de frecuencias para materias.
+    # Recibe las tuplas (rating, cantidad) de review.agregaciones.conteo_ratings.
     
-    def generate(self, ratings):
-        if not ratings:
+    def prepare(self, conteos):
+        if not conteos:
             return None
-            
-        rating_counts = Counter(ratings)
-        ratings_list = [rating_counts.get(rating, 0) for rating in range(1, 6)]
-        
-        plt.figure(figsize=(10, 6))
-        plt.bar(range(1, 6), ratings_list, color='skyblue', edgecolor='black')
-        plt.xlabel("Rating", fontsize=12)
-        plt.ylabel("Frecuencia", fontsize=12)
-        plt.xticks(range(1, 6))
+        rating_counts = dict(conteos)
+        return [rating_counts.get(rating, 0) for rating in range(1, 6)]
+
+    def draw(self, figure, ratings_list):
+        ax = figure.subplots()
+        ax.bar(range(1, 6), ratings_list, color='skyblue', edgecolor='black')
+        ax.set_xlabel("Rating", fontsize=12)
+        ax.set_ylabel("Frecuencia", fontsize=12)
+        ax.set_xticks(range(1, 6))
         
         max_y = max(ratings_list) if ratings_list else 1
-        plt.yticks(np.arange(0, max_y + 2, 1))
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        
-        return self.to_base64(plt)
+        ax.set_yticks(range(0, int(max_y) + 2))
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    def payload(self, ratings_list):
+        return {'labels': list(range(1, 6)), 'values': ratings_list}
 
 
 class SemesterLineChartGenerator(ChartGenerator):
     # Generador de gráficas de líneas para evolución por semestre de materias.
+
+    figsize = (10, 5)
     
-    def generate(self, data):
-        comentarios = data.get('comentarios')
+    def prepare(self, data):
+        promedios = data.get('promedios')
         titulo = data.get('titulo', 'Promedio de Rating por Semestre')
         
-        if not comentarios or not comentarios.exists():
+        if not promedios:
             return None
-            
-        # Agrupar calificaciones por semestre
-        calificaciones_por_semestre = defaultdict(list)
-        for comentario in comentarios:
-            calificaciones_por_semestre[comentario.fecha].append(comentario.rating)
-        
-        # Calcular el promedio por semestre
-        semestres_ordenados = sorted(calificaciones_por_semestre.keys())
-        calificaciones_promedio = [
-            sum(calificaciones_por_semestre[semestre]) / len(calificaciones_por_semestre[semestre])
-            for semestre in semestres_ordenados
-        ]
-        
-        plt.figure(figsize=(10, 5))
-        plt.plot(semestres_ordenados, calificaciones_promedio, marker='o', linestyle='-', color='blue')
-        plt.xlabel('Semestre', fontsize=12)
-        plt.ylabel('Rating Promedio', fontsize=12)
-        plt.title(titulo, fontsize=14)
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.xticks(rotation=45)
-        
-        return self.to_base64(plt)
+        semestres_ordenados, calificaciones_promedio = _series_por_semestre(promedios)
+        return semestres_ordenados, calificaciones_promedio, titulo
+
+    def draw(self, figure, series):
+        semestres_ordenados, calificaciones_promedio, titulo = series
+        ax = figure.subplots()
+        ax.plot(semestres_ordenados, calificaciones_promedio, marker='o', linestyle='-', color='blue')
+        ax.set_xlabel('Semestre', fontsize=12)
+        ax.set_ylabel('Rating Promedio', fontsize=12)
+        ax.set_title(titulo, fontsize=14)
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+        ax.tick_params(axis='x', labelrotation=45)
+
+    def payload(self, series):
+        semestres_ordenados, calificaciones_promedio, titulo = series
+        return {
+            'labels': semestres_ordenados,
+            'values': [round(v, 2) for v in calificaciones_promedio],
+            'title': titulo,
+        }
 
 
 class ChartFactory:
@@ -185,23 +250,93 @@ class ChartFactory:
         'frequency': FrequencyDistributionChartGenerator,
         'semester_line': SemesterLineChartGenerator,
     }
+
+    _executor = None
+    _executor_lock = threading.Lock()
     
     @classmethod
     def create_chart(cls, chart_type, data):
         # Crea y genera una gráfica del tipo especificado.
         
-        generator_class = cls._generators.get(chart_type)
-        if not generator_class:
-            raise ValueError(f"Tipo de gráfica no soportado: {chart_type}. "
-                           f"Tipos disponibles: {list(cls._generators.keys())}")
+        generator = cls._get_generator(chart_type)
         
         try:
-            generator = generator_class()
             return generator.generate(data)
-        except Exception as e:
-            print(f"Error generando gráfica {chart_type}: {e}")
+        except Exception:
+            logger.exception("Error generando gráfica %s", chart_type)
             return None
     
+    @classmethod
+    def create_payload(cls, chart_type, data):
+        # Retorna los datos de la gráfica como JSON compacto en lugar de una imagen.
+        # Es la base del modo de renderizado en el cliente: no ejecuta matplotlib.
+        generator = cls._get_generator(chart_type)
+        series = generator.prepare(data)
+        if series is None:
+            return None
+        return {'type': chart_type, **generator.payload(series)}
+
+    @classmethod
+    def create_charts(cls, batch, png=False):
+        # Genera varias gráficas en paralelo.
+        # `batch` es un diccionario {clave: (tipo, datos)}; retorna {clave: gráfica}.
+        # Con png=True las gráficas se retornan como bytes PNG en lugar de base64.
+        # La preparación (consultas a la base de datos) ocurre en el hilo actual y
+        # solo el dibujo se reparte en el pool, así la latencia es la de la gráfica más lenta.
+        preparadas = {}
+        resultados = {}
+        for clave, (chart_type, data) in batch.items():
+            generator = cls._get_generator(chart_type)
+            try:
+                series = generator.prepare(data)
+            except Exception:
+                logger.exception("Error generando gráfica %s", chart_type)
+                series = None
+            if series is None:
+                resultados[clave] = None
+            else:
+                preparadas[clave] = (chart_type, generator, series)
+
+        futuros = {}
+        if len(preparadas) > 1:
+            # Una sola gráfica no justifica el salto a otro hilo
+            executor = cls._get_executor()
+            futuros = {
+                clave: executor.submit(generator.render_png if png else generator.render, series)
+                for clave, (_, generator, series) in preparadas.items()
+            }
+
+        for clave, (chart_type, generator, series) in preparadas.items():
+            try:
+                futuro = futuros.get(clave)
+                if futuro:
+                    resultados[clave] = futuro.result()
+                else:
+                    resultados[clave] = generator.render_png(series) if png else generator.render(series)
+            except Exception:
+                logger.exception("Error generando gráfica %s", chart_type)
+                resultados[clave] = None
+        return resultados
+
+    @classmethod
+    def _get_generator(cls, chart_type):
+        generator_class = cls._generators.get(chart_type)
+        if not generator_class:
+            raise ValueError(f"Tipo de gráfica no soportado: {chart_type}. "
+                           f"Tipos disponibles: {list(cls._generators.keys())}")
+        return generator_class()
+
+    @classmethod
+    def _get_executor(cls):
+        # Pool acotado y compartido, creado la primera vez que se necesita.
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CHART_RENDER_WORKERS', 4),
+                    thread_name_prefix='chart-render',
+                )
+            return cls._executor
+
     @classmethod
     def register_chart_type(cls, name, generator_class):
         # Permite registrar nuevos tipos de gráficas dinámicamente.
@@ -0,0 +1,159 @@
+"""
+Filtrado colaborativo: "estudiantes como tú también calificaron bien a...".
+El comando train_recommendations arma la matriz dispersa usuario x profesor con las
+reseñas aprobadas y la factoriza con ALS (mínimos cuadrados alternados) sobre los residuos
+de cada calificación respecto a la media global y al sesgo de su profesor. El resultado son
+vectores float32 de pocas dimensiones por usuario y por profesor, y un sesgo por profesor,
+guardados en un archivo .npz (settings.RECOMENDACIONES_MODELO).
+
+Para recomendar, el puntaje de cada profesor es sesgo + producto punto con el vector del
+usuario, calculado para todos los profesores con una sola multiplicación matriz-vector.
+Un usuario que no estaba en el entrenamiento no tiene vector (arranque en frío) y la
+estrategia personalizada usa el ranking bayesiano.
+
+numpy se importa solo al entrenar o al cargar el modelo, no al arrancar el proceso.
+"""
+
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+
+Modelo = namedtuple('Modelo', ['usuario_ids', 'profesor_ids', 'usuarios', 'profesores', 'sesgos'])
+
+_lock = threading.Lock()
+# (ruta, mtime) del archivo cargado y el modelo, para recargarlo si el comando lo reescribe
+_cargado = {'clave': None, 'modelo': None}
+
+
+def calificaciones():
+    # (usuario_id, profesor_id, rating) de las reseñas aprobadas; varias reseñas del mismo
+    # usuario al mismo profesor cuentan como una con su promedio
+    import numpy as np
+    from django.db.models import Avg
+    from review.models import Comentario
+
+    filas = (
+        Comentario.objects.filter(aprobado_por_ia=True)
+        .values_list('usuario_id', 'profesor_id')
+        .annotate(promedio=Avg('rating'))
+        .order_by()
+    )
+    datos = np.array(list(filas), dtype=np.float64).reshape(-1, 3)
+    return datos[:, 0].astype(np.int64), datos[:, 1].astype(np.int64), datos[:, 2]
+
+
+def entrenar(usuarios, profesores, ratings, factores=16, iteraciones=10, regularizacion=0.1, semilla=0):
+    # ALS con regularización L2 sobre los residuos r - media - sesgo del profesor.
+    # Recibe tres arreglos paralelos (una entrada por calificación) y retorna (Modelo, rmse).
+    import numpy as np
+
+    usuario_ids, fila = np.unique(usuarios, return_inverse=True)
+    profesor_ids, columna = np.unique(profesores, return_inverse=True)
+    media = ratings.mean()
+
+    # Sesgo de cada profesor: su desviación media, encogida hacia 0 si tiene pocas reseñas
+    cantidad = np.bincount(columna, minlength=len(profesor_ids))
+    sesgos = np.bincount(columna, weights=ratings - media, minlength=len(profesor_ids)) / (cantidad + 5.0)
+    residuos = ratings - media - sesgos[columna]
+
+    generador = np.random.default_rng(semilla)
+    U = generador.normal(0, 0.1, (len(usuario_ids), factores))
+    V = generador.normal(0, 0.1, (len(profesor_ids), factores))
+    por_usuario = _agrupar(fila, len(usuario_ids))
+    por_profesor = _agrupar(columna, len(profesor_ids))
+    for _ in range(iteraciones):
+        _resolver(U, V, por_usuario, columna, residuos, regularizacion)
+        _resolver(V, U, por_profesor, fila, residuos, regularizacion)
+
+    prediccion = media + sesgos[columna] + np.einsum('ij,ij->i', U[fila], V[columna])
+    rmse = float(np.sqrt(np.mean((prediccion - ratings) ** 2)))
+    modelo = Modelo(
+        usuario_ids, profesor_ids,
+        U.astype(np.float32), V.astype(np.float32), (media + sesgos).astype(np.float32),
+    )
+    return modelo, rmse
+
+
+def _agrupar(indices, cantidad):
+    # Posiciones de las calificaciones de cada fila (o columna), a la manera de una matriz CSR
+    import numpy as np
+
+    orden = np.argsort(indices, kind='stable')
+    cortes = np.searchsorted(indices[orden], np.arange(cantidad + 1))
+    return [orden[cortes[i]:cortes[i + 1]] for i in range(cantidad)]
+
+
+def _resolver(X, Y, grupos, otro_indice, residuos, regularizacion):
+    # Fija Y y resuelve cada fila de X por mínimos cuadrados regularizados:
+    # (Y_i^T Y_i + lambda * n_i * I) x = Y_i^T r_i
+    import numpy as np
+
+    identidad = np.eye(X.shape[1])
+    for i, posiciones in enumerate(grupos):
+        if len(posiciones) == 0:
+            continue
+        Yi = Y[otro_indice[posiciones]]
+        A = Yi.T @ Yi + regularizacion * len(posiciones) * identidad
+        X[i] = np.linalg.solve(A, Yi.T @ residuos[posiciones])
+
+
+def guardar(modelo, ruta=None):
+    # Escribe en un temporal y lo renombra: los procesos que leen nunca ven un archivo a medias
+    import numpy as np
+
+    ruta = str(ruta or settings.RECOMENDACIONES_MODELO)
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, temporal = tempfile.mkstemp(suffix='.npz', dir=directorio)
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            np.savez(archivo, **modelo._asdict())
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+
+def cargar():
+    # Modelo del archivo configurado, o None si todavía no se ha entrenado.
+    # Se vuelve a leer solo cuando cambia la fecha de modificación del archivo.
+    ruta = str(settings.RECOMENDACIONES_MODELO)
+    try:
+        clave = (ruta, os.stat(ruta).st_mtime_ns)
+    except OSError:
+        return None
+    with _lock:
+        if _cargado['clave'] != clave:
+            import numpy as np
+
+            with np.load(ruta) as datos:
+                _cargado['modelo'] = Modelo(**{campo: datos[campo] for campo in Modelo._fields})
+            _cargado['clave'] = clave
+        return _cargado['modelo']
+
+
+def recomendar(usuario_id, cantidad, excluir=()):
+    # Ids de los `cantidad` profesores con mayor puntaje para el usuario, sin los excluidos.
+    # Lista vacía si no hay modelo o el usuario no estaba en el entrenamiento.
+    import numpy as np
+
+    modelo = cargar()
+    if modelo is None or usuario_id is None:
+        return []
+    posicion = np.searchsorted(modelo.usuario_ids, usuario_id)
+    if posicion == len(modelo.usuario_ids) or modelo.usuario_ids[posicion] != usuario_id:
+        return []
+
+    puntajes = modelo.sesgos + modelo.profesores @ modelo.usuarios[posicion]
+    if excluir:
+        puntajes[np.isin(modelo.profesor_ids, list(excluir))] = -np.inf
+    cantidad = min(cantidad, len(puntajes))
+    if cantidad <= 0:
+        return []
+    # argpartition separa los mejores sin ordenar todo; solo esos se ordenan
+    mejores = np.argpartition(-puntajes, cantidad - 1)[:cantidad]
+    mejores = mejores[np.argsort(-puntajes[mejores], kind='stable')]
+    return [int(modelo.profesor_ids[i]) for i in mejores if np.isfinite(puntajes[i])]
@@ -0,0 +1,105 @@
+"""
+Mide el costo de arranque de un proceso de la aplicación: tiempo de django.setup(),
+memoria residente y las importaciones más pesadas (al estilo de python -X importtime).
+Sirve para detectar regresiones como volver a importar matplotlib u openai al arrancar.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Código que se ejecuta en un intérprete nuevo para medir un arranque en frío
+CODIGO_ARRANQUE = """
+import importlib, json, resource, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+for modulo in sys.argv[1:]:
+    importlib.import_module(modulo)
+fin = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup - inicio) * 1000,
+    'total_ms': (fin - inicio) * 1000,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modulos_pesados': {m: m in sys.modules for m in ('matplotlib', 'numpy', 'openai')},
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo y la memoria de arranque (django.setup) y las importaciones más costosas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Número de arranques en frío a medir (se reporta la mediana).')
+        parser.add_argument('--importar', nargs='*', default=['profepulse.urls'],
+                            help='Módulos a importar después de django.setup(), como lo haría un worker.')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Cantidad de importaciones más pesadas a mostrar.')
+        parser.add_argument('--limite-ms', type=float, default=None,
+                            help='Falla si la mediana del arranque supera este valor.')
+        parser.add_argument('--json', action='store_true', help='Imprime el reporte en JSON.')
+
+    def handle(self, *args, **options):
+        corridas = [self._medir(options['importar']) for _ in range(options['repeticiones'])]
+
+        reporte = {
+            'repeticiones': len(corridas),
+            'setup_ms': statistics.median(c['setup_ms'] for c in corridas),
+            'total_ms': statistics.median(c['total_ms'] for c in corridas),
+            'max_rss_kb': max(c['max_rss_kb'] for c in corridas),
+            'modulos_pesados': corridas[-1]['modulos_pesados'],
+            'importaciones': corridas[-1]['importaciones'][:options['top']],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2))
+        else:
+            self._imprimir(reporte)
+
+        limite = options['limite_ms']
+        if limite is not None and reporte['total_ms'] > limite:
+            raise CommandError(f"El arranque tardó {reporte['total_ms']:.1f} ms (límite {limite:.1f} ms).")
+
+    def _medir(self, modulos):
+        entorno = dict(os.environ)
+        entorno.setdefault('DJANGO_SETTINGS_MODULE', 'profepulse.settings')
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CODIGO_ARRANQUE, *modulos],
+            capture_output=True, text=True, env=entorno,
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+
+        resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+        resultado['importaciones'] = self._importaciones_pesadas(proceso.stderr)
+        return resultado
+
+    def _importaciones_pesadas(self, salida_importtime):
+        # Cada línea tiene la forma "import time: self [us] | cumulative | imported package".
+        # Solo se consideran los paquetes de primer nivel (sin sangría) para no contar dos veces.
+        importaciones = []
+        for linea in salida_importtime.splitlines():
+            if not linea.startswith('import time:') or 'cumulative' in linea:
+                continue
+            _, acumulado, paquete = linea[len('import time:'):].split('|')
+            if paquete.startswith('  '):
+                continue
+            importaciones.append({'modulo': paquete.strip(), 'acumulado_ms': int(acumulado) / 1000})
+        return sorted(importaciones, key=lambda i: i['acumulado_ms'], reverse=True)
+
+    def _imprimir(self, reporte):
+        self.stdout.write(f"django.setup(): {reporte['setup_ms']:.1f} ms")
+        self.stdout.write(f"Arranque total: {reporte['total_ms']:.1f} ms (mediana de {reporte['repeticiones']})")
+        self.stdout.write(f"Memoria residente máxima: {reporte['max_rss_kb'] / 1024:.1f} MB")
+        cargados = [m for m, cargado in reporte['modulos_pesados'].items() if cargado]
+        self.stdout.write(f"Módulos pesados cargados al arrancar: {', '.join(cargados) or 'ninguno'}")
+        self.stdout.write('Importaciones más costosas:')
+        for importacion in reporte['importaciones']:
+            self.stdout.write(f"  {importacion['acumulado_ms']:9.1f} ms  {importacion['modulo']}")
@@ -0,0 +1,324 @@
+"""
+Microbenchmarks de los componentes más usados: cada tipo de gráfica de ChartFactory, cada
+estrategia de RecommendationEngine y los métodos de ComentarioFacade que llaman las vistas.
+Siembra una base aparte (nunca la de desarrollo) con datos sintéticos del tamaño pedido y
+mide por caso el tiempo (mediana y mínimo de varias repeticiones), las consultas SQL y el
+pico de memoria de Python (tracemalloc).
+
+El reporte se puede guardar en JSON con --salida y comparar en otra corrida con --comparar:
+el comando falla si el mínimo de algún caso supera al de la línea base más allá de
+--tolerancia o si hace más consultas. Sembrar un millón de reseñas toma minutos; --conservar deja la base
+sembrada para reutilizarla en las siguientes corridas.
+"""
+
+import io
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from review.aprobadores import ComentarioAprobador
+
+
+SEMESTRES = [f'{anio}-{periodo}' for anio in range(2019, 2025) for periodo in (1, 2)]
+PALABRAS = (
+    'explica claro exigente parciales tareas talleres proyecto laboratorio puntual amable '
+    'justo dificil facil aprende recomiendo clases ejemplos practica teoria notas trabajo'
+).split()
+LOTE = 20000
+# Segundos que debe durar como mínimo cada corrida cronometrada de un caso
+DURACION_MINIMA = 0.05
+
+
+class AprobadorFijo(ComentarioAprobador):
+    # Sin llamadas a la API: se mide solo el trabajo de la fachada
+    version = 'benchmark'
+
+    def aprobar(self, contenido):
+        return True
+
+
+class Command(BaseCommand):
+    help = 'Mide tiempo, consultas y memoria de ChartFactory, RecommendationEngine y ComentarioFacade.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profesores', type=int, default=1000,
+                            help='Profesores sintéticos (por ejemplo 10000).')
+        parser.add_argument('--resenas', type=int, default=50000,
+                            help='Reseñas sintéticas (por ejemplo 1000000).')
+        parser.add_argument('--usuarios', type=int, default=2000, help='Estudiantes sintéticos.')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de los datos sintéticos.')
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Corridas cronometradas de cada caso (se reporta la mediana).')
+        parser.add_argument('--filtro', default='',
+                            help='Solo mide los casos cuyo nombre contiene este texto.')
+        parser.add_argument('--base', default=str(settings.BASE_DIR / 'benchmark.sqlite3'),
+                            help='Archivo de la base sembrada.')
+        parser.add_argument('--conservar', action='store_true',
+                            help='Reutiliza la base si ya existe y no la borra al terminar.')
+        parser.add_argument('--json', action='store_true', help='Imprime el reporte en JSON.')
+        parser.add_argument('--salida', default=None, help='Guarda el reporte JSON en este archivo.')
+        parser.add_argument('--comparar', default=None,
+                            help='Reporte JSON de una corrida anterior que sirve de línea base.')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Fracción de tiempo extra sobre la línea base que no cuenta como regresión.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('El benchmark siembra una base SQLite aparte; configure SQLite.')
+        if min(options['profesores'], options['usuarios'], options['repeticiones']) < 1:
+            raise CommandError('--profesores, --usuarios y --repeticiones deben ser mayores que 0.')
+        linea_base = self._leer(options['comparar']) if options['comparar'] else None
+
+        # La base de pruebas de Django, con otro nombre: se crea, se migra y (sin --conservar) se borra
+        nombre_original = connection.settings_dict['NAME']
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': options['base']}
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['conservar'],
+        )
+        try:
+            datos = self._sembrar(options)
+            resultados = {}
+            for nombre, caso in self._casos(datos):
+                if options['filtro'] in nombre:
+                    resultados[nombre] = self._medir(caso, options['repeticiones'])
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=options['conservar'])
+
+        reporte = {'configuracion': datos['configuracion'], 'resultados': resultados}
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(reporte, archivo, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2))
+        else:
+            self._imprimir(resultados)
+        if linea_base is not None:
+            self._comparar(reporte, linea_base, options['tolerancia'])
+
+    # Datos sintéticos
+
+    def _sembrar(self, options):
+        from django.contrib.auth.models import User
+        from profesores.models import Profesor, Materia
+        from review.models import Comentario
+
+        if not (options['conservar'] and Profesor.objects.exists()):
+            inicio = time.perf_counter()
+            generador = random.Random(options['semilla'])
+            User.objects.bulk_create(
+                [User(username=f'benchmark{n}') for n in range(options['usuarios'])], batch_size=LOTE
+            )
+            materias = Materia.objects.bulk_create(
+                [Materia(nombre=f'Materia {n}') for n in range(max(10, options['profesores'] // 50))]
+            )
+            profesores = Profesor.objects.bulk_create(
+                [Profesor(nombre=f'Profesor {n}', departamento=f'Departamento {n % 20}')
+                 for n in range(options['profesores'])],
+                batch_size=LOTE,
+            )
+            dictadas = {
+                profesor.pk: [materia.pk for materia in generador.sample(materias, generador.randint(1, 3))]
+                for profesor in profesores
+            }
+            Profesor.materias.through.objects.bulk_create(
+                [Profesor.materias.through(profesor_id=profesor_id, materia_id=materia_id)
+                 for profesor_id, materia_ids in dictadas.items() for materia_id in materia_ids],
+                batch_size=LOTE,
+            )
+            usuario_ids = list(User.objects.filter(username__startswith='benchmark').values_list('pk', flat=True))
+            # Unos pocos profesores concentran muchas reseñas, como en los datos reales
+            pesos = [1 / (n + 1) ** 0.6 for n in range(len(profesores))]
+            for inicio_lote in range(0, options['resenas'], LOTE):
+                cantidad = min(LOTE, options['resenas'] - inicio_lote)
+                elegidos = generador.choices(profesores, weights=pesos, k=cantidad)
+                Comentario.objects.bulk_create([
+                    Comentario(
+                        profesor_id=profesor.pk,
+                        materia_id=generador.choice(dictadas[profesor.pk]),
+                        usuario_id=generador.choice(usuario_ids),
+                        contenido=' '.join(generador.choices(PALABRAS, k=12)),
+                        rating=generador.choices(range(1, 6), weights=(1, 2, 4, 6, 5))[0],
+                        fecha=generador.choice(SEMESTRES),
+                        aprobado_por_ia=generador.random() < 0.95,
+                    )
+                    for profesor in elegidos
+                ], batch_size=LOTE)
+            # bulk_create no dispara los signals: las estadísticas se calculan de una vez
+            call_command('reconcile_stats', mostrar=0, stdout=io.StringIO())
+            self.stderr.write(f'Base sembrada en {time.perf_counter() - inicio:.1f} s.')
+
+        profesores = Profesor.objects.order_by('-numcomentarios', 'id')
+        return {
+            'configuracion': {
+                'profesores': Profesor.objects.count(),
+                'resenas': Comentario.objects.count(),
+                'usuarios': User.objects.count(),
+                'repeticiones': options['repeticiones'],
+            },
+            # El profesor y la materia con más reseñas son el peor caso de las agregaciones
+            'profesor': profesores.first(),
+            'materia': Materia.objects.order_by('-numcomentarios', 'id').first(),
+            'usuario': User.objects.filter(username__startswith='benchmark').order_by('pk').first(),
+        }
+
+    # Casos
+
+    def _casos(self, datos):
+        return [*self._casos_graficas(datos), *self._casos_recomendaciones(datos), *self._casos_fachada(datos)]
+
+    def _casos_graficas(self, datos):
+        # Consultar los datos y generar la gráfica, como lo hace la vista cuando no está en caché
+        from profesores.chart_factory import ChartFactory
+        from profesores.views import (
+            GRAFICAS_MATERIA, GRAFICAS_PROFESOR, _datos_grafica_materia, _datos_grafica_profesor,
+        )
+
+        def consultar(chart_type):
+            if chart_type in GRAFICAS_PROFESOR:
+                fuente = _datos_grafica_profesor(chart_type, datos['profesor'], 'todas', '')
+            else:
+                fuente = _datos_grafica_materia(chart_type, datos['materia'])
+            return fuente() if callable(fuente) else fuente
+
+        for chart_type in ChartFactory.get_available_types():
+            if chart_type not in GRAFICAS_PROFESOR + GRAFICAS_MATERIA:
+                continue
+            yield f'grafica:{chart_type}:png', lambda t=chart_type: ChartFactory.create_chart(t, consultar(t))
+            yield f'grafica:{chart_type}:json', lambda t=chart_type: ChartFactory.create_payload(t, consultar(t))
+
+    def _casos_recomendaciones(self, datos):
+        from profesores.models import Profesor
+        from profesores.paginacion import paginar_ids
+        from profesores.recommendation_strategies import RecommendationEngine
+
+        tamano = settings.PROFESORES_POR_PAGINA
+        for nombre in RecommendationEngine.get_available_strategies():
+            motor = RecommendationEngine(nombre, user=datos['usuario'])
+
+            def sql(motor=motor):
+                # Primera página ordenada por la base de datos (con filtros de búsqueda)
+                return list(motor.recommend(Profesor.objects.all())[:tamano])
+
+            def lista_fria(motor=motor):
+                RecommendationEngine.invalidate_rankings()
+                return motor.ranked_ids()
+
+            def pagina(motor=motor):
+                # Primera página desde la lista de ids en caché (sin filtros)
+                return paginar_ids(Profesor.objects.all(), motor.ranked_ids(), motor.get_ordering(), tamano, None)
+
+            yield f'recomendacion:{nombre}:sql', sql
+            yield f'recomendacion:{nombre}:lista_fria', lista_fria
+            yield f'recomendacion:{nombre}:pagina', pagina
+
+    def _casos_fachada(self, datos):
+        from review.facades import ComentarioFacade
+
+        # Con moderación síncrona la fachada aprueba y actualiza las estadísticas en la
+        # petición; con la asíncrona (la de MODERACION_ASINCRONA por defecto) solo encola
+        fachada = ComentarioFacade(AprobadorFijo(), moderacion_asincrona=False)
+        fachada_asincrona = ComentarioFacade(AprobadorFijo(), moderacion_asincrona=True)
+        formulario = {
+            'contenido': 'Explica con ejemplos claros y califica justo.',
+            'rating': 4,
+            'fecha': SEMESTRES[-1],
+            'materia': datos['materia'],
+        }
+
+        def crear(fachada):
+            # La reseña y sus estadísticas se descartan para que cada corrida parta del mismo estado
+            with transaction.atomic():
+                resultado = fachada.crear_comentario(formulario, datos['profesor'], datos['usuario'])
+                transaction.set_rollback(True)
+            return resultado
+
+        yield 'fachada:obtener_estadisticas_profesor', lambda: fachada.obtener_estadisticas_profesor(datos['profesor'])
+        yield 'fachada:crear_comentario', lambda: crear(fachada)
+        yield 'fachada:crear_comentario:asincrona', lambda: crear(fachada_asincrona)
+
+    # Medición
+
+    def _medir(self, caso, repeticiones):
+        # Una corrida con tracemalloc y registro de consultas (sirve de calentamiento) y
+        # después las cronometradas, sin instrumentación que altere el tiempo
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                caso()
+                primera = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Los casos de menos de un milisegundo se repiten dentro de cada corrida (como timeit)
+        # hasta sumar DURACION_MINIMA, para que el ruido del reloj no parezca una regresión
+        vueltas = max(1, min(1000, int(DURACION_MINIMA / max(primera, 1e-6))))
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            for _ in range(vueltas):
+                caso()
+            tiempos.append((time.perf_counter() - inicio) * 1000 / vueltas)
+        return {
+            'ms_mediana': round(statistics.median(tiempos), 4),
+            'ms_min': round(min(tiempos), 4),
+            'vueltas': vueltas,
+            'consultas': len(consultas.captured_queries),
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    # Reporte
+
+    def _leer(self, ruta):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer la línea base {ruta}: {e}')
+
+    def _imprimir(self, resultados):
+        self.stdout.write(f"{'caso':<48} {'mediana ms':>11} {'mín ms':>9} {'consultas':>9} {'pico KiB':>9}")
+        for nombre, medida in resultados.items():
+            self.stdout.write(
+                f"{nombre:<48} {medida['ms_mediana']:>11.2f} {medida['ms_min']:>9.2f} "
+                f"{medida['consultas']:>9} {medida['memoria_pico_kb']:>9.1f}"
+            )
+
+    def _comparar(self, reporte, linea_base, tolerancia):
+        # Se compara el mínimo de las corridas, el menos afectado por otros procesos de la máquina.
+        # Solo se comparan los casos presentes en ambos reportes; con otros tamaños no tiene sentido.
+        anterior = {k: v for k, v in linea_base.get('configuracion', {}).items() if k != 'repeticiones'}
+        actual = {k: v for k, v in reporte['configuracion'].items() if k != 'repeticiones'}
+        if anterior != actual:
+            raise CommandError(f'La línea base se midió con otros datos: {anterior} (ahora {actual}).')
+
+        regresiones = []
+        self.stdout.write(f"\n{'caso':<48} {'base mín':>9} {'ahora mín':>9} {'cambio':>8}")
+        for nombre, medida in reporte['resultados'].items():
+            base = linea_base['resultados'].get(nombre)
+            if base is None:
+                continue
+            cambio = medida['ms_min'] / base['ms_min'] - 1 if base['ms_min'] else 0.0
+            marca = ''
+            if cambio > tolerancia:
+                marca = ' más lento'
+            if medida['consultas'] > base['consultas']:
+                marca += f" {base['consultas']} -> {medida['consultas']} consultas"
+            if marca:
+                regresiones.append(nombre)
+            self.stdout.write(
+                f"{nombre:<48} {base['ms_min']:>9.2f} {medida['ms_min']:>9.2f} {cambio:>+8.0%}{marca}"
+            )
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} regresiones respecto a la línea base: {', '.join(regresiones)}")
+        self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la línea base.'))
+
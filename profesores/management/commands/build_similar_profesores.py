@@ -0,0 +1,31 @@
+"""
+Actualiza los profesores similares que muestra la página de cada profesor.
+Solo vuelve a leer las reseñas de los profesores cuyas reseñas o materias cambiaron desde
+la ejecución anterior (ver profesores/similares.py), así que se puede programar seguido.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from profesores import similares
+
+
+class Command(BaseCommand):
+    help = 'Recalcula con TF-IDF los profesores similares de los profesores cuyas reseñas cambiaron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vecinos', type=int, default=10,
+                            help='Cantidad de profesores similares que se guardan por profesor.')
+        parser.add_argument('--completo', action='store_true',
+                            help='Recalcula los vectores y los vecinos de todos los profesores.')
+
+    def handle(self, *args, **options):
+        if options['vecinos'] < 1:
+            raise CommandError('--vecinos debe ser mayor que 0.')
+        inicio = time.perf_counter()
+        resultado = similares.actualizar(vecinos=options['vecinos'], completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.vectores} de {resultado.total} profesores con reseñas o materias nuevas; '
+            f'vecinos recalculados para {resultado.recalculados} en {time.perf_counter() - inicio:.2f} s.'
+        ))
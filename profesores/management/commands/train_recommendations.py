@@ -0,0 +1,57 @@
+"""
+Entrena el modelo de filtrado colaborativo del orden "Recomendados para ti".
+Lee las reseñas aprobadas, factoriza la matriz usuario x profesor con ALS y guarda los
+vectores float32 en settings.RECOMENDACIONES_MODELO. Los procesos web recargan el archivo
+al notar que cambió, así que se puede programar (por ejemplo, cada noche) sin reiniciarlos.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from profesores import colaborativo
+
+
+class Command(BaseCommand):
+    help = 'Factoriza la matriz de calificaciones usuario x profesor (ALS) para las recomendaciones personalizadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factores', type=int, default=16,
+                            help='Dimensión de los vectores de usuarios y profesores.')
+        parser.add_argument('--iteraciones', type=int, default=10,
+                            help='Iteraciones de ALS (cada una resuelve usuarios y profesores).')
+        parser.add_argument('--regularizacion', type=float, default=0.1,
+                            help='Peso de la regularización L2, por calificación.')
+        parser.add_argument('--salida', default=None,
+                            help='Ruta del archivo .npz (por defecto settings.RECOMENDACIONES_MODELO).')
+
+    def handle(self, *args, **options):
+        if options['factores'] < 1 or options['iteraciones'] < 1:
+            raise CommandError('--factores y --iteraciones deben ser mayores que 0.')
+        inicio = time.perf_counter()
+        usuarios, profesores, ratings = colaborativo.calificaciones()
+        if not len(ratings):
+            raise CommandError('No hay reseñas aprobadas para entrenar.')
+        lectura = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        modelo, rmse = colaborativo.entrenar(
+            usuarios, profesores, ratings,
+            factores=options['factores'],
+            iteraciones=options['iteraciones'],
+            regularizacion=options['regularizacion'],
+        )
+        entrenamiento = time.perf_counter() - inicio
+
+        ruta = options['salida'] or settings.RECOMENDACIONES_MODELO
+        colaborativo.guardar(modelo, ruta)
+        tamano = sum(arreglo.nbytes for arreglo in modelo)
+        self.stdout.write(
+            f'{len(ratings)} calificaciones de {len(modelo.usuario_ids)} usuarios a '
+            f'{len(modelo.profesor_ids)} profesores leídas en {lectura:.2f} s.'
+        )
+        self.stdout.write(
+            f'Entrenado en {entrenamiento:.2f} s (RMSE de entrenamiento {rmse:.3f}); '
+            f'modelo de {tamano / 1024:.0f} KiB guardado en {ruta}.'
+        )
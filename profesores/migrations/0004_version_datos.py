@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0003_materia_remove_profesor_materia_profesor_materias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materia',
+            name='version_datos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profesor',
+            name='version_datos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
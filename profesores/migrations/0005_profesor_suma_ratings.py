@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def calcular_sumas(apps, schema_editor):
+    # Recalcula suma_ratings, numcomentarios y calificacion_media a partir de las
+    # reseñas aprobadas, que es lo que mantienen los signals a partir de ahora.
+    Profesor = apps.get_model('profesores', 'Profesor')
+    aprobados = Q(comentarios__aprobado_por_ia=True)
+    profesores = Profesor.objects.annotate(
+        suma=Sum('comentarios__rating', filter=aprobados),
+        cantidad=Count('comentarios', filter=aprobados),
+    )
+    for profesor in profesores:
+        profesor.suma_ratings = profesor.suma or 0
+        profesor.numcomentarios = profesor.cantidad
+        profesor.calificacion_media = profesor.suma_ratings / profesor.cantidad if profesor.cantidad else 0.0
+        profesor.save(update_fields=['suma_ratings', 'numcomentarios', 'calificacion_media'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0004_version_datos'),
+        ('review', '0008_comentario_materia_alter_comentario_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profesor',
+            name='suma_ratings',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_sumas, migrations.RunPython.noop),
+    ]
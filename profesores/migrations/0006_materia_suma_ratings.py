@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0005_profesor_suma_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materia',
+            name='suma_ratings',
+            field=models.IntegerField(default=0),
+        ),
+    ]
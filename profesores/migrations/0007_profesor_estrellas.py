@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def llenar_histogramas(apps, schema_editor):
+    # El histograma de cada profesor es la suma de sus resúmenes por materia y semestre.
+    Profesor = apps.get_model('profesores', 'Profesor')
+    ResumenCalificacion = apps.get_model('review', 'ResumenCalificacion')
+    campos = [f'estrellas_{r}' for r in range(1, 6)]
+    totales = (
+        ResumenCalificacion.objects.values('profesor_id')
+        .annotate(**{f'total_{campo}': Sum(campo) for campo in campos})
+        .order_by()
+    )
+    for total in totales:
+        Profesor.objects.filter(pk=total['profesor_id']).update(
+            **{campo: total[f'total_{campo}'] for campo in campos}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0006_materia_suma_ratings'),
+        ('review', '0009_resumencalificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profesor',
+            name='estrellas_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profesor',
+            name='estrellas_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profesor',
+            name='estrellas_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profesor',
+            name='estrellas_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profesor',
+            name='estrellas_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(llenar_histogramas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+import profesores.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def calcular_puntajes(apps, schema_editor):
+    # Puntaje bayesiano inicial a partir de la suma y la cantidad de reseñas aprobadas.
+    Profesor = apps.get_model('profesores', 'Profesor')
+    peso = settings.PUNTAJE_BAYESIANO_PESO
+    previo = peso * settings.PUNTAJE_BAYESIANO_MEDIA
+    profesores = list(Profesor.objects.only('suma_ratings', 'numcomentarios'))
+    for profesor in profesores:
+        profesor.puntaje_bayesiano = (previo + profesor.suma_ratings) / (peso + profesor.numcomentarios)
+    Profesor.objects.bulk_update(profesores, ['puntaje_bayesiano'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0007_profesor_estrellas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profesor',
+            name='puntaje_bayesiano',
+            field=models.FloatField(default=profesores.models.puntaje_inicial),
+        ),
+        migrations.RunPython(calcular_puntajes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profesor',
+            index=models.Index(fields=['-puntaje_bayesiano', '-numcomentarios', 'id'], name='profesor_puntaje_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0008_profesor_puntaje_bayesiano'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='materia',
+            index=models.Index(fields=['nombre'], name='materia_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profesor',
+            index=models.Index(fields=['-calificacion_media', '-numcomentarios', 'id'], name='profesor_calificacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profesor',
+            index=models.Index(fields=['-numcomentarios', '-calificacion_media', 'id'], name='profesor_comentarios_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profesor',
+            index=models.Index(fields=['nombre', 'id'], name='profesor_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:17
+
+import unicodedata
+
+from django.db import OperationalError, migrations, models
+
+
+# Copias del momento de esta migración (profesores/busqueda.py puede cambiar después)
+TABLA_FTS = 'profesores_busqueda_fts'
+
+
+def normalizar(texto):
+    # Minúsculas y sin tildes: 'García' -> 'garcia'
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    # Llena texto_busqueda y, en SQLite con FTS5, crea y llena la tabla de búsqueda.
+    Profesor = apps.get_model('profesores', 'Profesor')
+    materias = {}
+    for profesor_id, nombre in Profesor.materias.through.objects.values_list('profesor_id', 'materia__nombre'):
+        materias.setdefault(profesor_id, []).append(nombre)
+    profesores = list(Profesor.objects.only('nombre', 'departamento'))
+    for profesor in profesores:
+        profesor.texto_busqueda = normalizar(
+            ' '.join([profesor.nombre, profesor.departamento, *materias.get(profesor.pk, [])])
+        )
+    Profesor.objects.bulk_update(profesores, ['texto_busqueda'], batch_size=500)
+
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+                f"nombre, departamento, materias, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite compilado sin FTS5: se usará texto_busqueda
+            return
+        cursor.executemany(
+            f'INSERT INTO {TABLA_FTS} (rowid, nombre, departamento, materias) VALUES (%s, %s, %s, %s)',
+            [
+                (profesor.pk, profesor.nombre, profesor.departamento, ' '.join(materias.get(profesor.pk, [])))
+                for profesor in profesores
+            ],
+        )
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0009_indices_recomendacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profesor',
+            name='texto_busqueda',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0010_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VectorTexto',
+            fields=[
+                ('profesor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector_texto', serialize=False, to='profesores.profesor')),
+                ('terminos', models.JSONField(default=dict)),
+                ('version_datos', models.PositiveIntegerField(default=0)),
+                ('materias', models.TextField(default='')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfesorSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('puntaje', models.FloatField()),
+                ('profesor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='profesores.profesor')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profesores.profesor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profesor', 'posicion'), name='profesor_similar_posicion_unica')],
+            },
+        ),
+    ]
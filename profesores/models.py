@@ -1,21 +1,224 @@
-from django.db import models
+import math
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocompletado, busqueda, rankings
+
+def puntaje_bayesiano(suma, cantidad):
+    # Promedio de las reseñas reales junto con PESO reseñas ficticias de calificación MEDIA.
+    peso = settings.PUNTAJE_BAYESIANO_PESO
+    return (peso * settings.PUNTAJE_BAYESIANO_MEDIA + suma) / (peso + cantidad)
+
+
+def puntaje_inicial():
+    # Puntaje de un profesor sin reseñas
+    return puntaje_bayesiano(0, 0)
+
 
 # Create your models here.
 class Profesor(models.Model):
     nombre = models.CharField(max_length=100)
     departamento = models.CharField(max_length=100)
     materias = models.ManyToManyField('Materia', related_name='profesores')
-    calificacion_media = models.FloatField(default=0.0)  # Calificación general del profesor
+    calificacion_media = models.FloatField(default=0.0)  # Calificación general del profesor, suma_ratings / numcomentarios
     numcomentarios = models.IntegerField(default=0)
+    suma_ratings = models.IntegerField(default=0)  # Suma de los ratings de las reseñas aprobadas
+    version_datos = models.PositiveIntegerField(default=0)  # Se incrementa cuando cambian sus comentarios o su nombre
+    # Histograma de las reseñas aprobadas: cantidad con cada número de estrellas
+    estrellas_1 = models.IntegerField(default=0)
+    estrellas_2 = models.IntegerField(default=0)
+    estrellas_3 = models.IntegerField(default=0)
+    estrellas_4 = models.IntegerField(default=0)
+    estrellas_5 = models.IntegerField(default=0)
+    # Calificación con shrinkage hacia la media global, usada por la recomendación 'balanced'
+    puntaje_bayesiano = models.FloatField(default=puntaje_inicial)
+    # Nombre, departamento y materias en minúsculas y sin tildes (ver busqueda.py)
+    texto_busqueda = models.TextField(default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Un índice por estrategia de recomendación, con los mismos campos de su ORDER BY
+            # (ver RecommendationStrategy.get_ordering), para paginar sin ordenar en memoria
+            models.Index(fields=['-calificacion_media', '-numcomentarios', 'id'], name='profesor_calificacion_idx'),
+            models.Index(fields=['-numcomentarios', '-calificacion_media', 'id'], name='profesor_comentarios_idx'),
+            models.Index(fields=['-puntaje_bayesiano', '-numcomentarios', 'id'], name='profesor_puntaje_idx'),
+            models.Index(fields=['nombre', 'id'], name='profesor_nombre_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    def histograma(self):
+        # Retorna [(rating, cantidad), ...] sin los ratings que no aparecen,
+        # igual que review.agregaciones.conteo_ratings pero sin consultar la base de datos.
+        conteos = ((rating, getattr(self, f'estrellas_{rating}')) for rating in range(1, 6))
+        return [(rating, cantidad) for rating, cantidad in conteos if cantidad]
+
+    def percentil(self, porcentaje):
+        # Percentil por rango más cercano sobre el histograma; None si no hay reseñas.
+        histograma = self.histograma()
+        total = sum(cantidad for _, cantidad in histograma)
+        if not total:
+            return None
+        posicion = max(1, math.ceil(porcentaje / 100 * total))
+        acumulado = 0
+        for rating, cantidad in histograma:
+            acumulado += cantidad
+            if acumulado >= posicion:
+                return rating
+
+    @property
+    def mediana(self):
+        return self.percentil(50)
+
 
 class Materia(models.Model):
     nombre = models.CharField(max_length=100)
     calificacion_media = models.FloatField(default=0.0)
     numcomentarios = models.IntegerField(default=0)
+    suma_ratings = models.IntegerField(default=0)
+    version_datos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # estadisticas busca la materia seleccionada por nombre
+            models.Index(fields=['nombre'], name='materia_nombre_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre}"
+
+
+class VectorTexto(models.Model):
+    # Frecuencia de cada término en las reseñas aprobadas y las materias de un profesor (ver
+    # similares.py). Se recalcula solo si cambian su version_datos o los nombres de sus materias.
+    profesor = models.OneToOneField(Profesor, primary_key=True, related_name='vector_texto', on_delete=models.CASCADE)
+    terminos = models.JSONField(default=dict)
+    version_datos = models.PositiveIntegerField(default=0)
+    materias = models.TextField(default='')
+
+
+class ProfesorSimilar(models.Model):
+    # Vecinos más parecidos de un profesor según el texto de sus reseñas, del más parecido
+    # (posicion 0) al menos parecido. La página del profesor los lee con una sola consulta.
+    profesor = models.ForeignKey(Profesor, related_name='similares', on_delete=models.CASCADE)
+    similar = models.ForeignKey(Profesor, related_name='+', on_delete=models.CASCADE)
+    posicion = models.PositiveSmallIntegerField()
+    puntaje = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profesor', 'posicion'], name='profesor_similar_posicion_unica'),
+        ]
+
+
+@receiver(m2m_changed, sender=Profesor.materias.through)
+def actualizar_version_materias(sender, instance, action, pk_set, reverse, **kwargs):
+    # La gráfica de dispersión de una materia depende de los profesores que la dictan.
+    # En 'clear' el pk_set llega vacío, por eso se leen las materias antes de borrarlas.
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        materia_ids = [instance.pk]
+    elif pk_set:
+        materia_ids = list(pk_set)
+    else:
+        materia_ids = list(instance.materias.values_list('pk', flat=True))
+    Materia.objects.filter(pk__in=materia_ids).update(version_datos=F('version_datos') + 1)
+
+
+# Índice de búsqueda (busqueda.py): se actualiza cuando cambia algún texto que se busca
+
+def _nombre_cambiado(created, update_fields):
+    # Un save() completo (update_fields=None) pudo cambiar el nombre; al crear no hay caché que invalidar
+    if update_fields is None:
+        return not created
+    return 'nombre' in update_fields
+
+
+@receiver(post_save, sender=Profesor)
+def indexar_profesor(sender, instance, created=False, update_fields=None, **kwargs):
+    if _nombre_cambiado(created, update_fields):
+        # El nombre aparece en las gráficas del profesor y en la dispersión de sus materias
+        Profesor.objects.filter(pk=instance.pk).update(version_datos=F('version_datos') + 1)
+        Materia.objects.filter(profesores=instance).update(version_datos=F('version_datos') + 1)
+        # Un save() posterior de la misma instancia no debe devolver la versión anterior
+        instance.refresh_from_db(fields=['version_datos'])
+    if update_fields is not None and not {'nombre', 'departamento'} & set(update_fields):
+        return
+    busqueda.indexar_profesores([instance.pk])
+
+
+@receiver(post_delete, sender=Profesor)
+def desindexar_profesor(sender, instance, **kwargs):
+    busqueda.indexar_profesores([instance.pk])
+
+
+@receiver(m2m_changed, sender=Profesor.materias.through)
+def indexar_materias_profesor(sender, instance, action, pk_set, reverse, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            busqueda.indexar_profesores([instance.pk])
+    elif action == 'pre_clear':
+        # materia.profesores.clear() no trae los ids en pk_set
+        instance._profesores_antes_de_limpiar = list(instance.profesores.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        busqueda.indexar_profesores(getattr(instance, '_profesores_antes_de_limpiar', []))
+    elif action in ('post_add', 'post_remove'):
+        busqueda.indexar_profesores(pk_set or [])
+
+
+@receiver(post_save, sender=Materia)
+def indexar_profesores_materia(sender, instance, created, update_fields=None, **kwargs):
+    if _nombre_cambiado(created, update_fields):
+        # El nombre aparece en las gráficas de la materia y en las de los profesores que la dictan
+        Materia.objects.filter(pk=instance.pk).update(version_datos=F('version_datos') + 1)
+        Profesor.objects.filter(
+            Q(materias=instance) | Q(resumenes__materia=instance)
+        ).update(version_datos=F('version_datos') + 1)
+        instance.refresh_from_db(fields=['version_datos'])
+    if not created:
+        busqueda.indexar_profesores(instance.profesores.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Materia)
+def recordar_profesores_materia_eliminada(sender, instance, **kwargs):
+    instance._profesores_antes_de_eliminar = list(instance.profesores.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Materia)
+def indexar_profesores_materia_eliminada(sender, instance, **kwargs):
+    busqueda.indexar_profesores(getattr(instance, '_profesores_antes_de_eliminar', []))
+
+
+# Índice de autocompletado (autocompletado.py): se actualiza al confirmarse la transacción,
+# así una escritura revertida no deja sugerencias que no existen
+
+@receiver(post_save, sender=Profesor)
+@receiver(post_delete, sender=Profesor)
+def autocompletar_profesor(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocompletado.indice.actualizar_profesores([pk]))
+
+
+@receiver(post_save, sender=Materia)
+@receiver(post_delete, sender=Materia)
+def autocompletar_materia(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocompletado.indice.actualizar_materias([pk]))
+
+
+# Listas ordenadas de las estrategias de recomendación (rankings.py)
+
+@receiver(post_save, sender=Profesor)
+def invalidar_rankings_profesor(sender, instance, created, update_fields=None, **kwargs):
+    rankings.invalidar_por_campos(None if created else update_fields)
+
+
+@receiver(post_delete, sender=Profesor)
+def invalidar_rankings_profesor_eliminado(sender, instance, **kwargs):
+    rankings.invalidar_por_campos()
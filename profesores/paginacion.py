@@ -0,0 +1,136 @@
+"""
+Paginación por cursor (keyset) para listados ordenados.
+En lugar de OFFSET, que obliga a la base de datos a recorrer y descartar todas las filas
+de las páginas anteriores, cada página filtra las filas que van después (o antes) de la
+última fila vista según los campos del ORDER BY. Con un índice sobre esos campos el costo
+de una página no depende de su profundidad ni del tamaño del catálogo.
+"""
+
+import base64
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+Pagina = namedtuple('Pagina', ['objetos', 'cursor_siguiente', 'cursor_anterior'])
+
+
+def paginar(queryset, ordering, tamano, cursor=None):
+    # Retorna la página que sigue al cursor (o la primera si no hay cursor válido).
+    # `ordering` son los campos del ORDER BY, terminados en un campo único como 'id'.
+    direccion, valores, _ = _leer_cursor(cursor, len(ordering))
+    hacia_atras = direccion == 'antes'
+
+    orden = [_invertir(campo) for campo in ordering] if hacia_atras else list(ordering)
+    filas = queryset.order_by(*orden)
+    if valores is not None:
+        try:
+            filas = filas.filter(_despues_de(orden, valores))
+        except (TypeError, ValueError, ValidationError):
+            # Valores que no son del tipo de sus campos: el cursor fue alterado
+            return paginar(queryset, ordering, tamano)
+    objetos = list(filas[:tamano + 1])
+
+    # Se pide una fila de más para saber si hay otra página en esa dirección
+    hay_mas = len(objetos) > tamano
+    objetos = objetos[:tamano]
+    if hacia_atras:
+        objetos.reverse()
+    if not objetos:
+        return Pagina([], None, None)
+
+    hay_siguiente = hay_mas if not hacia_atras else True
+    hay_anterior = hay_mas if hacia_atras else valores is not None
+    return Pagina(
+        objetos,
+        _crear_cursor('despues', ordering, objetos[-1]) if hay_siguiente else None,
+        _crear_cursor('antes', ordering, objetos[0]) if hay_anterior else None,
+    )
+
+
+def paginar_ids(queryset, ids, ordering, tamano, cursor=None):
+    # Igual que paginar, pero sobre una lista de ids ya ordenada (ver rankings.py): la página es
+    # un tramo de la lista y sus filas se traen por clave primaria. La lista puede no seguir a
+    # `ordering` (la personalizada, o los resultados de una búsqueda en el orden de un ranking).
+    # Los cursores son los mismos (estos llevan además la posición de su fila en la lista),
+    # así que se puede pasar de una función a la otra.
+    direccion, valores, posicion = _leer_cursor(cursor, len(ordering))
+    if valores is None:
+        desde, hasta = 0, tamano
+    else:
+        # El último campo del orden es el id de la fila del cursor. Si en esa posición ya hay
+        # otro profesor (la lista cambió) o el cursor viene de paginar, se busca su posición en
+        # el índice del Ranking; sin índice, o si ya no está, se pagina con la consulta ordenada
+        if posicion is None or not 0 <= posicion < len(ids) or ids[posicion] != valores[-1]:
+            buscar = getattr(ids, 'posicion', None)
+            posicion = buscar(valores[-1]) if buscar else None
+            if posicion is None:
+                return paginar(queryset, ordering, tamano, cursor)
+        if direccion == 'antes':
+            desde, hasta = max(posicion - tamano, 0), posicion
+        else:
+            desde, hasta = posicion + 1, posicion + 1 + tamano
+
+    tramo = ids[desde:hasta]
+    filas = queryset.in_bulk(tramo)
+    # (posición en la lista, fila) de los profesores que siguen existiendo
+    encontrados = [(desde + n, filas[pk]) for n, pk in enumerate(tramo) if pk in filas]
+    if not encontrados:
+        return Pagina([], None, None)
+    (primera, primero), (ultima, ultimo) = encontrados[0], encontrados[-1]
+    return Pagina(
+        [objeto for _, objeto in encontrados],
+        _crear_cursor('despues', ordering, ultimo, ultima) if hasta < len(ids) else None,
+        _crear_cursor('antes', ordering, primero, primera) if desde > 0 else None,
+    )
+
+
+def _invertir(campo):
+    return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+
+def _despues_de(orden, valores):
+    # (a, b, c) después de (x, y, z) en orden lexicográfico:
+    # a > x  OR  (a = x AND b > y)  OR  (a = x AND b = y AND c > z), con < en los campos descendentes
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        comparacion = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{comparacion}': valor})
+        iguales[nombre] = valor
+    # Cota redundante sobre el primer campo: con ella la base de datos puede saltar en el
+    # índice directo al cursor (SEARCH) en lugar de recorrerlo desde el principio
+    primero, valor = orden[0], valores[0]
+    cota = 'lte' if primero.startswith('-') else 'gte'
+    return Q(**{f"{primero.lstrip('-')}__{cota}": valor}) & condicion
+
+
+def _crear_cursor(direccion, ordering, objeto, posicion=None):
+    valores = [getattr(objeto, campo.lstrip('-')) for campo in ordering]
+    contenido = [direccion, valores] if posicion is None else [direccion, valores, posicion]
+    texto = json.dumps(contenido, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _leer_cursor(cursor, cantidad_campos):
+    # Retorna (dirección, valores, posición en la lista o None). Un cursor ausente, alterado
+    # o de otro orden lleva a la primera página
+    primera = ('despues', None, None)
+    if not cursor:
+        return primera
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        direccion, valores, *posicion = json.loads(texto)
+    except (ValueError, TypeError):
+        return primera
+    if direccion not in ('antes', 'despues') or not isinstance(valores, list) or len(valores) != cantidad_campos:
+        return primera
+    # Solo valores simples; el tipo de cada campo lo valida la consulta (ver paginar)
+    if not all(valor is None or isinstance(valor, (str, int, float)) for valor in valores):
+        return primera
+    if posicion and (len(posicion) > 1 or type(posicion[0]) is not int):
+        return primera
+    return direccion, valores, posicion[0] if posicion else None
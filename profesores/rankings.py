@@ -0,0 +1,138 @@
+"""
+Listas de ids de profesores ya ordenadas por cada estrategia de recomendación.
+La lista de profesores sin filtros pide un tramo de la lista y trae esas filas por clave
+primaria, en lugar de ordenar la tabla completa en cada petición. Cada lista se guarda en
+memoria del proceso como un Ranking: los ids en un array('q') y un índice de posiciones (otros
+dos arrays, 24 bytes por profesor en total) con el que un cursor salta a su fila y una búsqueda
+ordena sus resultados sin recorrer la lista.
+
+Las listas se invalidan por versión: cada estrategia tiene un token en la caché 'rankings'
+(settings.CACHES, compartida entre los procesos) que cambia al confirmarse una escritura de los
+campos de su ORDER BY. Un proceso que encuentra otro token reconstruye la lista. Además, ninguna lista
+se usa por más de RANKINGS_REFRESCO segundos: acota cuánto dura una lista vieja si se escribió
+sin pasar por los signals (un UPDATE masivo) o si la caché no es común a todos los servidores.
+"""
+
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+PREFIJO_VERSION = 'profesores:ranking:'
+ALIAS_CACHE = 'rankings'
+
+_lock = threading.Lock()
+# nombre de la estrategia -> (versión, ordering, construida_en, Ranking)
+_listas = {}
+
+
+class Ranking:
+    # Ids de profesores en orden, con un índice de la posición de cada id en la lista. Se usa
+    # como la lista misma: len(), ranking[n], ranking[desde:hasta] e iteración.
+
+    def __init__(self, ids):
+        self.ids = ids if isinstance(ids, array) else array('q', ids)
+        # Los ids de menor a mayor junto con su posición, para buscarlos por bisección
+        orden = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        self._claves = array('q', (self.ids[n] for n in orden))
+        self._posiciones = array('q', orden)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, indice):
+        return self.ids[indice]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def posicion(self, pk):
+        # Posición del profesor en la lista, o None si no está
+        if type(pk) is not int:
+            return None
+        n = bisect_left(self._claves, pk)
+        if n < len(self._claves) and self._claves[n] == pk:
+            return self._posiciones[n]
+        return None
+
+    def ordenar(self, pks):
+        # Los pks que están en la lista, en el orden de la lista (los resultados de una búsqueda)
+        posiciones = sorted(n for n in map(self.posicion, pks) if n is not None)
+        return Ranking(array('q', (self.ids[n] for n in posiciones)))
+
+
+class RankingConPrimeros(Ranking):
+    # `primeros` delante y después el resto de `base` en su orden, sin repetir. La posición de
+    # un id sale de la de `base`, así que no se vuelve a construir un índice por petición.
+
+    def __init__(self, primeros, base):
+        self.base = base
+        self._primeros = {pk: n for n, pk in enumerate(primeros)}
+        self.ids = array('q', primeros)
+        self.ids.extend(pk for pk in base if pk not in self._primeros)
+        # Posiciones en `base` de los primeros, que el resto ya no ocupa
+        self._saltadas = sorted(n for n in map(base.posicion, primeros) if n is not None)
+
+    def posicion(self, pk):
+        if pk in self._primeros:
+            return self._primeros[pk]
+        n = self.base.posicion(pk)
+        if n is None:
+            return None
+        return len(self._primeros) + n - bisect_left(self._saltadas, n)
+
+
+def ids(nombre, ordering):
+    # Ids de todos los profesores en el orden indicado, reconstruidos si la versión cambió
+    # o si la lista tiene más de RANKINGS_REFRESCO segundos
+    from .models import Profesor
+
+    version = _version(nombre)
+    with _lock:
+        guardada = _listas.get(nombre)
+    if (
+        guardada is not None and guardada[:2] == (version, tuple(ordering))
+        and time.monotonic() - guardada[2] < settings.RANKINGS_REFRESCO
+    ):
+        return guardada[3]
+    # Se guarda con la versión leída antes de consultar: si se invalida mientras tanto,
+    # la siguiente petición vuelve a construirla
+    construida_en = time.monotonic()
+    lista = Ranking(array('q', Profesor.objects.order_by(*ordering).values_list('pk', flat=True)))
+    with _lock:
+        _listas[nombre] = (version, tuple(ordering), construida_en, lista)
+    return lista
+
+
+def invalidar_por_campos(campos=None):
+    # Invalida las listas que ordenan por alguno de los campos (todas si es None) al confirmar
+    # la transacción: una petición concurrente que reconstruyó la lista con los datos previos
+    # la guardó con el token anterior, así que la siguiente vuelve a construirla.
+    from .recommendation_strategies import RecommendationEngine
+
+    campos = None if campos is None else list(campos)
+    transaction.on_commit(lambda: RecommendationEngine.invalidate_rankings(campos))
+
+
+def invalidar(nombre):
+    caches[ALIAS_CACHE].set(PREFIJO_VERSION + nombre, uuid.uuid4().hex, None)
+    with _lock:
+        _listas.pop(nombre, None)
+
+
+def _version(nombre):
+    # Un token ausente (caché reiniciada o llave desalojada) se crea nuevo, así que nunca
+    # coincide con el de una lista construida antes
+    cache = caches[ALIAS_CACHE]
+    clave = PREFIJO_VERSION + nombre
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, uuid.uuid4().hex, None)
+        version = cache.get(clave)
+    return version
@@ -6,14 +6,29 @@ Aplica diferentes estrategias de ordenamiento según las preferencias del usuari
 from abc import ABC, abstractmethod
 from django.db.models import QuerySet
 
+from . import colaborativo, rankings
+
 
 class RecommendationStrategy(ABC):
     # Define la interfaz común para todas las estrategias de ordenamiento.
+
+    def __init__(self, user=None):
+        # Usuario para el que se ordena; solo lo usan las estrategias personalizadas
+        self.user = user
     
     @abstractmethod
+    def get_ordering(self) -> tuple:
+        # Campos del ORDER BY. Deben identificar cada fila (terminar en 'id')
+        # para que la paginación por cursor no repita ni salte profesores.
+        pass
+
     def apply(self, queryset: QuerySet) -> QuerySet:
         # Aplica la estrategia de ordenamiento al queryset.
-        pass
+        return queryset.order_by(*self.get_ordering())
+
+    def ranked_ids(self):
+        # rankings.Ranking ya ordenado para el usuario, o None para usar la lista en caché de get_ordering()
+        return None
     
     @abstractmethod
     def get_name(self) -> str:
@@ -24,8 +39,8 @@ class RecommendationStrategy(ABC):
 class BestRatedFirstStrategy(RecommendationStrategy):
     # Los profesores con mayor calificación_media aparecen primero.
     
-    def apply(self, queryset: QuerySet) -> QuerySet:
-        return queryset.order_by('-calificacion_media', '-numcomentarios')
+    def get_ordering(self) -> tuple:
+        return ('-calificacion_media', '-numcomentarios', 'id')
     
     def get_name(self) -> str:
         return "Mejor calificados primero"
@@ -34,8 +49,8 @@ class BestRatedFirstStrategy(RecommendationStrategy):
 class MostReviewedFirstStrategy(RecommendationStrategy):
     # Los profesores con más reseñas aparecen primero.
     
-    def apply(self, queryset: QuerySet) -> QuerySet:
-        return queryset.order_by('-numcomentarios', '-calificacion_media')
+    def get_ordering(self) -> tuple:
+        return ('-numcomentarios', '-calificacion_media', 'id')
     
     def get_name(self) -> str:
         return "Más comentados primero"
@@ -44,36 +59,50 @@ class MostReviewedFirstStrategy(RecommendationStrategy):
 class BalancedRecommendationStrategy(RecommendationStrategy):
 
     # Considera tanto calificación como número de comentarios.
-    # Filtra profesores con al menos 3 comentarios para evitar ratings engañosos.
+    # Ordena por puntaje_bayesiano: el promedio del profesor "encogido" hacia la media global
+    # según cuántas reseñas tiene, para que pocas reseñas no produzcan ratings engañosos.
+    # Es un solo ORDER BY sobre un índice, así que admite cualquier filtro y paginación.
     
-    def apply(self, queryset: QuerySet) -> QuerySet:
-        # Profesores con al menos 3 comentarios ordenados por rating
-        profesores_con_suficientes_reviews = queryset.filter(
-            numcomentarios__gte=3
-        ).order_by('-calificacion_media', '-numcomentarios')
-        
-        # Profesores con menos comentarios al final
-        profesores_nuevos = queryset.filter(
-            numcomentarios__lt=3
-        ).order_by('-calificacion_media', '-numcomentarios')
-        
-        # Combinar: primero los confiables, luego los nuevos
-        return profesores_con_suficientes_reviews.union(
-            profesores_nuevos, all=True
-        )
+    def get_ordering(self) -> tuple:
+        return ('-puntaje_bayesiano', '-numcomentarios', 'id')
     
     def get_name(self) -> str:
         return "Recomendación balanceada"
 
 
 class AlphabeticalStrategy(RecommendationStrategy):
-    def apply(self, queryset: QuerySet) -> QuerySet:
-        return queryset.order_by('nombre')
+    def get_ordering(self) -> tuple:
+        return ('nombre', 'id')
     
     def get_name(self) -> str:
         return "Orden alfabético"
 
 
+class CollaborativeStrategy(BalancedRecommendationStrategy):
+    # "Estudiantes como tú también calificaron bien a...": primero los profesores que el
+    # filtrado colaborativo (colaborativo.py) predice que el usuario calificaría mejor, sin los
+    # que ya reseñó, y después el resto en el orden balanceado. Sin modelo entrenado, para
+    # usuarios anónimos o que no estaban en el entrenamiento, es el orden balanceado.
+
+    TOP = 50
+
+    def ranked_ids(self):
+        balanceados = rankings.ids('balanced', BalancedRecommendationStrategy().get_ordering())
+        usuario_id = getattr(self.user, 'pk', None)
+        if usuario_id is None:
+            return balanceados
+        from review.models import Comentario
+
+        resenados = set(Comentario.objects.filter(usuario_id=usuario_id).values_list('profesor_id', flat=True))
+        recomendados = colaborativo.recomendar(usuario_id, self.TOP, excluir=resenados)
+        if not recomendados:
+            return balanceados
+        return rankings.RankingConPrimeros(recomendados, balanceados)
+
+    def get_name(self) -> str:
+        return "Recomendados para ti"
+
+
 class RecommendationEngine:
     # Registro de estrategias disponibles
     _strategies = {
@@ -81,11 +110,13 @@ class RecommendationEngine:
         'most_reviewed': MostReviewedFirstStrategy,
         'balanced': BalancedRecommendationStrategy,
         'alphabetical': AlphabeticalStrategy,
+        'personalized': CollaborativeStrategy,
     }
     
-    def __init__(self, strategy_name: str = 'best_rated'):
-        # Inicializa el motor con una estrategia.
+    def __init__(self, strategy_name: str = 'best_rated', user=None):
+        # Inicializa el motor con una estrategia; `user` es para las estrategias personalizadas.
         
+        self._user = user
         self.set_strategy(strategy_name)
     
     def set_strategy(self, strategy_name: str):
@@ -97,13 +128,27 @@ class RecommendationEngine:
                 f"Estrategia '{strategy_name}' no existe. "
                 f"Disponibles: {list(self._strategies.keys())}"
             )
-        self._strategy = strategy_class()
+        self._strategy = strategy_class(user=self._user)
+        self._strategy_name = strategy_name
     
     def recommend(self, queryset: QuerySet) -> QuerySet:
         # estrategia actual al queryset de profesores.
         
         return self._strategy.apply(queryset)
     
+    def get_ordering(self) -> tuple:
+        # Orden de la estrategia actual, usado como clave de la paginación por cursor
+        return self._strategy.get_ordering()
+
+    def ranked_ids(self) -> rankings.Ranking:
+        # Ids de todos los profesores en el orden de la estrategia actual, con su índice de posiciones.
+        # Se guardan en caché por estrategia hasta que cambian los campos de su orden;
+        # las estrategias personalizadas calculan los suyos.
+        ids = self._strategy.ranked_ids()
+        if ids is not None:
+            return ids
+        return rankings.ids(self._strategy_name, self.get_ordering())
+
     def get_current_strategy_name(self) -> str:
         # Retorna el nombre de la estrategia actual
         return self._strategy.get_name()
@@ -124,3 +169,14 @@ class RecommendationEngine:
         if not issubclass(strategy_class, RecommendationStrategy):
             raise TypeError("La estrategia debe heredar de RecommendationStrategy")
         cls._strategies[name] = strategy_class
+        rankings.invalidar(name)
+
+    @classmethod
+    def invalidate_rankings(cls, fields=None):
+        # Invalida las listas en caché de las estrategias que ordenan por alguno de los
+        # campos indicados (todas si fields es None).
+
+        for name, strategy_class in cls._strategies.items():
+            ordering = {field.lstrip('-') for field in strategy_class().get_ordering()}
+            if fields is None or ordering & set(fields):
+                rankings.invalidar(name)
@@ -0,0 +1,215 @@
+"""
+Profesores similares según el texto de sus reseñas aprobadas y los nombres de sus materias.
+Cada profesor es un vector TF-IDF (frecuencia sublineal por la rareza del término en todo el
+catálogo, normalizado a longitud 1) y la similitud entre dos profesores es el coseno de sus
+vectores. Los K más parecidos se guardan en ProfesorSimilar, así que la página del profesor
+no compara textos: lee sus vecinos con una consulta por índice.
+
+El comando build_similar_profesores llama a actualizar(). Las frecuencias de términos de
+cada profesor se guardan en VectorTexto y solo se recalculan (leyendo sus reseñas) para los
+profesores cuyo version_datos o materias cambiaron. Con todos los vectores en memoria como
+matriz dispersa (arreglos CSR/CSC de numpy) se recalculan los vecinos de esos profesores y
+de los que ahora los tendrían entre sus K más parecidos. Los demás conservan sus vecinos;
+como los pesos IDF cambian poco entre ejecuciones, --completo los rehace todos de vez en cuando.
+"""
+
+from collections import Counter, namedtuple
+
+from django.db import transaction
+
+from .busqueda import terminos
+
+
+# Palabras demasiado comunes en las reseñas para distinguir a un profesor de otro
+PALABRAS_VACIAS = frozenset('''
+    al algo algun alguna algunas alguno algunos ante antes aqui asi aun bien cada casi como con
+    cual cuando de del desde donde dos el ella ellas ellos en entre era eran es esa esas ese eso
+    esos esta estaba estan estas este esto estos fue fueron ha hace hacer han hasta hay la las le
+    les lo los mas me mi mis mismo mucho muy ni no nos o otra otras otro otros para pero poco por
+    porque profe profesor profesora que se ser si sin sobre solo son su sus tambien tan te tiene
+    tienen todo todos tu un una uno unos y ya
+'''.split())
+# Cada término del nombre de una materia cuenta como esta cantidad de apariciones
+PESO_MATERIAS = 3
+LOTE = 500
+
+Resultado = namedtuple('Resultado', ['vectores', 'recalculados', 'total'])
+
+
+def documento(contenidos, materias):
+    # Frecuencia de los términos útiles de las reseñas y de los nombres de las materias
+    conteo = Counter(
+        termino for contenido in contenidos for termino in terminos(contenido)
+        if len(termino) > 2 and termino not in PALABRAS_VACIAS
+    )
+    for nombre in materias:
+        for termino in terminos(nombre):
+            conteo[termino] += PESO_MATERIAS
+    return conteo
+
+
+def actualizar(vecinos=10, completo=False):
+    # Recalcula los vectores cambiados y los vecinos afectados. Retorna un Resultado con la
+    # cantidad de vectores recalculados, de profesores con vecinos nuevos y de profesores.
+    from .models import Profesor, ProfesorSimilar, VectorTexto
+
+    materias = _materias_por_profesor()
+    versiones = dict(Profesor.objects.values_list('pk', 'version_datos'))
+    guardados = {
+        pk: (version, nombres)
+        for pk, version, nombres in VectorTexto.objects.values_list('profesor_id', 'version_datos', 'materias')
+    }
+    cambiados = [
+        pk for pk, version in versiones.items()
+        if completo or guardados.get(pk) != (version, materias.get(pk, ''))
+    ]
+    for inicio in range(0, len(cambiados), LOTE):
+        _guardar_vectores(cambiados[inicio:inicio + LOTE], versiones, materias)
+
+    matriz = _matriz_tfidf(dict(VectorTexto.objects.values_list('profesor_id', 'terminos')))
+    if completo:
+        afectados = set(range(len(matriz.ids)))
+    else:
+        afectados = _afectados(matriz, cambiados, vecinos)
+
+    filas = []
+    for fila in afectados:
+        puntajes = matriz.similitudes(fila)
+        for posicion, otra in enumerate(_mejores(puntajes, vecinos)):
+            filas.append(ProfesorSimilar(
+                profesor_id=matriz.ids[fila], similar_id=matriz.ids[otra],
+                posicion=posicion, puntaje=float(puntajes[otra]),
+            ))
+    profesor_ids = [matriz.ids[fila] for fila in afectados]
+    with transaction.atomic():
+        for inicio in range(0, len(profesor_ids), LOTE):
+            ProfesorSimilar.objects.filter(profesor_id__in=profesor_ids[inicio:inicio + LOTE]).delete()
+        ProfesorSimilar.objects.bulk_create(filas, batch_size=LOTE)
+    return Resultado(len(cambiados), len(afectados), len(versiones))
+
+
+def _materias_por_profesor():
+    # Nombres de las materias de cada profesor, ordenados y unidos en un texto
+    from .models import Profesor
+
+    materias = {}
+    relaciones = Profesor.materias.through.objects.values_list('profesor_id', 'materia__nombre')
+    for profesor_id, nombre in relaciones.order_by('materia__nombre'):
+        materias.setdefault(profesor_id, []).append(nombre)
+    return {profesor_id: '|'.join(nombres) for profesor_id, nombres in materias.items()}
+
+
+def _guardar_vectores(profesor_ids, versiones, materias):
+    from review.models import Comentario
+    from .models import VectorTexto
+
+    contenidos = {pk: [] for pk in profesor_ids}
+    aprobados = Comentario.objects.filter(profesor_id__in=profesor_ids, aprobado_por_ia=True)
+    for profesor_id, contenido in aprobados.values_list('profesor_id', 'contenido').iterator():
+        contenidos[profesor_id].append(contenido)
+    vectores = [
+        VectorTexto(
+            profesor_id=pk,
+            terminos=documento(contenidos[pk], filter(None, materias.get(pk, '').split('|'))),
+            version_datos=versiones[pk],
+            materias=materias.get(pk, ''),
+        )
+        for pk in profesor_ids
+    ]
+    with transaction.atomic():
+        VectorTexto.objects.filter(profesor_id__in=profesor_ids).delete()
+        VectorTexto.objects.bulk_create(vectores)
+
+
+class _MatrizTfidf:
+    # Filas normalizadas por profesor en formato CSR, más la transpuesta (CSC) para
+    # calcular las similitudes de una fila con todas las demás sin recorrer la matriz densa.
+
+    def __init__(self, ids, filas_ptr, columnas, pesos, columnas_ptr, filas_por_columna, pesos_por_columna):
+        self.ids = ids
+        self.posicion = {pk: fila for fila, pk in enumerate(ids)}
+        self.filas_ptr = filas_ptr
+        self.columnas = columnas
+        self.pesos = pesos
+        self.columnas_ptr = columnas_ptr
+        self.filas_por_columna = filas_por_columna
+        self.pesos_por_columna = pesos_por_columna
+
+    def similitudes(self, fila):
+        # Coseno de la fila con todas las filas: por cada término de la fila se suman sus
+        # apariciones en las demás (la lista de la columna), en una sola operación de numpy
+        import numpy as np
+
+        desde, hasta = self.filas_ptr[fila], self.filas_ptr[fila + 1]
+        columnas = self.columnas[desde:hasta]
+        inicios, fines = self.columnas_ptr[columnas], self.columnas_ptr[columnas + 1]
+        largos = fines - inicios
+        # Posiciones de todas las entradas de esas columnas, concatenadas
+        posiciones = np.repeat(inicios - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+        pesos = np.repeat(self.pesos[desde:hasta], largos) * self.pesos_por_columna[posiciones]
+        puntajes = np.bincount(self.filas_por_columna[posiciones], weights=pesos, minlength=len(self.ids))
+        puntajes[fila] = 0.0
+        return puntajes
+
+
+def _matriz_tfidf(vectores):
+    import numpy as np
+
+    ids = sorted(vectores)
+    vocabulario = {}
+    filas, columnas, frecuencias = [], [], []
+    for fila, pk in enumerate(ids):
+        for termino, cantidad in vectores[pk].items():
+            filas.append(fila)
+            columnas.append(vocabulario.setdefault(termino, len(vocabulario)))
+            frecuencias.append(cantidad)
+    filas = np.array(filas, dtype=np.int64)
+    columnas = np.array(columnas, dtype=np.int64)
+
+    # TF sublineal e IDF suavizado; después cada fila se normaliza a longitud 1
+    documentos = np.bincount(columnas, minlength=len(vocabulario))
+    idf = np.log((1 + len(ids)) / (1 + documentos)) + 1
+    pesos = (1 + np.log(np.array(frecuencias, dtype=np.float64))) * idf[columnas]
+    normas = np.sqrt(np.bincount(filas, weights=pesos ** 2, minlength=len(ids)))
+    pesos = (pesos / np.where(normas > 0, normas, 1)[filas]).astype(np.float32)
+
+    filas_ptr = np.concatenate([[0], np.cumsum(np.bincount(filas, minlength=len(ids)))])
+    orden = np.argsort(columnas, kind='stable')
+    columnas_ptr = np.concatenate([[0], np.cumsum(documentos)])
+    return _MatrizTfidf(ids, filas_ptr, columnas, pesos, columnas_ptr, filas[orden], pesos[orden])
+
+
+def _afectados(matriz, cambiados, vecinos):
+    # Filas cuyos vecinos hay que recalcular: las que cambiaron, las que tenían a alguna de
+    # ellas como vecina y las que ahora la tendrían entre sus K más parecidas.
+    import numpy as np
+    from .models import ProfesorSimilar
+
+    cambiados = [matriz.posicion[pk] for pk in cambiados if pk in matriz.posicion]
+    if not cambiados:
+        return set()
+    ids_cambiados = [matriz.ids[fila] for fila in cambiados]
+    afectados = set(cambiados)
+    # Puntaje del K-ésimo vecino de cada profesor; sin K vecinos, cualquier similitud positiva entra
+    umbral = np.zeros(len(matriz.ids))
+    for profesor_id, puntaje in ProfesorSimilar.objects.filter(posicion=vecinos - 1).values_list('profesor_id', 'puntaje'):
+        if profesor_id in matriz.posicion:
+            umbral[matriz.posicion[profesor_id]] = puntaje
+    for inicio in range(0, len(ids_cambiados), LOTE):
+        anteriores = ProfesorSimilar.objects.filter(similar_id__in=ids_cambiados[inicio:inicio + LOTE])
+        afectados.update(
+            matriz.posicion[pk] for pk in anteriores.values_list('profesor_id', flat=True) if pk in matriz.posicion
+        )
+    for fila in cambiados:
+        afectados.update(np.flatnonzero(matriz.similitudes(fila) > umbral).tolist())
+    return afectados
+
+
+def _mejores(puntajes, cantidad):
+    # Posiciones de los `cantidad` puntajes positivos más altos, de mayor a menor
+    import numpy as np
+
+    positivos = np.flatnonzero(puntajes > 0)
+    if len(positivos) > cantidad:
+        positivos = positivos[np.argpartition(-puntajes[positivos], cantidad - 1)[:cantidad]]
+    return positivos[np.lexsort((positivos, -puntajes[positivos]))].tolist()
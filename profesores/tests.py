@@ -1,3 +1,868 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import autocompletado, busqueda, rankings
+from .chart_cache import ChartRenderCache, chart_cache
+from .chart_factory import ChartFactory, LineChartGenerator
+from .management.commands.benchmark_componentes import AprobadorFijo, Command as BenchmarkComponentes
+from .models import Profesor, Materia, ProfesorSimilar, VectorTexto, puntaje_bayesiano
+from .paginacion import paginar, paginar_ids
+from .recommendation_strategies import AlphabeticalStrategy, RecommendationEngine
+from review import agregaciones
+from review.facades import ComentarioFacade
+from review.models import Comentario
+
+
+@override_settings(PUNTAJE_BAYESIANO_MEDIA=3.0, PUNTAJE_BAYESIANO_PESO=3)
+class RecomendacionBalanceadaTests(TestCase):
+    # El orden 'balanced' es un solo ORDER BY por puntaje bayesiano.
+
+    def crear(self, nombre, suma, cantidad):
+        return Profesor.objects.create(
+            nombre=nombre, departamento='Ciencias', suma_ratings=suma, numcomentarios=cantidad,
+            puntaje_bayesiano=puntaje_bayesiano(suma, cantidad),
+        )
+
+    def test_pocas_resenas_se_acercan_a_la_media(self):
+        perfecto_con_una = self.crear('Una reseña', 5, 1)
+        bueno_con_muchas = self.crear('Muchas reseñas', 45, 10)
+        sin_resenas = self.crear('Sin reseñas', 0, 0)
+        materia = Materia.objects.create(nombre='Cálculo')
+        for profesor in (perfecto_con_una, bueno_con_muchas, sin_resenas):
+            profesor.materias.add(materia)
+
+        # Funciona con filtros que usan distinct() y con slicing, a diferencia de un UNION
+        profesores = Profesor.objects.filter(materias__nombre__icontains='cálculo').distinct()
+        ordenados = RecommendationEngine('balanced').recommend(profesores)
+        self.assertEqual(list(ordenados), [bueno_con_muchas, perfecto_con_una, sin_resenas])
+        self.assertEqual(list(ordenados[1:2]), [perfecto_con_una])
+
+
+class PaginacionPorCursorTests(TestCase):
+    # Recorrer las páginas con los cursores devuelve cada profesor una sola vez, en orden.
+
+    def test_recorrer_paginas(self):
+        for i in range(7):
+            # Calificaciones repetidas para que el desempate por id importe
+            Profesor.objects.create(nombre=f'Profesor {i}', departamento='Ciencias', calificacion_media=i % 2)
+        engine = RecommendationEngine('best_rated')
+        esperados = list(engine.recommend(Profesor.objects.all()))
+
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar(Profesor.objects.all(), engine.get_ordering(), 3, cursor)
+            vistos += pagina.objetos
+            if pagina.cursor_siguiente is None:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual(vistos, esperados)
+
+        anterior = paginar(Profesor.objects.all(), engine.get_ordering(), 3, pagina.cursor_anterior)
+        self.assertEqual(anterior.objetos, esperados[3:6])
+        self.assertEqual(paginar(Profesor.objects.all(), engine.get_ordering(), 3, 'basura').objetos, esperados[:3])
+
+
+class RankingsEnCacheTests(TestCase):
+    # Cada estrategia guarda sus ids ordenados hasta que cambian los campos de su orden.
+
+    def setUp(self):
+        RecommendationEngine.invalidate_rankings()
+        self.usuario = User.objects.create_user('estudiante', password='clave')
+        for n in range(7):
+            Profesor.objects.create(nombre=f'Profesor {n}', departamento='Ciencias')
+
+    def test_listas_en_cache_e_invalidacion(self):
+        engine = RecommendationEngine('most_reviewed')
+        alfabetica = RecommendationEngine('alphabetical').ranked_ids()
+        ids = engine.ranked_ids()
+        self.assertIs(engine.ranked_ids(), ids)
+        self.assertEqual(list(ids), list(engine.recommend(Profesor.objects.all()).values_list('pk', flat=True)))
+
+        # Una reseña cambia el orden por comentarios, pero no el alfabético; la invalidación
+        # ocurre al confirmar la transacción
+        ultimo = Profesor.objects.get(pk=ids[-1])
+        with self.captureOnCommitCallbacks(execute=True):
+            Comentario.objects.create(
+                profesor=ultimo, usuario=self.usuario, contenido='Bien', rating=4, aprobado_por_ia=True,
+            )
+            self.assertIs(engine.ranked_ids(), ids)
+        self.assertEqual(engine.ranked_ids()[0], ultimo.pk)
+        self.assertIs(RecommendationEngine('alphabetical').ranked_ids(), alfabetica)
+
+        # Las estrategias registradas después también se guardan en caché
+        class Inversa(AlphabeticalStrategy):
+            def get_ordering(self):
+                return ('-nombre', '-id')
+        RecommendationEngine.register_strategy('inversa', Inversa)
+        self.addCleanup(RecommendationEngine._strategies.pop, 'inversa')
+        inversa = RecommendationEngine('inversa')
+        self.assertIs(inversa.ranked_ids(), inversa.ranked_ids())
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Profesor.objects.create(nombre='Zoe', departamento='Artes')
+        self.assertEqual(inversa.ranked_ids()[0], nuevo.pk)
+
+    def test_invalidacion_desde_otro_proceso(self):
+        engine = RecommendationEngine('alphabetical')
+        ids = engine.ranked_ids()
+        # Otro proceso renombra sin signals (UPDATE masivo) y cambia el token en la caché compartida
+        Profesor.objects.filter(pk=ids[-1]).update(nombre='Aaron')
+        self.assertIs(engine.ranked_ids(), ids)
+        caches[rankings.ALIAS_CACHE].set(rankings.PREFIJO_VERSION + 'alphabetical', 'token de otro proceso', None)
+        self.assertEqual(engine.ranked_ids()[0], ids[-1])
+
+        # Sin invalidación, la lista se reconstruye al vencer RANKINGS_REFRESCO
+        Profesor.objects.filter(pk=ids[-2]).update(nombre='Aaaron')
+        self.assertNotEqual(engine.ranked_ids()[0], ids[-2])
+        with override_settings(RANKINGS_REFRESCO=0):
+            self.assertEqual(engine.ranked_ids()[0], ids[-2])
+
+    def test_paginas_desde_la_lista(self):
+        engine = RecommendationEngine('alphabetical')
+        esperados = list(engine.recommend(Profesor.objects.all()))
+        pagina = paginar_ids(Profesor.objects.all(), engine.ranked_ids(), engine.get_ordering(), 3)
+        self.assertEqual(pagina.objetos, esperados[:3])
+        siguiente = paginar_ids(Profesor.objects.all(), engine.ranked_ids(), engine.get_ordering(), 3, pagina.cursor_siguiente)
+        self.assertEqual(siguiente.objetos, esperados[3:6])
+        anterior = paginar_ids(Profesor.objects.all(), engine.ranked_ids(), engine.get_ordering(), 3, siguiente.cursor_anterior)
+        self.assertEqual(anterior.objetos, esperados[:3])
+        # Los cursores de la consulta ordenada sirven con la lista y viceversa
+        self.assertEqual(paginar(Profesor.objects.all(), engine.get_ordering(), 3, siguiente.cursor_siguiente).objetos, esperados[6:])
+        self.assertEqual(
+            paginar_ids(Profesor.objects.all(), engine.ranked_ids(), engine.get_ordering(), 3,
+                        paginar(Profesor.objects.all(), engine.get_ordering(), 3).cursor_siguiente).objetos,
+            esperados[3:6],
+        )
+
+        # La página sale de la posición guardada en el cursor, sin buscar el id en la lista
+        class SinBusqueda(list):
+            def index(self, *args):
+                raise AssertionError('recorre la lista')
+        ids = SinBusqueda(engine.ranked_ids())
+        with self.assertNumQueries(1):
+            pagina = paginar_ids(Profesor.objects.all(), ids, engine.get_ordering(), 3, siguiente.cursor_siguiente)
+        self.assertEqual(pagina.objetos, esperados[6:])
+
+    def test_indice_de_posiciones(self):
+        ranking = RecommendationEngine('most_reviewed').ranked_ids()
+        lista = list(ranking)
+        self.assertEqual([ranking.posicion(pk) for pk in lista], list(range(len(lista))))
+        self.assertIsNone(ranking.posicion(max(lista) + 1))
+        self.assertIsNone(ranking.posicion('1'))
+        # Los resultados de una búsqueda quedan en el orden del ranking
+        self.assertEqual(list(ranking.ordenar(sorted(lista[1::2]) + [max(lista) + 1])), lista[1::2])
+
+        # Con los primeros delante, las posiciones del resto se calculan desde las de la base
+        personalizada = rankings.RankingConPrimeros([lista[3], lista[0]], ranking)
+        esperada = [lista[3], lista[0]] + [pk for pk in lista if pk not in (lista[3], lista[0])]
+        self.assertEqual(list(personalizada), esperada)
+        self.assertEqual([personalizada.posicion(pk) for pk in esperada], list(range(len(esperada))))
+        self.assertEqual(list(personalizada.ordenar(lista[:4])), [lista[3], lista[0], lista[1], lista[2]])
+
+    def test_cursor_desfasado_salta_por_el_indice(self):
+        engine = RecommendationEngine('alphabetical')
+        esperados = list(engine.recommend(Profesor.objects.all()))
+        cursor = paginar_ids(Profesor.objects.all(), engine.ranked_ids(), engine.get_ordering(), 3).cursor_siguiente
+        # Sin la primera fila la posición guardada en el cursor ya no es la de su profesor,
+        # y el de la consulta ordenada no trae posición: los dos se buscan en el índice
+        ids = rankings.Ranking(list(engine.ranked_ids())[1:])
+        cursor_consulta = paginar(Profesor.objects.all(), engine.get_ordering(), 3).cursor_siguiente
+        with mock.patch('profesores.paginacion.paginar', side_effect=AssertionError('consulta ordenada')):
+            for siguiente in (cursor, cursor_consulta):
+                pagina = paginar_ids(Profesor.objects.all(), ids, engine.get_ordering(), 3, siguiente)
+                self.assertEqual(pagina.objetos, esperados[3:6])
+
+    def test_cursores_alterados(self):
+        for nombre, contenido in (
+            ('alphabetical', ['despues', [{'a': 1}, 'x']]),
+            ('most_reviewed', ['despues', ['x', 'y', 'z']]),
+            ('most_reviewed', ['antes', [1, 2.5, 3], 'x']),
+        ):
+            engine = RecommendationEngine(nombre)
+            primera = list(engine.recommend(Profesor.objects.all())[:3])
+            cursor = base64.urlsafe_b64encode(json.dumps(contenido).encode()).decode()
+            self.assertEqual(paginar(Profesor.objects.all(), engine.get_ordering(), 3, cursor).objetos, primera)
+            self.assertEqual(
+                paginar_ids(Profesor.objects.all(), engine.ranked_ids(), engine.get_ordering(), 3, cursor).objetos, primera,
+            )
+
+
+class RecomendacionColaborativaTests(TestCase):
+    # Con dos grupos de estudiantes de gustos opuestos, cada uno recibe los profesores de su grupo.
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(RECOMENDACIONES_MODELO=os.path.join(directorio.name, 'modelo.npz'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        RecommendationEngine.invalidate_rankings()
+
+        self.profesores = [Profesor.objects.create(nombre=f'Profesor {n}', departamento='Ciencias') for n in range(8)]
+        self.usuarios = [User.objects.create(username=f'estudiante{n}') for n in range(16)]
+        for n, usuario in enumerate(self.usuarios):
+            # Los pares prefieren a los 4 primeros profesores y los impares a los 4 últimos.
+            # Cada estudiante deja sin reseñar a uno de cada grupo.
+            for i, profesor in enumerate(self.profesores):
+                if i % 4 != n // 2 % 4:
+                    gusta = (i < 4) == (n % 2 == 0)
+                    Comentario.objects.create(
+                        profesor=profesor, usuario=usuario, contenido='Reseña',
+                        rating=5 if gusta else 1, aprobado_por_ia=True,
+                    )
+
+    def test_recomienda_segun_usuarios_parecidos(self):
+        call_command('train_recommendations', factores=4, stdout=io.StringIO())
+
+        # Primero los dos que no ha reseñado, el de su grupo antes; después el orden balanceado
+        par, impar = self.usuarios[0], self.usuarios[1]
+        ids = list(RecommendationEngine('personalized', user=par).ranked_ids())
+        self.assertEqual(ids[:2], [self.profesores[0].pk, self.profesores[4].pk])
+        self.assertCountEqual(ids, [profesor.pk for profesor in self.profesores])
+        ids = list(RecommendationEngine('personalized', user=impar).ranked_ids())
+        self.assertEqual(ids[:2], [self.profesores[4].pk, self.profesores[0].pk])
+
+        # Con filtros de búsqueda también se sigue el orden personalizado
+        self.client.force_login(impar)
+        with self.settings(PROFESORES_POR_PAGINA=3):
+            respuesta = self.client.get(reverse('lista_profesores'), {'orden_field': 'para_ti', 'searchDepartamento': 'ciencias'})
+        self.assertEqual([profesor.pk for profesor in respuesta.context['profesores']], ids[:3])
+        self.client.logout()
+
+        # Sin reseñas (arranque en frío) o sin sesión, el orden es el balanceado
+        nuevo = User.objects.create(username='nuevo')
+        balanceado = list(RecommendationEngine('balanced').ranked_ids())
+        self.assertEqual(list(RecommendationEngine('personalized', user=nuevo).ranked_ids()), balanceado)
+        self.assertEqual(list(RecommendationEngine('personalized').ranked_ids()), balanceado)
+
+
+class SimilaresTests(TestCase):
+    # Los vecinos se calculan por el texto de las reseñas y solo se rehacen los afectados.
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='estudiante')
+        textos = {
+            'Ana': 'Explica muy bien las integrales y las derivadas',
+            'Beto': 'Las integrales quedan claras con sus ejemplos de derivadas',
+            'Carla': 'Laboratorios de química orgánica muy exigentes',
+            'Dario': 'Exige mucho en los laboratorios de química',
+            'Elena': 'Clases de historia del arte muy amenas',
+        }
+        self.profesores = {}
+        for nombre, texto in textos.items():
+            self.profesores[nombre] = Profesor.objects.create(nombre=nombre, departamento='Ciencias')
+            self.resenar(nombre, texto)
+
+    def resenar(self, nombre, texto):
+        Comentario.objects.create(
+            profesor=self.profesores[nombre], usuario=self.usuario, contenido=texto, rating=4, aprobado_por_ia=True,
+        )
+
+    def vecinos(self, nombre):
+        return [
+            similar.similar.nombre
+            for similar in ProfesorSimilar.objects.filter(profesor=self.profesores[nombre]).order_by('posicion')
+        ]
+
+    def test_vecinos_e_incremental(self):
+        call_command('build_similar_profesores', vecinos=2, stdout=io.StringIO())
+        self.assertEqual(self.vecinos('Ana'), ['Beto'])
+        self.assertEqual(self.vecinos('Carla'), ['Dario'])
+        self.assertEqual(self.vecinos('Elena'), [])
+        self.assertEqual(VectorTexto.objects.count(), 5)
+
+        # Sin cambios no se recalcula nada; con una reseña nueva solo ese vector
+        from . import similares
+        self.assertEqual(similares.actualizar(vecinos=2), (0, 0, 5))
+        self.resenar('Elena', 'Historia de las integrales y derivadas')
+        resultado = similares.actualizar(vecinos=2)
+        self.assertEqual(resultado.vectores, 1)
+        self.assertEqual(self.vecinos('Elena')[0], 'Ana')
+        self.assertIn('Elena', self.vecinos('Ana'))
+        self.assertEqual(self.vecinos('Carla'), ['Dario'])
+
+        # Lo incremental coincide con recalcular todo
+        incremental = {nombre: self.vecinos(nombre) for nombre in self.profesores}
+        similares.actualizar(vecinos=2, completo=True)
+        self.assertEqual({nombre: self.vecinos(nombre) for nombre in self.profesores}, incremental)
+
+        respuesta = self.client.get(reverse('detalle_profesor', args=[self.profesores['Ana'].id]))
+        self.assertEqual([item.similar.nombre for item in respuesta.context['similares']], self.vecinos('Ana'))
+        self.assertContains(respuesta, 'Profesores similares')
+
+
+class BusquedaTests(TestCase):
+    # La búsqueda ignora tildes y mayúsculas y sigue los cambios de nombres y materias.
+
+    def setUp(self):
+        self.garcia = Profesor.objects.create(nombre='José García', departamento='Ciencias Básicas')
+        self.perez = Profesor.objects.create(nombre='Ana Pérez', departamento='Ingeniería')
+        self.calculo = Materia.objects.create(nombre='Cálculo Diferencial')
+        self.garcia.materias.add(self.calculo)
+
+    def buscar(self, **campos):
+        return set(busqueda.filtrar(Profesor.objects.all(), **campos))
+
+    def comprobar_busquedas(self):
+        self.assertEqual(self.buscar(nombre='jose garcia'), {self.garcia})
+        self.assertEqual(self.buscar(nombre='GARC'), {self.garcia})
+        self.assertEqual(self.buscar(materia='calculo'), {self.garcia})
+        self.assertEqual(self.buscar(departamento='ingenieria'), {self.perez})
+        self.assertEqual(self.buscar(nombre='ana', materia='calculo'), set())
+        self.assertEqual(self.buscar(nombre='  '), {self.garcia, self.perez})
+
+        # Los índices siguen a los cambios de materias y de nombres
+        self.perez.materias.add(self.calculo)
+        self.calculo.nombre = 'Cálculo Integral'
+        self.calculo.save()
+        self.assertEqual(self.buscar(materia='integral'), {self.garcia, self.perez})
+        self.garcia.materias.remove(self.calculo)
+        self.perez.nombre = 'Ana Gómez'
+        self.perez.save()
+        self.assertEqual(self.buscar(materia='integral', nombre='gomez'), {self.perez})
+        self.calculo.delete()
+        self.assertEqual(self.buscar(materia='integral'), set())
+
+    def test_busqueda_fts(self):
+        if not busqueda.fts_disponible():
+            self.skipTest('La base de datos no tiene FTS5')
+        self.assertIn(busqueda.TABLA_FTS, str(busqueda.filtrar(Profesor.objects.all(), nombre='garcia').query))
+        self.comprobar_busquedas()
+
+    def test_busqueda_sin_fts(self):
+        with mock.patch.object(busqueda, 'fts_disponible', return_value=False):
+            busqueda.indexar_profesores([self.garcia.pk, self.perez.pk])
+            self.assertNotIn(busqueda.TABLA_FTS, str(busqueda.filtrar(Profesor.objects.all(), nombre='garcia').query))
+            self.comprobar_busquedas()
+
+
+class AutocompletadoTests(TestCase):
+    # Las sugerencias ignoran tildes, van de más a menos reseñadas y siguen a los signals.
+
+    def setUp(self):
+        autocompletado.indice.reiniciar()
+        self.addCleanup(autocompletado.indice.reiniciar)
+        self.garcia = Profesor.objects.create(nombre='José García', departamento='Ciencias', numcomentarios=3)
+        self.gomez = Profesor.objects.create(nombre='Gabriela Gómez', departamento='ciencias', numcomentarios=10)
+        self.geometria = Materia.objects.create(nombre='Geometría', numcomentarios=5)
+
+    def sugerencias(self, texto, **kwargs):
+        return [(s.tipo, s.texto) for s in autocompletado.indice.buscar(texto, **kwargs)]
+
+    def test_sugerencias(self):
+        self.assertEqual(
+            self.sugerencias('g'),
+            [('profesor', 'Gabriela Gómez'), ('materia', 'Geometría'), ('profesor', 'José García')],
+        )
+        self.assertEqual(self.sugerencias('JOSE gar'), [('profesor', 'José García')])
+        self.assertEqual(self.sugerencias('g', limite=1, tipos={'materia'}), [('materia', 'Geometría')])
+        # Los departamentos se agrupan sin distinguir mayúsculas y suman las reseñas de sus profesores
+        [departamento] = autocompletado.indice.buscar('cien')
+        self.assertEqual((departamento.texto, departamento.peso), ('Ciencias', 13))
+
+        respuesta = self.client.get(reverse('autocompletar'), {'q': 'geo', 'tipo': 'materia'})
+        self.assertEqual(respuesta.json()['resultados'], [{
+            'tipo': 'materia', 'texto': 'Geometría', 'comentarios': 5,
+            'url': reverse('lista_profesores') + '?searchMateria=Geometr%C3%ADa',
+        }])
+
+    def test_cambios_sin_recargar(self):
+        self.sugerencias('g')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.garcia.nombre = 'José Ruiz'
+            self.garcia.departamento = 'Artes'
+            self.garcia.save()
+            self.geometria.delete()
+            Materia.objects.create(nombre='Genética')
+        self.assertEqual(self.sugerencias('g'), [('profesor', 'Gabriela Gómez'), ('materia', 'Genética')])
+        self.assertEqual(self.sugerencias('ruiz'), [('profesor', 'José Ruiz')])
+        self.assertEqual(autocompletado.indice.buscar('ciencias')[0].peso, 10)
+
+    def test_responde_en_menos_de_5_ms(self):
+        Profesor.objects.bulk_create(
+            Profesor(nombre=f'Profesor Arango {n}', departamento='Ingeniería', numcomentarios=n % 50)
+            for n in range(5000)
+        )
+        autocompletado.indice.cargar()
+        duraciones = []
+        for texto in ['p', 'pro', 'a', 'arango 12', 'g', 'ing']:
+            # La primera consulta de un prefijo amplio ordena sus candidatas; se mide la siguiente
+            autocompletado.indice.buscar(texto)
+            inicio = time.perf_counter()
+            autocompletado.indice.buscar(texto)
+            duraciones.append(time.perf_counter() - inicio)
+        self.assertLess(max(duraciones), 0.005)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Los planes se verifican con EXPLAIN QUERY PLAN de SQLite')
+class PlanesDeConsultaTests(TestCase):
+    # Cada consulta de las páginas más visitadas debe usar un índice: ni recorrer la tabla
+    # completa (SCAN sin índice) ni ordenar o agrupar en un B-tree temporal.
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user('estudiante', password='clave')
+        cls.materia = Materia.objects.create(nombre='Cálculo')
+        cls.profesores = [
+            Profesor.objects.create(nombre=f'Profesor {i}', departamento='Ciencias') for i in range(30)
+        ]
+        for i, profesor in enumerate(cls.profesores):
+            profesor.materias.add(cls.materia)
+            Comentario.objects.create(
+                profesor=profesor, materia=cls.materia, usuario=usuario, contenido='Comentario de prueba',
+                rating=i % 5 + 1, fecha='2024-1', aprobado_por_ia=True,
+            )
+
+    def assertUsaIndices(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        for consulta in consultas.captured_queries:
+            if not consulta['sql'].startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {consulta['sql']}")
+                plan = '\n'.join(fila[-1] for fila in cursor.fetchall())
+            mensaje = f"{url}\n{consulta['sql']}\n{plan}"
+            self.assertNotRegex(plan, re.compile(r'^SCAN \w+$', re.MULTILINE), mensaje)
+            self.assertNotIn('USE TEMP B-TREE', plan, mensaje)
+
+    @override_settings(PROFESORES_POR_PAGINA=10)
+    def test_lista_de_profesores(self):
+        for orden in ('', 'mayor_comentarios', 'recomendado', 'menor_rating'):
+            self.assertUsaIndices(f'/profesores/?orden_field={orden}')
+            siguiente = self.client.get(f'/profesores/?orden_field={orden}').context['url_siguiente']
+            self.assertUsaIndices(f'/profesores/{siguiente}')
+
+    def test_detalle_y_graficas_del_profesor(self):
+        call_command('build_similar_profesores', stdout=io.StringIO())
+        profesor = self.profesores[0]
+        for filtros in ('', f'?materia={self.materia.id}', '?semestre=2024-1', '?rating=1',
+                        f'?materia={self.materia.id}&semestre=2024-1&rating=1'):
+            self.assertUsaIndices(f'/profesor/{profesor.id}/{filtros}')
+        for chart_type in ('bar', 'line'):
+            self.assertUsaIndices(f'/profesor/{profesor.id}/chart/{chart_type}.json?semestre=2024-1')
+
+    def test_estadisticas_de_materia(self):
+        self.assertUsaIndices(f'/estadisticas/?materia={self.materia.nombre}')
+        for chart_type in ('scatter', 'frequency', 'semester_line'):
+            self.assertUsaIndices(f'/materia/{self.materia.id}/chart/{chart_type}.json')
+
+
+class VersionDatosTests(TestCase):
+    # Renombrar un profesor o una materia invalida sus gráficas y las de sus relacionados.
+
+    def setUp(self):
+        self.materia = Materia.objects.create(nombre='Cálculo')
+        self.profesor = Profesor.objects.create(nombre='Ana', departamento='Ciencias')
+        self.profesor.materias.add(self.materia)
+        self.otro = Profesor.objects.create(nombre='Beto', departamento='Ciencias')
+
+    def versiones(self):
+        return [
+            modelo.objects.get(pk=objeto.pk).version_datos
+            for modelo, objeto in ((Profesor, self.profesor), (Materia, self.materia), (Profesor, self.otro))
+        ]
+
+    def test_renombrar_incrementa_la_version(self):
+        antes = self.versiones()
+        self.profesor.departamento = 'Matemáticas'
+        self.profesor.save(update_fields=['departamento'])
+        self.assertEqual(self.versiones(), antes)
+
+        self.profesor.nombre = 'Ana María'
+        self.profesor.save(update_fields=['nombre'])
+        self.assertEqual(self.versiones(), [antes[0] + 1, antes[1] + 1, antes[2]])
+
+        # Un save() completo (el del admin) también puede cambiar el nombre, y no pisa la versión ya incrementada
+        self.materia = Materia.objects.get(pk=self.materia.pk)
+        self.materia.nombre = 'Cálculo I'
+        self.materia.save()
+        self.assertEqual(self.versiones(), [antes[0] + 2, antes[1] + 2, antes[2]])
+        self.assertEqual(self.materia.version_datos, antes[1] + 2)
+        self.profesor = Profesor.objects.get(pk=self.profesor.pk)
+        self.profesor.save()
+        self.assertEqual(self.versiones(), [antes[0] + 3, antes[1] + 3, antes[2]])
+
+
+class CacheDeGraficasTests(TestCase):
+    # La caché LRU no vuelve a dibujar una gráfica con la misma huella y descarta la menos usada.
+
+    def setUp(self):
+        self.dibujos = []
+
+        def create_charts(batch, png=False):
+            self.dibujos.extend(datos for _, datos in batch.values())
+            return {clave: f'png {datos}'.encode() if datos else None for clave, (_, datos) in batch.items()}
+
+        parche = mock.patch('profesores.chart_cache.ChartFactory.create_charts', side_effect=create_charts)
+        parche.start()
+        self.addCleanup(parche.stop)
+        # La caché de las vistas no debe quedar con las gráficas falsas
+        chart_cache.clear()
+        self.addCleanup(chart_cache.clear)
+
+    def test_aciertos_fallos_y_desalojo(self):
+        graficas = ChartRenderCache(max_entries=2)
+        self.assertEqual(graficas.get_or_create('bar', 'a', profesor=1, version=0), b'png a')
+        # En un acierto los datos no se calculan
+        self.assertEqual(graficas.get_or_create('bar', lambda: self.fail('consultó los datos'), version=0, profesor=1),
+                         b'png a')
+        self.assertEqual((graficas.hits, graficas.misses), (1, 1))
+
+        # Otra versión de los datos es otra llave
+        self.assertEqual(graficas.get_or_create('bar', 'b', profesor=1, version=1), b'png b')
+        # Al pasar de max_entries sale la menos usada: la versión 0
+        graficas.get_or_create('bar', 'c', profesor=2, version=0)
+        self.assertEqual(len(graficas), 2)
+        self.assertEqual(graficas.get_or_create('bar', 'd', profesor=1, version=0), b'png d')
+        self.assertEqual(self.dibujos, ['a', 'b', 'c', 'd'])
+
+        # Las gráficas sin datos no se guardan
+        self.assertIsNone(graficas.get_or_create('line', [], profesor=1, version=1))
+        graficas.get_or_create('line', [], profesor=1, version=1)
+        self.assertEqual(self.dibujos[-2:], [[], []])
+
+    def test_limite_desde_settings(self):
+        self.assertEqual(chart_cache.max_entries, settings.CHART_CACHE_MAX_ENTRIES)
+        with override_settings(CHART_CACHE_MAX_ENTRIES=1):
+            graficas = ChartRenderCache()
+        graficas.get_or_create('bar', 'a', profesor=1, version=0)
+        graficas.get_or_create('bar', 'b', profesor=2, version=0)
+        self.assertEqual(len(graficas), 1)
+
+    def test_una_resena_nueva_invalida_la_grafica(self):
+        usuario = User.objects.create(username='estudiante')
+        profesor = Profesor.objects.create(nombre='Ana', departamento='Ciencias')
+        Comentario.objects.create(profesor=profesor, usuario=usuario, contenido='Buena', rating=4, aprobado_por_ia=True)
+        url = reverse('grafica_profesor', args=[profesor.id, 'bar'])
+
+        self.assertEqual(self.client.get(url).content, b'png [(4, 1)]')
+        self.client.get(url)
+        self.assertEqual((chart_cache.hits, chart_cache.misses), (1, 1))
+        Comentario.objects.create(profesor=profesor, usuario=usuario, contenido='Mala', rating=2, aprobado_por_ia=True)
+        self.assertEqual(self.client.get(url).content, b'png [(2, 1), (4, 1)]')
+        self.assertEqual((chart_cache.hits, chart_cache.misses), (1, 2))
+
+
+class ChartFactoryTests(TestCase):
+    # create_charts prepara en el hilo actual, dibuja en el pool y aísla las gráficas que fallan.
+
+    def test_varias_graficas_en_paralelo(self):
+        graficas = ChartFactory.create_charts({
+            'barras': ('bar', [(1, 2), (5, 3)]),
+            'linea': ('line', [('2024-1', 4.0, 2), ('2024-2', 3.5, 1)]),
+            'vacia': ('scatter', []),
+        }, png=True)
+        self.assertTrue(graficas['barras'].startswith(b'\x89PNG'))
+        self.assertTrue(graficas['linea'].startswith(b'\x89PNG'))
+        self.assertIsNone(graficas['vacia'])
+
+        # Sin png=True se retornan en base64; una sola gráfica se dibuja sin pasar por el pool
+        with mock.patch.object(ChartFactory, '_get_executor', side_effect=AssertionError('usó el pool')):
+            grafica = ChartFactory.create_charts({'sola': ('frequency', [(3, 1)])})['sola']
+        self.assertTrue(base64.b64decode(grafica).startswith(b'\x89PNG'))
+
+    def test_una_grafica_que_falla_no_afecta_a_las_demas(self):
+        with self.assertLogs('profesores.chart_factory', 'ERROR') as registros, \
+                mock.patch.object(LineChartGenerator, 'draw', side_effect=RuntimeError('sin fuentes')):
+            graficas = ChartFactory.create_charts({
+                'barras': ('bar', [(4, 1)]),
+                'linea': ('line', [('2024-1', 4.0, 1)]),
+                'semestres': ('semester_line', None),
+            }, png=True)
+        self.assertTrue(graficas['barras'].startswith(b'\x89PNG'))
+        self.assertIsNone(graficas['linea'])
+        self.assertIsNone(graficas['semestres'])
+        self.assertEqual(len(registros.records), 2)
+        self.assertTrue(all(registro.exc_info for registro in registros.records))
+
+        with self.assertRaises(ValueError):
+            ChartFactory.create_charts({'otra': ('pie', [])})
+
+
+class GraficasPngTests(TestCase):
+    # Las gráficas se sirven como PNG con ETag según la versión de los datos y los filtros.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username='estudiante')
+        cls.materia = Materia.objects.create(nombre='Cálculo')
+        cls.profesor = Profesor.objects.create(nombre='Ana', departamento='Ciencias')
+        cls.profesor.materias.add(cls.materia)
+        Comentario.objects.create(
+            profesor=cls.profesor, materia=cls.materia, usuario=cls.usuario, contenido='Buena',
+            rating=4, fecha='2024-1', aprobado_por_ia=True,
+        )
+
+    def setUp(self):
+        chart_cache.clear()
+        self.addCleanup(chart_cache.clear)
+
+    def version(self, objeto):
+        return type(objeto).objects.get(pk=objeto.pk).version_datos
+
+    def test_etag_y_304(self):
+        url = reverse('grafica_profesor', args=[self.profesor.id, 'bar'])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'image/png')
+        self.assertTrue(respuesta.content.startswith(b'\x89PNG'))
+        etag = respuesta['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Otro filtro es otra gráfica
+        filtrada = self.client.get(url, {'semestre': '2024-1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(filtrada.status_code, 200)
+        self.assertNotEqual(filtrada['ETag'], etag)
+
+        # Una reseña nueva cambia la versión y con ella el ETag
+        Comentario.objects.create(
+            profesor=self.profesor, usuario=self.usuario, contenido='Mala', rating=2, aprobado_por_ia=True,
+        )
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    @override_settings(CHART_MAX_AGE=600)
+    def test_cache_control(self):
+        url = reverse('grafica_materia', args=[self.materia.id, 'scatter'])
+        # Sin versión en la URL el navegador revalida siempre
+        self.assertEqual(self.client.get(url)['Cache-Control'], 'public, no-cache')
+        # Con la versión vigente puede reutilizarla
+        respuesta = self.client.get(url, {'v': self.version(self.materia)})
+        self.assertEqual(respuesta['Cache-Control'], 'public, max-age=600')
+        # Con una versión vieja vuelve a revalidar
+        viejo = self.version(self.materia)
+        self.materia.profesores.add(Profesor.objects.create(nombre='Beto', departamento='Ciencias'))
+        self.assertEqual(self.client.get(url, {'v': viejo})['Cache-Control'], 'public, no-cache')
+
+    def test_filtros_invalidos(self):
+        for nombre_url in ('grafica_profesor', 'datos_grafica_profesor'):
+            url = reverse(nombre_url, args=[self.profesor.id, 'bar'])
+            for parametros in ({'materia': 'abc'}, {'materia': '1; DROP'}, {'semestre': '1999-9'}):
+                respuesta = self.client.get(url, parametros)
+                self.assertEqual(respuesta.status_code, 400, (url, parametros))
+                self.assertFalse(respuesta.has_header('ETag'))
+            # Una materia válida sin reseñas del profesor no tiene datos
+            self.assertEqual(self.client.get(url, {'materia': self.materia.id + 1}).status_code, 404)
+            self.assertEqual(self.client.get(url, {'materia': self.materia.id, 'semestre': '2024-1'}).status_code, 200)
+
+    def test_graficas_inexistentes(self):
+        sin_resenas = Profesor.objects.create(nombre='Beto', departamento='Ciencias')
+        for url in (
+            reverse('grafica_profesor', args=[self.profesor.id, 'pie']),
+            reverse('grafica_profesor', args=[sin_resenas.id, 'bar']),
+            reverse('grafica_profesor', args=[0, 'bar']),
+            reverse('grafica_materia', args=[0, 'scatter']),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+
+class DatosGraficasTests(TestCase):
+    # Los endpoints .json entregan los datos de cada gráfica sin ejecutar matplotlib.
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create(username='estudiante')
+        cls.materia = Materia.objects.create(nombre='Cálculo')
+        cls.profesor = Profesor.objects.create(nombre='Ana', departamento='Ciencias')
+        cls.profesor.materias.add(cls.materia)
+        for rating, fecha in ((4, '2024-1'), (5, '2024-1'), (2, '2024-2')):
+            Comentario.objects.create(
+                profesor=cls.profesor, materia=cls.materia, usuario=usuario, contenido='Comentario',
+                rating=rating, fecha=fecha, aprobado_por_ia=True,
+            )
+
+    def setUp(self):
+        parche = mock.patch('profesores.chart_factory._matplotlib', side_effect=AssertionError('usó matplotlib'))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def datos(self, nombre_url, objeto_id, chart_type, **parametros):
+        respuesta = self.client.get(reverse(nombre_url, args=[objeto_id, chart_type]), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/json')
+        return respuesta.json()
+
+    def test_datos_del_profesor(self):
+        self.assertEqual(self.datos('datos_grafica_profesor', self.profesor.id, 'bar'),
+                         {'type': 'bar', 'labels': [1, 2, 3, 4, 5], 'values': [0, 1, 0, 1, 1]})
+        self.assertEqual(self.datos('datos_grafica_profesor', self.profesor.id, 'bar', semestre='2024-1'),
+                         {'type': 'bar', 'labels': [1, 2, 3, 4, 5], 'values': [0, 0, 0, 1, 1]})
+        self.assertEqual(self.datos('datos_grafica_profesor', self.profesor.id, 'line', materia=self.materia.id),
+                         {'type': 'line', 'labels': ['2024-1', '2024-2'], 'values': [4.5, 2.0]})
+
+        # El JSON y el PNG de la misma gráfica tienen ETags distintos
+        url = reverse('datos_grafica_profesor', args=[self.profesor.id, 'bar'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        png = reverse('grafica_profesor', args=[self.profesor.id, 'bar'])
+        with mock.patch('profesores.views.chart_cache.get_or_create', return_value=b'png'):
+            self.assertEqual(self.client.get(png, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_datos_de_la_materia(self):
+        self.assertEqual(self.datos('datos_grafica_materia', self.materia.id, 'scatter'),
+                         {'type': 'scatter', 'points': [['Ana', 3.67, 3]]})
+        self.assertEqual(self.datos('datos_grafica_materia', self.materia.id, 'frequency')['values'], [0, 1, 0, 1, 1])
+        self.assertEqual(self.datos('datos_grafica_materia', self.materia.id, 'semester_line'), {
+            'type': 'semester_line', 'labels': ['2024-1', '2024-2'], 'values': [4.5, 2.0],
+            'title': 'Promedio de Rating por Semestre para Cálculo',
+        })
+        self.assertEqual(
+            self.client.get(reverse('datos_grafica_materia', args=[self.materia.id, 'bar'])).status_code, 404,
+        )
+
+    def test_paginas_en_modo_cliente(self):
+        respuesta = self.client.get(reverse('detalle_profesor', args=[self.profesor.id]), {'graficas': 'cliente'})
+        self.assertContains(respuesta, f'data-chart-url="/profesor/{self.profesor.id}/chart/bar.json?')
+        respuesta = self.client.get(reverse('estadisticas'), {'materia': 'Cálculo', 'graficas': 'cliente'})
+        self.assertContains(respuesta, f'/materia/{self.materia.id}/chart/scatter.json?')
+
+
+class ArranquePerezosoTests(TestCase):
+    # Un proceso nuevo no importa matplotlib ni openai hasta que los necesita.
+
+    def modulos_al_arrancar(self):
+        salida = io.StringIO()
+        call_command('benchmark_arranque', '--json', '--repeticiones', '1', stdout=salida)
+        return json.loads(salida.getvalue())['modulos_pesados']
+
+    def test_sin_modulos_pesados_al_arrancar(self):
+        self.assertEqual(self.modulos_al_arrancar(), {'matplotlib': False, 'numpy': False, 'openai': False})
+
+        # Con la precarga activa matplotlib sí se importa en AppConfig.ready()
+        with mock.patch.dict(os.environ, {'PRECARGAR_DEPENDENCIAS': 'True'}):
+            self.assertTrue(self.modulos_al_arrancar()['matplotlib'])
+
+
+class AgregacionesTests(TestCase):
+    # Las gráficas y la fachada leen sus agregados con una consulta agrupada, sin recorrer reseñas.
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create(username='estudiante')
+        cls.calculo = Materia.objects.create(nombre='Cálculo')
+        cls.fisica = Materia.objects.create(nombre='Física')
+        cls.ana = Profesor.objects.create(nombre='Ana', departamento='Ciencias')
+        cls.beto = Profesor.objects.create(nombre='Beto', departamento='Ciencias')
+        cls.ana.materias.add(cls.calculo, cls.fisica)
+        cls.beto.materias.add(cls.calculo)
+        for materia, rating, fecha, aprobado in (
+            (cls.calculo, 5, '2024-1', True), (cls.calculo, 3, '2024-1', True),
+            (cls.fisica, 4, '2024-2', True), (cls.calculo, 1, '2024-2', False),
+        ):
+            Comentario.objects.create(
+                profesor=cls.ana, materia=materia, usuario=usuario, contenido='Comentario',
+                rating=rating, fecha=fecha, aprobado_por_ia=aprobado,
+            )
+
+    def test_agregados_con_filtros(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(agregaciones.promedios_por_semestre(profesor=self.ana),
+                             [('2024-1', 4.0, 2), ('2024-2', 4.0, 1)])
+        with self.assertNumQueries(1):
+            self.assertEqual(agregaciones.conteo_ratings(profesor=self.ana), [(3, 1), (4, 1), (5, 1)])
+        self.assertEqual(agregaciones.conteo_ratings(materia=self.calculo, semestre='2024-1'), [(3, 1), (5, 1)])
+        self.assertEqual(agregaciones.promedios_por_semestre(materia=self.fisica), [('2024-2', 4.0, 1)])
+        self.assertEqual(agregaciones.semestres_con_calificaciones(profesor=self.ana), ['2024-2', '2024-1'])
+        self.assertTrue(agregaciones.hay_calificaciones(materia=self.fisica))
+        # La reseña no aprobada de Cálculo en 2024-2 no cuenta
+        self.assertFalse(agregaciones.hay_calificaciones(materia=self.calculo, semestre='2024-2'))
+        self.assertEqual(agregaciones.conteo_ratings(profesor=self.beto), [])
+
+    def test_promedios_por_profesor(self):
+        # Los profesores de la materia sin reseñas aparecen con promedio None
+        with self.assertNumQueries(2):
+            self.assertEqual(agregaciones.promedios_por_profesor(self.calculo), [('Ana', 4.0, 2), ('Beto', None, 0)])
+        self.assertEqual(agregaciones.promedios_por_profesor(self.fisica), [('Ana', 4.0, 1)])
+
+    def test_estadisticas_de_la_fachada(self):
+        estadisticas = ComentarioFacade(aprobador_strategy=mock.Mock()).obtener_estadisticas_profesor(self.ana)
+        self.assertEqual(estadisticas['total_comentarios'], 3)
+        self.assertEqual(estadisticas['distribucion_ratings'], {3: 1, 4: 1, 5: 1})
+        self.assertEqual(estadisticas['comentarios_por_semestre'], {
+            '2024-1': {'promedio': 4.0, 'cantidad': 2}, '2024-2': {'promedio': 4.0, 'cantidad': 1},
+        })
+
+
+class BenchmarkComponentesTests(TestCase):
+    # --comparar falla si un caso es más lento que la línea base o hace más consultas.
+
+    configuracion = {'profesores': 10, 'resenas': 100, 'usuarios': 5, 'repeticiones': 3}
+
+    def reporte(self, **resultados):
+        return {
+            'configuracion': self.configuracion,
+            'resultados': {
+                nombre: {'ms_mediana': ms, 'ms_min': ms, 'vueltas': 1, 'consultas': consultas, 'memoria_pico_kb': 1.0}
+                for nombre, (ms, consultas) in resultados.items()
+            },
+        }
+
+    def comparar(self, actual, base, tolerancia=0.25):
+        salida = io.StringIO()
+        BenchmarkComponentes(stdout=salida)._comparar(actual, base, tolerancia)
+        return salida.getvalue()
+
+    def test_regresiones(self):
+        base = self.reporte(**{'grafica:bar:png': (10.0, 2), 'fachada:crear_comentario': (4.0, 5)})
+        # Dentro de la tolerancia, y los casos nuevos no se comparan
+        salida = self.comparar(self.reporte(**{'grafica:bar:png': (12.0, 2), 'grafica:line:png': (99.0, 9)}), base)
+        self.assertIn('Sin regresiones', salida)
+        self.assertNotIn('grafica:line:png', salida)
+
+        with self.assertRaisesMessage(CommandError, '1 regresiones respecto a la línea base: grafica:bar:png'):
+            self.comparar(self.reporte(**{'grafica:bar:png': (13.0, 2), 'fachada:crear_comentario': (1.0, 5)}), base)
+        with self.assertRaisesMessage(CommandError, 'fachada:crear_comentario'):
+            self.comparar(self.reporte(**{'fachada:crear_comentario': (4.0, 6)}), base)
+        # Otra tolerancia cambia lo que cuenta como regresión
+        self.assertIn('Sin regresiones', self.comparar(self.reporte(**{'grafica:bar:png': (13.0, 2)}), base, 0.5))
+
+    def test_casos_de_la_fachada(self):
+        datos = {
+            'profesor': Profesor.objects.create(nombre='Ana', departamento='Ciencias'),
+            'materia': Materia.objects.create(nombre='Cálculo'),
+            'usuario': User.objects.create(username='estudiante'),
+        }
+        casos = dict(BenchmarkComponentes()._casos_fachada(datos))
+        with mock.patch.object(AprobadorFijo, 'aprobar', autospec=True, return_value=True) as aprobar:
+            # El caso síncrono pasa por el aprobador y publica la reseña
+            exito, comentario, _ = casos['fachada:crear_comentario']()
+            self.assertTrue(exito)
+            self.assertEqual(comentario.estado_moderacion, Comentario.APROBADO)
+            aprobar.assert_called_once()
+            # El asíncrono solo la encola
+            exito, comentario, _ = casos['fachada:crear_comentario:asincrona']()
+            self.assertEqual(comentario.estado_moderacion, Comentario.PENDIENTE)
+            aprobar.assert_called_once()
+        # Cada corrida se revierte
+        self.assertFalse(Comentario.objects.exists())
+
+    def test_linea_base_incompatible(self):
+        base = self.reporte(**{'grafica:bar:png': (10.0, 2)})
+        base['configuracion'] = {**self.configuracion, 'resenas': 1000, 'repeticiones': 5}
+        with self.assertRaisesMessage(CommandError, 'La línea base se midió con otros datos'):
+            self.comparar(self.reporte(**{'grafica:bar:png': (10.0, 2)}), base)
+
+        # Una línea base ilegible falla antes de sembrar la base
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as archivo:
+            archivo.write('{no es json')
+            archivo.flush()
+            with self.assertRaisesMessage(CommandError, 'No se pudo leer la línea base'):
+                call_command('benchmark_componentes', comparar=archivo.name, stdout=io.StringIO())
@@ -1,15 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.http import condition
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, Http404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.conf import settings
+from urllib.parse import urlencode
 import csv
+import hashlib
 from django.contrib import messages
 from .models import Profesor, Materia
 from .forms import UploadCSVForm, ProfesorForm, MateriaForm
 from review.models import Comentario
-from django.db.models import Avg, Count, Q
-# Importar el ChartFactory para usar el patrón Factory
+from review import agregaciones
+# Importar el ChartFactory (y su caché de renderizado) para usar el patrón Factory
 from .chart_factory import ChartFactory
+from .chart_cache import chart_cache
 # Importar el RecommendationEngine para usar el patrón Strategy
 from .recommendation_strategies import RecommendationEngine
+from .paginacion import paginar_ids
+from . import autocompletado, busqueda
 
 
 def is_admin(user):
@@ -22,18 +32,17 @@ def lista_profesores(request):
     """
     searchNombre = request.GET.get('searchNombre', '').strip()
     searchMateria = request.GET.get('searchMateria', '').strip()
+    searchDepartamento = request.GET.get('searchDepartamento', '').strip()
     orden_field = request.GET.get('orden_field', '')
 
-    # Selecciona inicialmente todos los profesores
-    profesores = Profesor.objects.all()
+    # Selecciona inicialmente todos los profesores; las materias de la página se cargan en una sola consulta
+    profesores = Profesor.objects.prefetch_related('materias')
 
-    # Filtrar por nombre del profesor
-    if searchNombre:
-        profesores = profesores.filter(nombre__icontains=searchNombre)
-    
-    # Filtrar por materias asociadas (ManyToMany)
-    if searchMateria:
-        profesores = profesores.filter(materias__nombre__icontains=searchMateria).distinct()
+    # Filtrar por nombre del profesor y por materias asociadas, sin distinguir tildes.
+    # El índice de búsqueda evita el JOIN con las materias y el distinct()
+    profesores = busqueda.filtrar(
+        profesores, nombre=searchNombre, materia=searchMateria, departamento=searchDepartamento
+    )
 
     # Sistema de Recomendación usando patrón Strategy
     if orden_field:
@@ -44,26 +53,76 @@ def lista_profesores(request):
             'mayor_comentarios': 'most_reviewed',
             'menor_comentarios': 'alphabetical',  # fallback
             'recomendado': 'balanced',  # Nueva opción
+            'para_ti': 'personalized',  # Filtrado colaborativo, según las reseñas del usuario
         }
         
         strategy_name = strategy_map.get(orden_field, 'best_rated')
         
         # Crear motor de recomendación con la estrategia seleccionada
-        recommendation_engine = RecommendationEngine(strategy_name)
-        profesores = recommendation_engine.recommend(profesores)
+        recommendation_engine = RecommendationEngine(strategy_name, user=request.user)
     else:
         # Por defecto: usar estrategia de mejor calificados primero
         recommendation_engine = RecommendationEngine('best_rated')
-        profesores = recommendation_engine.recommend(profesores)
+
+    # Paginación por cursor sobre el orden de la estrategia, sin OFFSET: la página es un tramo
+    # de la lista de ids ya ordenada que el motor guarda en caché (o calcula para el usuario).
+    # Con filtros, los ids que coinciden se ordenan por su posición en esa misma lista, así la
+    # búsqueda respeta también el orden personalizado
+    ids = recommendation_engine.ranked_ids()
+    if any(busqueda.terminos(texto) for texto in (searchNombre, searchMateria, searchDepartamento)):
+        ids = ids.ordenar(profesores.values_list('pk', flat=True))
+    argumentos = (recommendation_engine.get_ordering(), settings.PROFESORES_POR_PAGINA, request.GET.get('cursor'))
+    pagina = paginar_ids(profesores, ids, *argumentos)
 
     return render(request, 'lista_profesores.html', {
-        'profesores': profesores,
+        'profesores': pagina.objetos,
+        'url_siguiente': _url_cursor(request, pagina.cursor_siguiente),
+        'url_anterior': _url_cursor(request, pagina.cursor_anterior),
         'searchNombre': searchNombre,
         'searchMateria': searchMateria,
+        'searchDepartamento': searchDepartamento,
         'orden_field': orden_field
     })
 
 
+def autocompletar(request):
+    """
+    Sugerencias de profesores, materias y departamentos para el texto escrito (JSON).
+    Parámetros: q, limite y tipo (profesor, materia o departamento, separados por comas).
+    """
+    try:
+        limite = min(max(int(request.GET.get('limite', 8)), 1), 20)
+    except ValueError:
+        limite = 8
+    tipos = {tipo for tipo in request.GET.get('tipo', '').split(',') if tipo} or None
+    sugerencias = autocompletado.indice.buscar(request.GET.get('q', ''), limite, tipos)
+    return JsonResponse({'resultados': [
+        {
+            'tipo': sugerencia.tipo,
+            'texto': sugerencia.texto,
+            'comentarios': sugerencia.peso,
+            'url': _url_sugerencia(sugerencia),
+        }
+        for sugerencia in sugerencias
+    ]})
+
+
+def _url_sugerencia(sugerencia):
+    if sugerencia.tipo == 'profesor':
+        return reverse('detalle_profesor', args=[sugerencia.id])
+    parametro = 'searchMateria' if sugerencia.tipo == 'materia' else 'searchDepartamento'
+    return f"{reverse('lista_profesores')}?{urlencode({parametro: sugerencia.texto})}"
+
+
+def _url_cursor(request, cursor):
+    # Misma búsqueda y orden, con otro cursor
+    if cursor is None:
+        return None
+    parametros = request.GET.copy()
+    parametros['cursor'] = cursor
+    return f'?{parametros.urlencode()}'
+
+
 def detalle_profesor(request, profesor_id):
     # Obtener el profesor
     profesor = get_object_or_404(Profesor, pk=profesor_id)
@@ -76,27 +135,24 @@ def detalle_profesor(request, profesor_id):
     semestre = request.GET.get('semestre', '')  # Default: todos los semestres
     rating = request.GET.get('rating', '')  # Default: todos los ratings
 
-    # Filtrar comentarios para las gráficas (solo filtros de materia y semestre)
-    comentarios_grafica = Comentario.objects.filter(profesor=profesor, aprobado_por_ia=True)
-    if materia_id != 'todas':
-        comentarios_grafica = comentarios_grafica.filter(materia_id=materia_id)
-    if semestre:
-        comentarios_grafica = comentarios_grafica.filter(fecha=semestre)
-
-    # Extraer ratings para las gráficas
-    ratings_grafica = [comentario.rating for comentario in comentarios_grafica]
-
-    # Gráficas usando el patrón Factory:
+    # Gráficas usando el patrón Factory, servidas como imágenes aparte:
     # Mostrar ambas gráficas si no se filtra por semestre
     # Mostrar solo la gráfica de barras si hay filtro por semestre
-    grafica_barras = ChartFactory.create_chart('bar', ratings_grafica) if comentarios_grafica.exists() else None
+    # En modo 'cliente' las URLs apuntan a los datos JSON y el navegador dibuja la gráfica
+    modo_graficas = _modo_graficas(request)
+    nombre_url = 'datos_grafica_profesor' if modo_graficas == 'cliente' else 'grafica_profesor'
+    grafica_barras = None
     grafica_por_semestre = None
-    if not semestre:
-        grafica_por_semestre = (
-            ChartFactory.create_chart('line', comentarios_grafica)
-            if comentarios_grafica.exists()
-            else None
-        )
+    if materia_id == 'todas' and not semestre:
+        # Sin filtros basta con el histograma del profesor
+        hay_calificaciones = profesor.numcomentarios > 0
+    else:
+        hay_calificaciones = agregaciones.hay_calificaciones(profesor, _filtro_materia(materia_id), semestre)
+    if hay_calificaciones:
+        parametros = {'materia': materia_id, 'semestre': semestre, 'v': profesor.version_datos}
+        grafica_barras = _url_grafica(nombre_url, profesor.id, 'bar', parametros)
+        if not semestre:
+            grafica_por_semestre = _url_grafica(nombre_url, profesor.id, 'line', parametros)
 
     # Filtrar comentarios para mostrar (todos los filtros: materia, semestre, rating)
     comentarios_display = Comentario.objects.filter(profesor=profesor, aprobado_por_ia=True)
@@ -107,8 +163,11 @@ def detalle_profesor(request, profesor_id):
     if rating:
         comentarios_display = comentarios_display.filter(rating=rating)
 
-    # Generar lista de semestres disponibles
-    semestres_disponibles = Comentario.objects.filter(profesor=profesor).values_list('fecha', flat=True).distinct()
+    # Generar lista de semestres disponibles (desde los resúmenes, sin recorrer los comentarios)
+    semestres_disponibles = agregaciones.semestres_con_calificaciones(profesor)
+
+    # Profesores con reseñas parecidas, precalculados por build_similar_profesores
+    similares = profesor.similares.select_related('similar').order_by('posicion')[:settings.PROFESORES_SIMILARES]
 
     return render(request, 'profesores/detalle_profesor.html', {
         'profesor': profesor,
@@ -116,10 +175,16 @@ def detalle_profesor(request, profesor_id):
         'comentarios_mostrados': comentarios_display,  # Comentarios para mostrar
         'grafica_barras': grafica_barras,
         'grafica_por_semestre': grafica_por_semestre,
+        'modo_graficas': modo_graficas,
         'materia_seleccionada': materia_id,
         'semestre_seleccionado': semestre,
         'rating_seleccionado': rating,
         'semestres_disponibles': semestres_disponibles,
+        # Mediana y cuartiles de todas las reseñas aprobadas, a partir del histograma
+        'mediana': profesor.mediana,
+        'percentil_25': profesor.percentil(25),
+        'percentil_75': profesor.percentil(75),
+        'similares': similares,
     })
 
 def upload_csv(request):
@@ -205,8 +270,9 @@ def edit_profesor(request, profesor_id):
             # Obtener las materias seleccionadas del formulario
             materias_seleccionadas = profesor_form.cleaned_data.get('materias')
 
-            # Guardar el profesor antes de modificar las materias
-            profesor.save()
+            # Guardar el profesor antes de modificar las materias.
+            # Solo los campos del formulario: las estadísticas las mantienen los signals con F()
+            profesor.save(update_fields=['nombre', 'departamento'])
 
             # Actualizar las materias del profesor
             if materias_seleccionadas:
@@ -237,8 +303,8 @@ def agregar_materia(request):
 
 
 def estadisticas(request):
-    # Obtener todas las materias para la lista desplegable
-    materias = Materia.objects.all()
+    # Obtener todas las materias para la lista desplegable, en orden alfabético (usa materia_nombre_idx)
+    materias = Materia.objects.order_by('nombre')
 
     # Obtener la materia seleccionada del formulario o una por defecto
     materia_nombre = request.GET.get('materia')
@@ -246,38 +312,23 @@ def estadisticas(request):
     # Intentar obtener el objeto de la materia seleccionada
     materia_seleccionada = Materia.objects.filter(nombre=materia_nombre).first()
 
+    modo_graficas = _modo_graficas(request)
+    nombre_url = 'datos_grafica_materia' if modo_graficas == 'cliente' else 'grafica_materia'
+
     # Inicializar variables
     grafico_dispersion = None
     grafico_distribucion = None
     grafica_promedio = None
     error_message = None
 
-    # Generar los gráficos solo si la materia existe y tiene comentarios asociados
+    # Mostrar los gráficos solo si la materia existe y tiene comentarios asociados
     if materia_seleccionada:
-        comentarios = Comentario.objects.filter(materia=materia_seleccionada, aprobado_por_ia=True)
-        if comentarios.exists():
-            # Usar ChartFactory con patrón Factory para generar gráficas
-            
-            # Gráfico de dispersión: profesores vs calificaciones
-            profesores_con_calificacion = (
-                Profesor.objects
-                .filter(materias=materia_seleccionada)
-                .annotate(
-                    calificacion_promedio=Avg('comentarios__rating', filter=Q(comentarios__materia=materia_seleccionada)),
-                    num_reviews=Count('comentarios', filter=Q(comentarios__materia=materia_seleccionada))
-                )
-            )
-            grafico_dispersion = ChartFactory.create_chart('scatter', profesores_con_calificacion)
-            
-            # Gráfico de distribución de frecuencias
-            ratings = list(comentarios.values_list('rating', flat=True))
-            grafico_distribucion = ChartFactory.create_chart('frequency', ratings)
-            
-            # Gráfico de promedio por semestre
-            grafica_promedio = ChartFactory.create_chart('semester_line', {
-                'comentarios': comentarios,
-                'titulo': f'Promedio de Rating por Semestre para {materia_seleccionada.nombre}'
-            })
+        if agregaciones.hay_calificaciones(materia=materia_seleccionada):
+            # Cada gráfico se pide por su propia URL y se genera con ChartFactory
+            parametros = {'v': materia_seleccionada.version_datos}
+            grafico_dispersion = _url_grafica(nombre_url, materia_seleccionada.id, 'scatter', parametros)
+            grafico_distribucion = _url_grafica(nombre_url, materia_seleccionada.id, 'frequency', parametros)
+            grafica_promedio = _url_grafica(nombre_url, materia_seleccionada.id, 'semester_line', parametros)
         else:
             error_message = "No hay comentarios disponibles para generar gráficos estadísticos de esta materia."
     else:
@@ -287,8 +338,190 @@ def estadisticas(request):
         'grafico_dispersion': grafico_dispersion,
         'grafico_distribucion': grafico_distribucion,
         'grafica_promedio': grafica_promedio,
+        'modo_graficas': modo_graficas,
         'materia_seleccionada': materia_nombre,
         'materias': materias,
         'error_message': error_message,
     }
     return render(request, 'profesores/estadisticas.html', context)
+
+
+# Gráficas servidas como imágenes PNG cacheables
+
+# Tipos de gráfica que se pueden pedir para cada profesor y para cada materia
+GRAFICAS_PROFESOR = ('bar', 'line')
+GRAFICAS_MATERIA = ('scatter', 'frequency', 'semester_line')
+
+
+def _modo_graficas(request):
+    # 'servidor' genera PNG con matplotlib; 'cliente' envía JSON y el navegador dibuja.
+    # Se puede forzar por petición con ?graficas=cliente
+    modo = request.GET.get('graficas', settings.CHART_RENDER_MODE)
+    return modo if modo in ('servidor', 'cliente') else 'servidor'
+
+
+def _url_grafica(nombre_url, objeto_id, chart_type, parametros):
+    return f"{reverse(nombre_url, args=[objeto_id, chart_type])}?{urlencode(parametros)}"
+
+
+def _filtros_grafica_profesor(request):
+    # (materia, semestre) de una gráfica del profesor, o None si alguno no es válido: los
+    # parámetros llegan sin validar a las agregaciones, que fallarían con un error 500
+    materia_id = request.GET.get('materia', 'todas')
+    semestre = request.GET.get('semestre', '')
+    if materia_id != 'todas':
+        try:
+            materia_id = str(int(materia_id))
+        except ValueError:
+            return None
+    if semestre and semestre not in dict(Comentario.SEMESTRES):
+        return None
+    return materia_id, semestre
+
+
+def _filtro_materia(materia_id):
+    # El filtro de la página usa 'todas' para no filtrar por materia
+    return None if materia_id == 'todas' else materia_id
+
+
+def _datos_grafica_profesor(chart_type, profesor, materia_id, semestre):
+    # Las agregaciones se ejecutan solo si la imagen no está en caché
+    filtros = {'profesor': profesor, 'materia': _filtro_materia(materia_id), 'semestre': semestre}
+    if chart_type == 'bar' and materia_id == 'todas' and not semestre:
+        # La distribución sin filtros ya está en el histograma del profesor
+        return profesor.histograma
+    if chart_type == 'bar':
+        return lambda: agregaciones.conteo_ratings(**filtros)
+    return lambda: agregaciones.promedios_por_semestre(**filtros)
+
+
+def _datos_grafica_materia(chart_type, materia):
+    if chart_type == 'scatter':
+        # Gráfico de dispersión: profesores vs calificaciones
+        return lambda: agregaciones.promedios_por_profesor(materia)
+    if chart_type == 'frequency':
+        # Gráfico de distribución de frecuencias
+        return lambda: agregaciones.conteo_ratings(materia=materia)
+    # Gráfico de promedio por semestre
+    return lambda: {
+        'promedios': agregaciones.promedios_por_semestre(materia=materia),
+        'titulo': f'Promedio de Rating por Semestre para {materia.nombre}'
+    }
+
+
+def _etag_grafica(*partes):
+    # ETag fuerte: cambia cuando cambia la versión de los datos o cualquier filtro
+    return hashlib.sha1('|'.join(str(parte) for parte in partes).encode('utf-8')).hexdigest()
+
+
+def _etag_grafica_profesor(request, profesor_id, chart_type, formato='png'):
+    # Sin ETag para filtros inválidos: la vista responde 400 y no debe quedar en caché
+    filtros = _filtros_grafica_profesor(request)
+    if filtros is None:
+        return None
+    version = Profesor.objects.filter(pk=profesor_id).values_list('version_datos', flat=True).first()
+    if version is None:
+        return None
+    return _etag_grafica('profesor', profesor_id, chart_type, formato, version, *filtros)
+
+
+def _etag_grafica_materia(request, materia_id, chart_type, formato='png'):
+    version = Materia.objects.filter(pk=materia_id).values_list('version_datos', flat=True).first()
+    if version is None:
+        return None
+    return _etag_grafica('materia', materia_id, chart_type, formato, version)
+
+
+def _etag_datos_profesor(request, profesor_id, chart_type):
+    return _etag_grafica_profesor(request, profesor_id, chart_type, formato='json')
+
+
+def _etag_datos_materia(request, materia_id, chart_type):
+    return _etag_grafica_materia(request, materia_id, chart_type, formato='json')
+
+
+def _respuesta_png(request, png, version):
+    return _con_cache_control(request, HttpResponse(png, content_type='image/png'), version)
+
+
+def _con_cache_control(request, response, version):
+    if request.GET.get('v') == str(version):
+        # La URL incluye la versión de los datos: mientras no cambie, la imagen tampoco
+        patch_cache_control(response, public=True, max_age=settings.CHART_MAX_AGE)
+    else:
+        # Sin versión (o con una vieja) el navegador debe revalidar con el ETag
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@condition(etag_func=_etag_grafica_profesor)
+def grafica_profesor(request, profesor_id, chart_type):
+    if chart_type not in GRAFICAS_PROFESOR:
+        raise Http404("Tipo de gráfica no disponible")
+    profesor = get_object_or_404(Profesor, pk=profesor_id)
+    filtros = _filtros_grafica_profesor(request)
+    if filtros is None:
+        return HttpResponseBadRequest("Filtros de gráfica inválidos")
+    materia_id, semestre = filtros
+
+    png = chart_cache.get_or_create(
+        chart_type,
+        _datos_grafica_profesor(chart_type, profesor, materia_id, semestre),
+        profesor=profesor.id,
+        materia=materia_id,
+        semestre=semestre,
+        version=profesor.version_datos,
+    )
+    if png is None:
+        raise Http404("No hay datos para esta gráfica")
+    return _respuesta_png(request, png, profesor.version_datos)
+
+
+@condition(etag_func=_etag_grafica_materia)
+def grafica_materia(request, materia_id, chart_type):
+    if chart_type not in GRAFICAS_MATERIA:
+        raise Http404("Tipo de gráfica no disponible")
+    materia = get_object_or_404(Materia, pk=materia_id)
+
+    png = chart_cache.get_or_create(
+        chart_type,
+        _datos_grafica_materia(chart_type, materia),
+        materia=materia.id,
+        version=materia.version_datos,
+    )
+    if png is None:
+        raise Http404("No hay datos para esta gráfica")
+    return _respuesta_png(request, png, materia.version_datos)
+
+
+@condition(etag_func=_etag_datos_profesor)
+def datos_grafica_profesor(request, profesor_id, chart_type):
+    # Mismos datos que grafica_profesor, como JSON para dibujar en el navegador.
+    if chart_type not in GRAFICAS_PROFESOR:
+        raise Http404("Tipo de gráfica no disponible")
+    profesor = get_object_or_404(Profesor, pk=profesor_id)
+    filtros = _filtros_grafica_profesor(request)
+    if filtros is None:
+        return HttpResponseBadRequest("Filtros de gráfica inválidos")
+    datos = _datos_grafica_profesor(chart_type, profesor, *filtros)
+    payload = ChartFactory.create_payload(chart_type, datos())
+    if payload is None:
+        raise Http404("No hay datos para esta gráfica")
+    return _respuesta_json(request, payload, profesor.version_datos)
+
+
+@condition(etag_func=_etag_datos_materia)
+def datos_grafica_materia(request, materia_id, chart_type):
+    if chart_type not in GRAFICAS_MATERIA:
+        raise Http404("Tipo de gráfica no disponible")
+    materia = get_object_or_404(Materia, pk=materia_id)
+    payload = ChartFactory.create_payload(chart_type, _datos_grafica_materia(chart_type, materia)())
+    if payload is None:
+        raise Http404("No hay datos para esta gráfica")
+    return _respuesta_json(request, payload, materia.version_datos)
+
+
+def _respuesta_json(request, payload, version):
+    # Separadores sin espacios: el payload queda en unos cientos de bytes
+    response = JsonResponse(payload, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+    return _con_cache_control(request, response, version)
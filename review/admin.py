@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Comentario
+from .models import Comentario, TareaModeracion, VeredictoModeracion
 # Register your models here.
 
-admin.site.register(Comentario)
\ No newline at end of file
+admin.site.register(Comentario)
+admin.site.register(TareaModeracion)
+admin.site.register(VeredictoModeracion)
@@ -0,0 +1,77 @@
+"""
+Agregaciones de calificaciones para gráficas y estadísticas.
+Se leen de ResumenCalificacion, que los signals mantienen por (profesor, materia, semestre),
+así que el costo depende del número de grupos y no del número de reseñas: nunca se
+recorre la tabla de comentarios ni se construye una instancia de Comentario por reseña.
+"""
+
+from django.db.models import Sum
+
+from profesores.models import Profesor
+from .models import ResumenCalificacion
+
+
+RATINGS = range(1, 6)
+
+
+def _resumenes(profesor=None, materia=None, semestre=None):
+    # Resúmenes con los filtros opcionales de las gráficas.
+    resumenes = ResumenCalificacion.objects.filter(cantidad__gt=0)
+    if profesor is not None:
+        resumenes = resumenes.filter(profesor=profesor)
+    if materia is not None:
+        resumenes = resumenes.filter(materia=materia)
+    if semestre:
+        resumenes = resumenes.filter(fecha=semestre)
+    return resumenes
+
+
+def hay_calificaciones(profesor=None, materia=None, semestre=None):
+    # Indica si hay reseñas aprobadas con esos filtros.
+    return _resumenes(profesor, materia, semestre).exists()
+
+
+def semestres_con_calificaciones(profesor=None, materia=None):
+    # Semestres en los que hay reseñas aprobadas, del más reciente al más antiguo.
+    return list(
+        _resumenes(profesor, materia).values_list('fecha', flat=True).distinct().order_by('-fecha')
+    )
+
+
+def promedios_por_semestre(profesor=None, materia=None, semestre=None):
+    # Retorna [(fecha, promedio, cantidad), ...] ordenado por semestre.
+    filas = (
+        _resumenes(profesor, materia, semestre)
+        .values_list('fecha')
+        .annotate(total=Sum('suma'), cantidad=Sum('cantidad'))
+        .order_by('fecha')
+    )
+    return [(fecha, total / cantidad, cantidad) for fecha, total, cantidad in filas if cantidad]
+
+
+def conteo_ratings(profesor=None, materia=None, semestre=None):
+    # Retorna [(rating, cantidad), ...] ordenado por rating, sin los ratings que no aparecen.
+    totales = _resumenes(profesor, materia, semestre).aggregate(
+        **{f'estrellas_{r}': Sum(f'estrellas_{r}') for r in RATINGS}
+    )
+    return [(r, totales[f'estrellas_{r}']) for r in RATINGS if totales[f'estrellas_{r}']]
+
+
+def promedios_por_profesor(materia):
+    # Retorna [(nombre, promedio, cantidad), ...] de los profesores que dictan la materia.
+    # Los profesores sin reseñas en la materia aparecen con promedio None y cantidad 0.
+    totales = {
+        profesor_id: (total, cantidad)
+        for profesor_id, total, cantidad in (
+            _resumenes(materia=materia)
+            .values_list('profesor_id')
+            .annotate(total=Sum('suma'), cantidad=Sum('cantidad'))
+            .order_by()
+        )
+    }
+    puntos = []
+    # Se ordena en Python: son pocos profesores y así la consulta no necesita ordenar el JOIN
+    for profesor_id, nombre in sorted(Profesor.objects.filter(materias=materia).values_list('pk', 'nombre')):
+        total, cantidad = totales.get(profesor_id, (0, 0))
+        puntos.append((nombre, total / cantidad if cantidad else None, cantidad))
+    return puntos
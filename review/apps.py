@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ReviewConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'review'
+
+    def ready(self):
+        # openai se importa de forma perezosa; con PRECARGAR_DEPENDENCIAS se
+        # carga al arrancar para que el primer comentario no pague la importación.
+        if settings.PRECARGAR_DEPENDENCIAS:
+            from .aprobadores import obtener_openai
+            obtener_openai()
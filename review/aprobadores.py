@@ -0,0 +1,649 @@
+"""
+Estrategias de aprobación de comentarios (inversión de dependencias).
+El cliente de OpenAI se importa y configura la primera vez que se usa, para que
+los procesos que nunca moderan comentarios no paguen esa importación al arrancar.
+
+CacheVeredictos envuelve a cualquier aprobador y guarda en la base de datos el veredicto de
+cada contenido, así que las ediciones que no cambian el texto, los reenvíos de reseñas
+rechazadas y las reseñas copiadas no vuelven a llamar a la API. AprobadorPorLotes junta las
+reseñas que llegan casi a la vez (desde los hilos del worker de moderación o desde peticiones
+distintas, porque hay uno solo por proceso) y las revisa con una sola llamada. FiltroLexico
+resuelve antes, sin la API, los casos obvios: rechaza los términos ofensivos del léxico y
+aprueba los textos cortos sin ninguna coincidencia.
+ProveedorResiliente pone plazos, reintentos y un circuito alrededor de la API, y mide sus
+latencias; cuando la API no está disponible, AprobadorDegradado aplica la política
+configurada. construir_aprobador() arma el aprobador que usan la fachada y el worker de
+moderación según la configuración.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+
+_openai = None
+_openai_lock = threading.Lock()
+_proveedor = None
+_lotes = None
+_proveedor_lock = threading.Lock()
+
+MODELO = "gpt-4"
+MENSAJE_SISTEMA = (
+    "Eres un asistente que revisa comentarios para identificar si contienen palabras ofensivas."
+)
+PLANTILLA_REVISION = (
+    "Revisa el siguiente comentario y devuelve 'aprobado' si es apropiado o 'no' "
+    "si contiene palabras ofensivas:\n\nComentario: \"{comentario}\""
+)
+PLANTILLA_LOTE = (
+    "Revisa cada uno de los siguientes comentarios numerados. Responde solo con un arreglo JSON "
+    "con una entrada por comentario, en el mismo orden: \"aprobado\" si es apropiado o \"no\" "
+    "si contiene palabras ofensivas.\n\n{comentarios}"
+)
+# Cambia con el modelo o los prompts, y con ella las claves de los veredictos guardados
+VERSION_PROMPT = hashlib.sha256(
+    f"{MODELO}\n{MENSAJE_SISTEMA}\n{PLANTILLA_REVISION}\n{PLANTILLA_LOTE}".encode('utf-8')
+).hexdigest()[:16]
+
+
+class RespuestaLoteInvalida(ValueError):
+    # La respuesta a un lote no trae un veredicto válido por comentario
+    pass
+
+
+class ProveedorNoDisponible(Exception):
+    # La API no respondió dentro del plazo (tras los reintentos) o su circuito está abierto
+    pass
+
+
+def obtener_openai():
+    # Importa openai y carga las llaves de keys.env solo la primera vez.
+    global _openai
+    if _openai is None:
+        with _openai_lock:
+            if _openai is None:
+                from dotenv import load_dotenv
+                import openai
+                load_dotenv('keys.env')
+                openai.api_key = os.environ.get('OPENAI_API_KEY')
+                _openai = openai
+    return _openai
+
+
+class ComentarioAprobador:
+    # Identifica los criterios del aprobador en las claves de CacheVeredictos
+    version = 'base'
+
+    def aprobar(self, comentario):
+        raise NotImplementedError("Debes implementar el método aprobar.")
+
+    def aprobar_lote(self, comentarios):
+        # Un veredicto por comentario, en el mismo orden. Los aprobadores que pueden revisar
+        # varios en una sola llamada lo sobrescriben.
+        return [self.aprobar(comentario) for comentario in comentarios]
+
+class ComentarioAprobadorManual(ComentarioAprobador):
+    version = 'manual'
+
+    def aprobar(self, comentario):
+        return True
+
+class ComentarioAprobadorIA(ComentarioAprobador):
+    version = f'ia-{VERSION_PROMPT}'
+
+    def __init__(self, timeout=None):
+        # Segundos que se espera la respuesta HTTP de cada llamada
+        self.timeout = timeout or settings.MODERACION_API_TIMEOUT
+
+    def aprobar(self, comentario):
+        resultado = self._completar(PLANTILLA_REVISION.format(comentario=comentario), max_tokens=3)
+        return resultado.strip().lower() == 'aprobado'
+
+    def aprobar_lote(self, comentarios):
+        if len(comentarios) == 1:
+            return [self.aprobar(comentarios[0])]
+        # Cada comentario va como cadena JSON para que sus saltos de línea no rompan la numeración
+        numerados = '\n'.join(
+            f'{n}. {json.dumps(comentario, ensure_ascii=False)}'
+            for n, comentario in enumerate(comentarios, 1)
+        )
+        resultado = self._completar(
+            PLANTILLA_LOTE.format(comentarios=numerados), max_tokens=5 * len(comentarios) + 5
+        )
+        return leer_veredictos(resultado, len(comentarios))
+
+    def _completar(self, mensaje, max_tokens):
+        openai = obtener_openai()
+        openai.api_key = os.environ.get('OPENAI_API_KEY')
+        respuesta = openai.ChatCompletion.create(
+            model=MODELO,
+            messages=[
+                {"role": "system", "content": MENSAJE_SISTEMA},
+                {"role": "user", "content": mensaje}
+            ],
+            max_tokens=max_tokens,
+            temperature=0,
+            request_timeout=self.timeout,
+        )
+        return respuesta['choices'][0]['message']['content']
+
+
+def leer_veredictos(texto, cantidad):
+    # Extrae el arreglo JSON de la respuesta a un lote; falla si no trae `cantidad`
+    # veredictos válidos
+    inicio, fin = texto.find('['), texto.rfind(']')
+    try:
+        veredictos = json.loads(texto[inicio:fin + 1]) if 0 <= inicio < fin else None
+    except ValueError:
+        veredictos = None
+    if not isinstance(veredictos, list) or len(veredictos) != cantidad:
+        raise RespuestaLoteInvalida(f'Se esperaban {cantidad} veredictos: {texto[:200]!r}')
+    normalizados = [str(veredicto).strip().lower() for veredicto in veredictos]
+    if not set(normalizados) <= {'aprobado', 'no'}:
+        raise RespuestaLoteInvalida(f'Veredictos desconocidos: {texto[:200]!r}')
+    return [veredicto == 'aprobado' for veredicto in normalizados]
+
+
+class ProveedorResiliente(ComentarioAprobador):
+    # Decorador del aprobador que llama a la API. Cada intento corre en un hilo del pool y se
+    # abandona a los `timeout` segundos; los fallidos se reintentan con espera exponencial con
+    # jitter (aleatoria entre 0 y espera_base, el doble, ...) mientras quede plazo de los
+    # `plazo` segundos de la llamada. Tras `umbral` intentos fallidos seguidos el circuito se
+    # abre: durante `enfriamiento` segundos las llamadas fallan de inmediato, y después un solo
+    # intento de prueba decide si se cierra. Sin respuesta, aprobar() lanza ProveedorNoDisponible.
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+    # Límites superiores, en milisegundos, de los grupos del histograma de latencias
+    GRUPOS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+    def __init__(self, aprobador, timeout=None, plazo=None, reintentos=None, espera_base=None,
+                 umbral=None, enfriamiento=None, concurrencia=None):
+        self.aprobador = aprobador
+        self.version = aprobador.version
+        self.timeout = timeout or settings.MODERACION_API_TIMEOUT
+        self.plazo = plazo or settings.MODERACION_API_PLAZO
+        self.reintentos = settings.MODERACION_API_REINTENTOS if reintentos is None else reintentos
+        self.espera_base = settings.MODERACION_API_ESPERA if espera_base is None else espera_base
+        self.umbral = umbral or settings.MODERACION_CIRCUITO_UMBRAL
+        self.enfriamiento = (
+            settings.MODERACION_CIRCUITO_ENFRIAMIENTO if enfriamiento is None else enfriamiento
+        )
+        # Los hilos de un intento vencido siguen ocupados hasta que vence el timeout HTTP
+        self._pool = ThreadPoolExecutor(
+            concurrencia or settings.MODERACION_CONCURRENCIA, thread_name_prefix='proveedor'
+        )
+        self._lock = threading.Lock()
+        self._estado = self.CERRADO
+        self._abierto_hasta = 0.0
+        self._sonda = False
+        self._fallos_seguidos = 0
+        self._conteo = {
+            'llamadas': 0, 'intentos': 0, 'errores': 0, 'timeouts': 0, 'reintentos': 0,
+            'rechazadas_circuito': 0, 'aperturas': 0,
+        }
+        self._histograma = [0] * (len(self.GRUPOS_MS) + 1)
+
+    def aprobar(self, comentario):
+        return self._llamar(self.aprobador.aprobar, comentario)
+
+    def aprobar_lote(self, comentarios):
+        return self._llamar(self.aprobador.aprobar_lote, comentarios)
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado
+
+    def _llamar(self, funcion, argumento):
+        limite = time.monotonic() + self.plazo
+        self._contar('llamadas')
+        error = None
+        for intento in range(self.reintentos + 1):
+            if not self._permitir():
+                self._contar('rechazadas_circuito')
+                raise ProveedorNoDisponible(
+                    'El circuito del proveedor de moderación está abierto.'
+                ) from error
+            inicio = time.perf_counter()
+            futuro = self._pool.submit(funcion, argumento)
+            try:
+                restante = limite - time.monotonic()
+                resultado = futuro.result(timeout=max(0.0, min(self.timeout, restante)))
+            except RespuestaLoteInvalida:
+                # La API respondió, aunque no en el formato pedido: AprobadorPorLotes lo resuelve
+                self._registrar(time.perf_counter() - inicio, error=None)
+                raise
+            except Exception as e:
+                # Si el intento aún espera un hilo libre del pool, ya no se ejecuta
+                futuro.cancel()
+                self._registrar(time.perf_counter() - inicio, error=e)
+                error = e
+            else:
+                self._registrar(time.perf_counter() - inicio, error=None)
+                return resultado
+            espera = random.uniform(0, self.espera_base * 2 ** intento)
+            if intento == self.reintentos or time.monotonic() + espera >= limite:
+                break
+            self._contar('reintentos')
+            time.sleep(espera)
+        raise ProveedorNoDisponible(
+            f'La API de moderación no respondió: {type(error).__name__}: {error}'
+        ) from error
+
+    def _permitir(self):
+        # Con el circuito abierto solo pasa, al terminar el enfriamiento, un intento de prueba
+        with self._lock:
+            if self._estado == self.ABIERTO and time.monotonic() >= self._abierto_hasta:
+                self._estado = self.SEMIABIERTO
+                self._sonda = False
+            if self._estado == self.SEMIABIERTO and not self._sonda:
+                self._sonda = True
+                return True
+            return self._estado == self.CERRADO
+
+    def _registrar(self, segundos, error):
+        with self._lock:
+            self._conteo['intentos'] += 1
+            self._histograma[bisect.bisect_left(self.GRUPOS_MS, segundos * 1000)] += 1
+            if error is None:
+                self._fallos_seguidos = 0
+                self._estado = self.CERRADO
+                return
+            self._conteo['errores'] += 1
+            self._conteo['timeouts'] += isinstance(error, TimeoutError)
+            self._fallos_seguidos += 1
+            if self._estado == self.SEMIABIERTO or self._fallos_seguidos >= self.umbral:
+                if self._estado != self.ABIERTO:
+                    self._conteo['aperturas'] += 1
+                self._estado = self.ABIERTO
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+    def _contar(self, clave):
+        with self._lock:
+            self._conteo[clave] += 1
+
+    def metricas(self):
+        # Conteos, tasa de errores por intento e histograma de latencias de los intentos
+        with self._lock:
+            conteo = dict(self._conteo)
+            histograma = list(self._histograma)
+            conteo['estado'] = self._estado
+        intentos = conteo['intentos']
+        conteo['tasa_errores'] = conteo['errores'] / intentos if intentos else 0.0
+        grupos = [f'<={limite}' for limite in self.GRUPOS_MS] + [f'>{self.GRUPOS_MS[-1]}']
+        conteo['histograma_ms'] = dict(zip(grupos, histograma))
+        # Percentiles aproximados: el grupo del histograma donde caen
+        conteo['p50_ms'] = _grupo_del_percentil(grupos, histograma, 0.5)
+        conteo['p95_ms'] = _grupo_del_percentil(grupos, histograma, 0.95)
+        return conteo
+
+
+def _grupo_del_percentil(grupos, histograma, fraccion):
+    total = sum(histograma)
+    acumulado = 0
+    for grupo, cantidad in zip(grupos, histograma):
+        acumulado += cantidad
+        if total and acumulado >= fraccion * total:
+            return grupo
+    return None
+
+
+class AprobadorDegradado(ComentarioAprobador):
+    # Decorador: cuando el aprobador lanza ProveedorNoDisponible aplica la política de
+    # degradación. 'encolar' deja pasar el error (la fachada y el worker dejan la reseña
+    # pendiente en la cola), 'manual' aprueba como ComentarioAprobadorManual y 'lexico'
+    # rechaza las reseñas con términos bloqueados, aprueba las que no tienen ninguna
+    # coincidencia y encola el resto. Estos veredictos no se guardan en la caché, que va detrás.
+
+    POLITICAS = ('encolar', 'manual', 'lexico')
+
+    def __init__(self, aprobador, politica=None, lexico=None):
+        from .lexico import cargar
+
+        self.aprobador = aprobador
+        self.version = aprobador.version
+        self.politica = politica or settings.MODERACION_DEGRADACION
+        if self.politica not in self.POLITICAS:
+            raise ValueError(f'Política de degradación desconocida: {self.politica}')
+        if self.politica == 'lexico' and lexico is None:
+            if not settings.MODERACION_LEXICO:
+                raise ValueError("La política 'lexico' necesita MODERACION_LEXICO.")
+            lexico = cargar(str(settings.MODERACION_LEXICO))
+        self.lexico = lexico
+        self._lock = threading.Lock()
+        self._conteo = {'aprobadas': 0, 'rechazadas': 0, 'encoladas': 0}
+
+    def aprobar(self, comentario):
+        try:
+            return self.aprobador.aprobar(comentario)
+        except ProveedorNoDisponible as e:
+            return self._degradar([comentario], e)[0]
+
+    def aprobar_lote(self, comentarios):
+        try:
+            return self.aprobador.aprobar_lote(comentarios)
+        except ProveedorNoDisponible as e:
+            return self._degradar(comentarios, e)
+
+    def _degradar(self, comentarios, error):
+        from .lexico import BLOQUEAR, normalizar
+
+        if self.politica == 'manual':
+            manual = ComentarioAprobadorManual()
+            veredictos = [manual.aprobar(comentario) for comentario in comentarios]
+        elif self.politica == 'lexico':
+            veredictos = []
+            for comentario in comentarios:
+                coincidencias = self.lexico.buscar(normalizar(comentario))
+                veredictos.append(None if coincidencias else True)
+                if any(categoria == BLOQUEAR for categoria, _ in coincidencias):
+                    veredictos[-1] = False
+        else:
+            veredictos = [None] * len(comentarios)
+        # Si alguno no se puede decidir sin la API, todo el lote vuelve a la cola
+        if None in veredictos:
+            self._contar('encoladas', len(comentarios))
+            raise error
+        self._contar('aprobadas', veredictos.count(True))
+        self._contar('rechazadas', veredictos.count(False))
+        return veredictos
+
+    def _contar(self, clave, cantidad):
+        with self._lock:
+            self._conteo[clave] += cantidad
+
+    def metricas(self):
+        with self._lock:
+            return dict(self._conteo)
+
+
+class AprobadorPorLotes(ComentarioAprobador):
+    # Decorador de un aprobador: las llamadas concurrentes a aprobar() se juntan durante
+    # `ventana` segundos, o hasta reunir `tamano`, y se revisan con un solo aprobar_lote().
+    # La primera llamada de cada lote es la que espera, lo envía y reparte los veredictos;
+    # las demás esperan el suyo. Si la respuesta del lote es inválida, cada comentario se
+    # revisa por separado. Un error de la llamada (red, límite de la API) se propaga a todas.
+
+    def __init__(self, aprobador, tamano=None, ventana=None):
+        self.aprobador = aprobador
+        self.version = aprobador.version
+        self.tamano = tamano or settings.MODERACION_LOTE_TAMANO
+        self.ventana = settings.MODERACION_LOTE_VENTANA if ventana is None else ventana
+        self._condicion = threading.Condition()
+        self._pendientes = []
+        self._hay_lider = False
+        self._conteo = {'lotes': 0, 'comentarios': 0, 'lotes_invalidos': 0}
+
+    def aprobar(self, comentario):
+        futuro = Future()
+        with self._condicion:
+            self._pendientes.append((comentario, futuro))
+            self._condicion.notify_all()
+            # Sin líder, el primero de la fila arma el siguiente lote
+            while not futuro.done():
+                if not self._hay_lider and self._pendientes and self._pendientes[0][1] is futuro:
+                    break
+                self._condicion.wait()
+            if futuro.done():
+                return futuro.result()
+            self._hay_lider = True
+            self._condicion.wait_for(
+                lambda: len(self._pendientes) >= self.tamano, timeout=self.ventana
+            )
+            lote = self._pendientes[:self.tamano]
+            del self._pendientes[:self.tamano]
+            self._hay_lider = False
+            self._condicion.notify_all()
+        self._enviar(lote)
+        with self._condicion:
+            self._condicion.notify_all()
+        return futuro.result()
+
+    def metricas(self):
+        with self._condicion:
+            conteo = dict(self._conteo)
+        lotes = conteo['lotes']
+        conteo['promedio_por_lote'] = conteo['comentarios'] / lotes if lotes else 0.0
+        return conteo
+
+    def _enviar(self, lote):
+        comentarios = [comentario for comentario, _ in lote]
+        with self._condicion:
+            self._conteo['lotes'] += 1
+            self._conteo['comentarios'] += len(lote)
+        try:
+            veredictos = self.aprobador.aprobar_lote(comentarios)
+            if len(veredictos) != len(lote):
+                raise RespuestaLoteInvalida(
+                    f'{len(veredictos)} veredictos para {len(lote)} comentarios'
+                )
+        except RespuestaLoteInvalida:
+            with self._condicion:
+                self._conteo['lotes_invalidos'] += 1
+            for comentario, futuro in lote:
+                try:
+                    futuro.set_result(self.aprobador.aprobar(comentario))
+                except Exception as e:
+                    futuro.set_exception(e)
+            return
+        except Exception as e:
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        for (_, futuro), veredicto in zip(lote, veredictos):
+            futuro.set_result(veredicto)
+
+
+class CacheVeredictos(ComentarioAprobador):
+    # Decorador de un aprobador: responde desde VeredictoModeracion los contenidos ya revisados
+    # (sin distinguir mayúsculas ni espacios) y guarda los nuevos veredictos. Las entradas
+    # vencen a los `ttl` segundos y, al pasar de `maximo`, se desalojan las más antiguas.
+    # Los errores del aprobador no se guardan: el siguiente intento vuelve a llamarlo.
+
+    # Cada cuántos veredictos guardados se eliminan los vencidos y los que sobran
+    PODA_CADA = 100
+
+    def __init__(self, aprobador, ttl=None, maximo=None):
+        self.aprobador = aprobador
+        self.version = f'cache-{aprobador.version}'
+        self.ttl = settings.MODERACION_CACHE_TTL if ttl is None else ttl
+        self.maximo = settings.MODERACION_CACHE_MAXIMO if maximo is None else maximo
+        self._lock = threading.Lock()
+        self._guardados = 0
+        self._consultas = 0
+        self._aciertos = 0
+        self._segundos_api = 0.0
+
+    def aprobar(self, comentario):
+        from .models import VeredictoModeracion
+
+        clave = self.clave(comentario)
+        vigentes = VeredictoModeracion.objects.filter(
+            clave=clave, creado__gte=timezone.now() - timedelta(seconds=self.ttl)
+        )
+        aprobado = vigentes.values_list('aprobado', flat=True).first()
+        if aprobado is not None:
+            vigentes.update(aciertos=F('aciertos') + 1)
+            self._contar(acierto=True)
+            return aprobado
+
+        inicio = time.perf_counter()
+        aprobado = bool(self.aprobador.aprobar(comentario))
+        self._contar(acierto=False, segundos=time.perf_counter() - inicio)
+        self._guardar(clave, aprobado)
+        return aprobado
+
+    def clave(self, comentario):
+        # Las tildes se conservan: quitarlas puede cambiar el sentido de una palabra
+        texto = unicodedata.normalize('NFC', comentario or '').casefold()
+        normalizado = ' '.join(texto.split())
+        contenido = f'{self.aprobador.version}\n{normalizado}'
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def metricas(self):
+        # Tasa de aciertos de este proceso y el tiempo de API que se estima que ahorró
+        with self._lock:
+            llamadas = self._consultas - self._aciertos
+            promedio = self._segundos_api / llamadas if llamadas else 0.0
+            return {
+                'consultas': self._consultas,
+                'aciertos': self._aciertos,
+                'tasa_aciertos': self._aciertos / self._consultas if self._consultas else 0.0,
+                'llamadas_api': llamadas,
+                'segundos_api': self._segundos_api,
+                'segundos_ahorrados': self._aciertos * promedio,
+            }
+
+    def _contar(self, acierto, segundos=0.0):
+        with self._lock:
+            self._consultas += 1
+            self._aciertos += acierto
+            self._segundos_api += segundos
+
+    def _guardar(self, clave, aprobado):
+        from .models import VeredictoModeracion
+
+        # Un solo INSERT ... ON CONFLICT: en SQLite, leer y después escribir en la misma
+        # transacción falla de inmediato ("database is locked") si otro hilo está escribiendo
+        VeredictoModeracion.objects.bulk_create(
+            [VeredictoModeracion(
+                clave=clave, aprobado=aprobado, creado=timezone.now(), aciertos=0
+            )],
+            update_conflicts=True, unique_fields=['clave'],
+            update_fields=['aprobado', 'creado', 'aciertos'],
+        )
+        with self._lock:
+            self._guardados += 1
+            podar = self._guardados % self.PODA_CADA == 0
+        if podar:
+            self.podar()
+
+    def podar(self):
+        # Elimina los veredictos vencidos y, si aún sobran, los más antiguos
+        from .models import VeredictoModeracion
+
+        vencimiento = timezone.now() - timedelta(seconds=self.ttl)
+        VeredictoModeracion.objects.filter(creado__lt=vencimiento).delete()
+        # Fecha del primero que no cabe; él y los más antiguos se eliminan
+        recientes = VeredictoModeracion.objects.order_by('-creado').values_list('creado', flat=True)
+        limite = next(iter(recientes[self.maximo:self.maximo + 1]), None)
+        if limite is not None:
+            VeredictoModeracion.objects.filter(creado__lte=limite).delete()
+
+
+class FiltroLexico(ComentarioAprobador):
+    # Decorador de un aprobador: clasifica cada comentario con el léxico (ver lexico.py) y
+    # solo delega los dudosos. Cuenta cuántos toman cada camino y el tiempo del filtro.
+
+    def __init__(self, aprobador, lexico=None, aprobar_limpios=None, max_caracteres=None):
+        from .lexico import cargar
+
+        self.aprobador = aprobador
+        self.lexico = lexico or cargar(str(settings.MODERACION_LEXICO))
+        self.aprobar_limpios = (
+            settings.MODERACION_LEXICO_APROBAR if aprobar_limpios is None else aprobar_limpios
+        )
+        self.max_caracteres = max_caracteres or settings.MODERACION_LEXICO_MAX_CARACTERES
+        self.version = f'lexico-{aprobador.version}'
+        self._lock = threading.Lock()
+        self._conteo = {'rechazadas': 0, 'aprobadas': 0, 'consultadas': 0}
+        self._segundos = 0.0
+
+    def clasificar(self, comentario):
+        from .lexico import APROBAR, RECHAZAR
+
+        inicio = time.perf_counter()
+        clasificacion = self.lexico.clasificar(
+            comentario, self.aprobar_limpios, self.max_caracteres
+        )
+        caminos = {RECHAZAR: 'rechazadas', APROBAR: 'aprobadas'}
+        camino = caminos.get(clasificacion.decision, 'consultadas')
+        with self._lock:
+            self._conteo[camino] += 1
+            self._segundos += time.perf_counter() - inicio
+        return clasificacion.decision
+
+    def aprobar(self, comentario):
+        return self.aprobar_lote([comentario])[0]
+
+    def aprobar_lote(self, comentarios):
+        from .lexico import APROBAR, CONSULTAR
+
+        decisiones = [self.clasificar(comentario) for comentario in comentarios]
+        dudosos = [
+            comentario for comentario, decision in zip(comentarios, decisiones)
+            if decision == CONSULTAR
+        ]
+        if len(dudosos) == 1:
+            veredictos = iter([self.aprobador.aprobar(dudosos[0])])
+        else:
+            veredictos = iter(self.aprobador.aprobar_lote(dudosos) if dudosos else [])
+        return [
+            next(veredictos) if decision == CONSULTAR else decision == APROBAR
+            for decision in decisiones
+        ]
+
+    def metricas(self):
+        with self._lock:
+            conteo = dict(self._conteo)
+            segundos = self._segundos
+        total = sum(conteo.values())
+        conteo['total'] = total
+        conteo['microsegundos_promedio'] = segundos / total * 1e6 if total else 0.0
+        return conteo
+
+
+def obtener_proveedor():
+    # La IA con plazos, reintentos y circuito, compartida por todo el proceso: la fachada arma
+    # un aprobador en cada petición y el estado del circuito debe sobrevivir entre ellas
+    global _proveedor
+    if _proveedor is None:
+        with _proveedor_lock:
+            if _proveedor is None:
+                _proveedor = ProveedorResiliente(ComentarioAprobadorIA())
+    return _proveedor
+
+
+def obtener_lotes():
+    # El agrupador también es único por proceso: solo junta las reseñas de las peticiones y
+    # los hilos que comparten la misma instancia, y cada uno arma su propio aprobador
+    global _lotes
+    if _lotes is None:
+        proveedor = obtener_proveedor()
+        with _proveedor_lock:
+            if _lotes is None:
+                _lotes = AprobadorPorLotes(proveedor)
+    return _lotes
+
+
+def construir_aprobador():
+    # Aprobador de la fachada y del worker: el filtro léxico primero (los casos obvios no
+    # tocan la base de datos), la degradación cuando la API no responde, la caché si está
+    # activa (así los aciertos no esperan la ventana del lote) y al final la IA por lotes
+    if settings.MODERACION_LOTE_TAMANO > 1:
+        aprobador = obtener_lotes()
+    else:
+        aprobador = obtener_proveedor()
+    if settings.MODERACION_CACHE:
+        aprobador = CacheVeredictos(aprobador)
+    aprobador = AprobadorDegradado(aprobador)
+    if settings.MODERACION_LEXICO:
+        aprobador = FiltroLexico(aprobador)
+    return aprobador
+
+
+def revisar_comentario_por_ia(contenido):
+    return construir_aprobador().aprobar(contenido)
@@ -0,0 +1,269 @@
+"""
+Actualización incremental de las estadísticas de profesores y materias.
+En lugar de recalcular AVG y COUNT sobre todas las reseñas en cada escritura, los
+signals de Comentario aplican la diferencia entre el estado anterior y el nuevo de la
+reseña con sentencias UPDATE con expresiones F(). La base de datos aplica el cambio
+de forma atómica, así que escrituras concurrentes no se pisan entre sí.
+
+Se mantienen tres niveles:
+- Profesor: suma_ratings, numcomentarios, calificacion_media, puntaje_bayesiano y el
+  histograma estrellas_N, con el que la página del profesor dibuja la distribución sin
+  consultar los comentarios.
+- Materia: los mismos campos, por materia.
+- ResumenCalificacion: suma, cantidad e histograma por (profesor, materia, semestre),
+  de donde salen las gráficas y los filtros sin recorrer la tabla de comentarios.
+
+Las cargas masivas (ver el comando import_reviews) insertan con bulk_create, que no
+dispara signals, y al final llaman a recalcular_profesores, que reconstruye los tres
+niveles con consultas agrupadas solo para los profesores afectados.
+"""
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from profesores import rankings
+from profesores.models import Profesor, Materia, puntaje_bayesiano
+
+
+RATINGS = range(1, 6)
+# Campos acumulables de un resumen (y del histograma de Profesor)
+CAMPOS_RESUMEN = ['suma', 'cantidad'] + [f'estrellas_{r}' for r in RATINGS]
+# Campos de Profesor que se derivan de las reseñas
+CAMPOS_ESTADISTICAS = ['suma_ratings', 'numcomentarios', 'calificacion_media', 'puntaje_bayesiano'] + CAMPOS_RESUMEN[2:]
+
+
+def estado_comentario(comentario):
+    # Campos de un comentario que afectan las estadísticas.
+    return {
+        'profesor_id': comentario.profesor_id,
+        'materia_id': comentario.materia_id,
+        'fecha': comentario.fecha,
+        'rating': comentario.rating,
+        'aprobado_por_ia': comentario.aprobado_por_ia,
+    }
+
+
+def _contribucion(estado):
+    # Solo las reseñas aprobadas cuentan para las estadísticas.
+    if not estado or not estado.get('aprobado_por_ia'):
+        return None
+    return estado
+
+
+def _diferencias(anterior, nuevo, clave):
+    # Retorna {clave(estado): Counter(suma, cantidad, estrellas_N)} entre dos estados de una reseña.
+    diferencias = defaultdict(Counter)
+    for estado, signo in ((_contribucion(anterior), -1), (_contribucion(nuevo), 1)):
+        if estado is not None:
+            rating = int(estado['rating'])
+            delta = diferencias[clave(estado)]
+            delta['suma'] += signo * rating
+            delta['cantidad'] += signo
+            delta[f'estrellas_{rating}'] += signo
+    return diferencias
+
+
+def _clave_profesor(estado):
+    return estado['profesor_id']
+
+
+def _clave_materia(estado):
+    return estado['materia_id']
+
+
+def _clave_resumen(estado):
+    return estado['profesor_id'], estado['materia_id'], estado['fecha']
+
+
+def registrar_cambio(anterior, nuevo):
+    # Aplica a profesores, materias y resúmenes el cambio de una reseña.
+    # `anterior` es None al crear y `nuevo` es None al eliminar.
+    estados = [estado for estado in (anterior, nuevo) if estado]
+
+    diferencias = _diferencias(anterior, nuevo, _clave_profesor)
+    for profesor_id in {_clave_profesor(estado) for estado in estados} - {None}:
+        delta = diferencias.get(profesor_id, Counter())
+        campos = {**_campos_promedio(delta), **_campos_puntaje(delta), **_campos_histograma(delta)}
+        Profesor.objects.filter(pk=profesor_id).update(version_datos=F('version_datos') + 1, **campos)
+        if campos:
+            # Cambió el orden de las estrategias que usan estas estadísticas
+            rankings.invalidar_por_campos(campos)
+
+    diferencias = _diferencias(anterior, nuevo, _clave_materia)
+    for materia_id in {_clave_materia(estado) for estado in estados} - {None}:
+        Materia.objects.filter(pk=materia_id).update(
+            version_datos=F('version_datos') + 1,
+            **_campos_promedio(diferencias.get(materia_id, Counter())),
+        )
+
+    for clave, delta in _diferencias(anterior, nuevo, _clave_resumen).items():
+        if any(delta.values()):
+            _actualizar_resumen(clave, delta)
+
+
+def _campos_promedio(delta):
+    # Expresiones F() para sumar el delta; calificacion_media se deriva de la suma y la cantidad
+    # en la misma sentencia (en SQL el lado derecho siempre lee los valores previos a la fila).
+    delta_suma, delta_cantidad = delta['suma'], delta['cantidad']
+    if not delta_suma and not delta_cantidad:
+        return {}
+    nueva_suma = F('suma_ratings') + delta_suma
+    nueva_cantidad = F('numcomentarios') + delta_cantidad
+    return {
+        'suma_ratings': nueva_suma,
+        'numcomentarios': nueva_cantidad,
+        'calificacion_media': Case(
+            When(numcomentarios__gt=-delta_cantidad, then=Cast(nueva_suma, FloatField()) / nueva_cantidad),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    }
+
+
+def _campos_puntaje(delta):
+    # Expresión F() de puntaje_bayesiano con la suma y la cantidad ya actualizadas.
+    delta_suma, delta_cantidad = delta['suma'], delta['cantidad']
+    if not delta_suma and not delta_cantidad:
+        return {}
+    peso = settings.PUNTAJE_BAYESIANO_PESO
+    previo = peso * settings.PUNTAJE_BAYESIANO_MEDIA
+    return {
+        'puntaje_bayesiano': (
+            Cast(F('suma_ratings') + delta_suma, FloatField()) + previo
+        ) / (F('numcomentarios') + delta_cantidad + peso),
+    }
+
+
+def _campos_histograma(delta):
+    # Expresiones F() para sumar el delta a los contadores estrellas_N que cambiaron.
+    return {
+        f'estrellas_{r}': F(f'estrellas_{r}') + delta[f'estrellas_{r}']
+        for r in RATINGS if delta[f'estrellas_{r}']
+    }
+
+
+def _actualizar_resumen(clave, delta):
+    # Suma el delta a la fila (profesor, materia, semestre), creándola si aún no existe.
+    from .models import ResumenCalificacion
+
+    profesor_id, materia_id, fecha = clave
+    filas = ResumenCalificacion.objects.filter(profesor_id=profesor_id, materia_id=materia_id, fecha=fecha)
+    campos = {campo: F(campo) + valor for campo, valor in delta.items() if valor}
+    if filas.update(**campos):
+        return
+    try:
+        with transaction.atomic():
+            ResumenCalificacion.objects.create(
+                profesor_id=profesor_id, materia_id=materia_id, fecha=fecha, **delta
+            )
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        filas.update(**campos)
+
+
+def reasignar_resumenes_materia(materia_id):
+    # Al borrar una materia sus comentarios quedan sin materia (SET_NULL, sin signals),
+    # así que sus resúmenes se suman a las filas sin materia antes de borrarse en cascada.
+    from .models import ResumenCalificacion
+
+    for resumen in ResumenCalificacion.objects.filter(materia_id=materia_id):
+        delta = Counter({campo: getattr(resumen, campo) for campo in CAMPOS_RESUMEN})
+        if any(delta.values()):
+            _actualizar_resumen((resumen.profesor_id, None, resumen.fecha), delta)
+    Profesor.objects.filter(resumenes__materia_id=materia_id).update(version_datos=F('version_datos') + 1)
+
+
+def agregados_comentarios():
+    # Agregados de un GROUP BY sobre comentarios con los mismos campos de un resumen.
+    return {
+        'suma': Sum('rating'),
+        'cantidad': Count('id'),
+        **{f'estrellas_{r}': Count('id', filter=Q(rating=r)) for r in RATINGS},
+    }
+
+
+def _promedio(suma, cantidad):
+    return suma / cantidad if cantidad else 0.0
+
+
+def recalcular_profesores(profesor_ids, tamano_lote=500):
+    # Reconstruye resúmenes, estadísticas e histograma de los profesores indicados (y de las
+    # materias donde tienen reseñas) con un GROUP BY por lote, en lugar de una escritura por reseña.
+    # Pensado para después de una carga masiva: no se debe ejecutar junto con escrituras normales
+    # de reseñas de esos mismos profesores.
+    from .models import Comentario, ResumenCalificacion
+
+    profesor_ids = sorted(set(profesor_ids))
+    materia_ids = set()
+    for inicio in range(0, len(profesor_ids), tamano_lote):
+        lote = profesor_ids[inicio:inicio + tamano_lote]
+        with transaction.atomic():
+            anteriores = ResumenCalificacion.objects.filter(profesor_id__in=lote)
+            materia_ids.update(anteriores.values_list('materia_id', flat=True).distinct())
+            anteriores.delete()
+
+            grupos = list(
+                Comentario.objects.filter(profesor_id__in=lote, aprobado_por_ia=True)
+                .values('profesor_id', 'materia_id', 'fecha')
+                .annotate(**agregados_comentarios())
+                .order_by()
+            )
+            ResumenCalificacion.objects.bulk_create([ResumenCalificacion(**grupo) for grupo in grupos])
+            materia_ids.update(grupo['materia_id'] for grupo in grupos)
+
+            totales = {profesor_id: Counter() for profesor_id in lote}
+            for grupo in grupos:
+                totales[grupo['profesor_id']].update({campo: grupo[campo] for campo in CAMPOS_RESUMEN})
+            Profesor.objects.bulk_update(
+                [_profesor_con_totales(profesor_id, total) for profesor_id, total in totales.items()],
+                CAMPOS_ESTADISTICAS,
+            )
+            Profesor.objects.filter(pk__in=lote).update(version_datos=F('version_datos') + 1)
+
+    if profesor_ids:
+        rankings.invalidar_por_campos(CAMPOS_ESTADISTICAS)
+    recalcular_materias(materia_ids - {None}, tamano_lote)
+
+
+def _profesor_con_totales(profesor_id, total):
+    return Profesor(
+        pk=profesor_id,
+        suma_ratings=total['suma'],
+        numcomentarios=total['cantidad'],
+        calificacion_media=_promedio(total['suma'], total['cantidad']),
+        puntaje_bayesiano=puntaje_bayesiano(total['suma'], total['cantidad']),
+        **{campo: total[campo] for campo in CAMPOS_RESUMEN[2:]},
+    )
+
+
+def recalcular_materias(materia_ids, tamano_lote=500):
+    # Recalcula las estadísticas de las materias a partir de sus resúmenes.
+    from .models import ResumenCalificacion
+
+    materia_ids = sorted(set(materia_ids))
+    for inicio in range(0, len(materia_ids), tamano_lote):
+        lote = materia_ids[inicio:inicio + tamano_lote]
+        totales = {materia_id: (0, 0) for materia_id in lote}
+        totales.update(
+            (materia_id, (suma, cantidad))
+            for materia_id, suma, cantidad in (
+                ResumenCalificacion.objects.filter(materia_id__in=lote)
+                .values_list('materia_id')
+                .annotate(total_suma=Sum('suma'), total_cantidad=Sum('cantidad'))
+                .order_by()
+            )
+        )
+        with transaction.atomic():
+            Materia.objects.bulk_update(
+                [
+                    Materia(pk=materia_id, suma_ratings=suma, numcomentarios=cantidad,
+                            calificacion_media=_promedio(suma, cantidad))
+                    for materia_id, (suma, cantidad) in totales.items()
+                ],
+                ['suma_ratings', 'numcomentarios', 'calificacion_media'],
+            )
+            Materia.objects.filter(pk__in=lote).update(version_datos=F('version_datos') + 1)
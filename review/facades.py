@@ -4,23 +4,27 @@ Simplifica las operaciones complejas relacionadas con la creación, edición y
 eliminación de comentarios, coordinando múltiples subsistemas.
 """
 
+from django.conf import settings
 from django.contrib import messages
 from .models import Comentario
+from .aprobadores import ProveedorNoDisponible, construir_aprobador
 from account.models import UserProfile
 from django.db import transaction
-from collections import Counter, defaultdict
+from . import agregaciones, moderacion
 
 
 class ComentarioFacade:
     # Fachada que simplifica las operaciones complejas del sistema de comentarios.
     # Coordina: validación de permisos (State), aprobación IA, persistencia y estadísticas.
     
-    def __init__(self, aprobador_strategy=None):
+    def __init__(self, aprobador_strategy=None, moderacion_asincrona=None):
         # Inicializa la fachada con una estrategia de aprobación.
-    
-        # Import here to avoid circular dependency
-        from review.views import ComentarioAprobadorIA
-        self.aprobador = aprobador_strategy or ComentarioAprobadorIA()
+        # Con moderación asíncrona (por defecto según MODERACION_ASINCRONA) las reseñas se
+        # guardan pendientes y las revisa el comando moderate_reviews (ver moderacion.py).
+        self.aprobador = aprobador_strategy or construir_aprobador()
+        if moderacion_asincrona is None:
+            moderacion_asincrona = settings.MODERACION_ASINCRONA
+        self.moderacion_asincrona = moderacion_asincrona
     
     def puede_usuario_comentar(self, user):
         # Verifica si el usuario tiene permisos para comentar.
@@ -58,11 +62,24 @@ class ComentarioFacade:
                 anonimo=es_anonimo
             )
             
+            # 3. Encolar para moderación, sin esperar a la API dentro de la transacción
+            if self.moderacion_asincrona:
+                comentario.save()
+                moderacion.encolar(comentario)
+                return True, comentario, 'Tu comentario fue recibido y se publicará cuando termine la moderación.'
+
             # 3. Aprobar con IA (Strategy pattern)
-            aprobado = self.aprobador.aprobar(comentario.contenido)
+            try:
+                aprobado = self.aprobador.aprobar(comentario.contenido)
+            except ProveedorNoDisponible:
+                # La API no responde: la reseña queda pendiente para el worker de moderación
+                comentario.save()
+                moderacion.encolar(comentario)
+                return True, comentario, 'Tu comentario fue recibido y se publicará cuando termine la moderación.'
             
             if aprobado:
                 comentario.aprobado_por_ia = True
+                comentario.estado_moderacion = Comentario.APROBADO
                 comentario.save()
                 # Los signals de Django actualizan automáticamente las estadísticas
                 return True, comentario, 'Tu comentario ha sido aprobado y publicado.'
@@ -101,12 +118,27 @@ class ComentarioFacade:
             if 'materia' in nuevos_datos:
                 comentario.materia = nuevos_datos['materia']
             
-            # Re-aprobar si cambió el contenido
+            # Re-aprobar si cambió el contenido; en modo asíncrono (o si la API no responde)
+            # deja de publicarse hasta entonces
+            aprobado = None
+            if contenido_cambio and re_aprobar and not self.moderacion_asincrona:
+                try:
+                    aprobado = self.aprobador.aprobar(comentario.contenido)
+                except ProveedorNoDisponible:
+                    pass
+
+            if contenido_cambio and re_aprobar and aprobado is None:
+                comentario.aprobado_por_ia = False
+                comentario.estado_moderacion = Comentario.PENDIENTE
+                comentario.save()
+                moderacion.encolar(comentario)
+                return True, comentario, 'Comentario actualizado; se publicará cuando termine la moderación.'
+
             if contenido_cambio and re_aprobar:
-                aprobado = self.aprobador.aprobar(comentario.contenido)
                 if not aprobado:
                     return False, None, 'El contenido editado no cumple las normas.'
                 comentario.aprobado_por_ia = True
+                comentario.estado_moderacion = Comentario.APROBADO
             
             comentario.save()
             # Los signals actualizan automáticamente las estadísticas
@@ -139,13 +171,13 @@ class ComentarioFacade:
         # Obtiene estadísticas consolidadas de un profesor.
 
         try:
-            comentarios = Comentario.objects.filter(profesor=profesor, aprobado_por_ia=True)
+            distribucion = self._contar_ratings(profesor)
             
             return {
-                'total_comentarios': comentarios.count(),
+                'total_comentarios': sum(distribucion.values()),
                 'calificacion_promedio': profesor.calificacion_media,
-                'comentarios_por_semestre': self._agrupar_por_semestre(comentarios),
-                'distribucion_ratings': self._contar_ratings(comentarios),
+                'comentarios_por_semestre': self._agrupar_por_semestre(profesor),
+                'distribucion_ratings': distribucion,
             }
         except Exception as e:
             return {
@@ -180,18 +212,17 @@ class ComentarioFacade:
     
     # Métodos privados auxiliares
     
-    def _agrupar_por_semestre(self, comentarios):
-        # Agrupa comentarios por semestre.
-        
-        agrupados = defaultdict(list)
-        for c in comentarios:
-            agrupados[c.fecha].append(c.rating)
-        return dict(agrupados)
+    def _agrupar_por_semestre(self, profesor):
+        # Agrupa comentarios por semestre: {fecha: {'promedio': ..., 'cantidad': ...}}.
+        # La agregación se hace en la base de datos con un solo GROUP BY.
+        return {
+            fecha: {'promedio': promedio, 'cantidad': cantidad}
+            for fecha, promedio, cantidad in agregaciones.promedios_por_semestre(profesor=profesor)
+        }
     
-    def _contar_ratings(self, comentarios):
-        # Cuenta la distribución de ratings.
-        ratings = [c.rating for c in comentarios]
-        return dict(Counter(ratings))
+    def _contar_ratings(self, profesor):
+        # Cuenta la distribución de ratings: {rating: cantidad}.
+        return dict(agregaciones.conteo_ratings(profesor=profesor))
     
     def cambiar_aprobador(self, nuevo_aprobador):
         # Cambia la estrategia de aprobación en tiempo de ejecución.
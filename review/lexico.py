@@ -0,0 +1,150 @@
+"""
+Primera etapa local de la moderación: un léxico de términos ofensivos en español e inglés.
+Una reseña con un término de la lista 'bloquear' se rechaza sin consultar la IA. Una sin
+ninguna coincidencia, corta y sin enlaces se aprueba (si la política lo permite). Solo el
+resto, lo dudoso, pasa al aprobador siguiente (la IA). FiltroLexico, en aprobadores.py,
+cuenta cuántas veces se toma cada camino.
+
+El texto se normaliza antes de buscar: minúsculas, sin tildes, leetspeak ('h1jueput4' ->
+'hijueputa') y letras repetidas ('putaaaa' -> 'puta'). Los términos se compilan en una
+sola expresión regular armada como un trie, que el motor de re recorre en C como un
+autómata, sin probar los términos uno por uno. Cada término coincide solo como palabra
+completa ('puta' no coincide dentro de 'computadora'); con * al final, como inicio de palabra.
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+
+BLOQUEAR = 'bloquear'
+REVISAR = 'revisar'
+
+# Decisiones del filtro
+RECHAZAR = 'rechazar'
+APROBAR = 'aprobar'
+CONSULTAR = 'consultar'
+
+Clasificacion = namedtuple('Clasificacion', ['decision', 'coincidencias'])
+
+_LEET = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'})
+# Solo si el texto trae números o símbolos se recorre palabra por palabra
+_LEET_CANDIDATO = re.compile(r'[0-9@$]')
+_TOKEN = re.compile(r'[a-z0-9@$]+')
+_DIACRITICOS = re.compile('[\u0300-\u036f]+')
+_REPETIDAS = re.compile(r'([a-z])\1\1+')
+_ENLACES = ('http://', 'https://', 'www.')
+
+
+def normalizar(texto):
+    # Minúsculas, sin tildes, sin leetspeak y sin letras repetidas más de dos veces.
+    # Cada paso es una sola pasada de re o de str en C: el filtro corre en cada reseña.
+    texto = (texto or '').lower()
+    if not texto.isascii():
+        texto = _DIACRITICOS.sub('', unicodedata.normalize('NFKD', texto))
+    if _LEET_CANDIDATO.search(texto):
+        texto = _TOKEN.sub(_sin_leet, texto)
+    texto = _REPETIDAS.sub(r'\1', texto)
+    return ' '.join(texto.split())
+
+
+def _sin_leet(coincidencia):
+    # Solo en palabras que mezclan letras con números o símbolos: '2024' o '$100' no cambian
+    token = coincidencia.group()
+    if token.isalpha() or not any(c.isalpha() for c in token):
+        return token
+    return token.translate(_LEET)
+
+
+class Lexico:
+    # Términos normalizados por categoría, compilados en una expresión regular.
+
+    def __init__(self, terminos):
+        # `terminos` es un iterable de (categoria, termino); con * al final es un prefijo
+        self.categorias = {}
+        prefijos = set()
+        for categoria, termino in terminos:
+            prefijo = termino.endswith('*')
+            termino = normalizar(termino.rstrip('*'))
+            if not termino:
+                continue
+            # Si un término aparece en las dos listas, bloquear gana
+            if self.categorias.get(termino) != BLOQUEAR:
+                self.categorias[termino] = categoria
+            if prefijo:
+                prefijos.add(termino)
+        self.patron = _compilar(self.categorias, prefijos) if self.categorias else None
+
+    @classmethod
+    def desde_archivo(cls, ruta):
+        # Formato: secciones [bloquear] y [revisar], un término por línea y # para comentarios
+        terminos = []
+        categoria = None
+        with open(ruta, encoding='utf-8') as archivo:
+            for numero, linea in enumerate(archivo, 1):
+                linea = linea.split('#', 1)[0].strip()
+                if not linea:
+                    continue
+                if linea.startswith('[') and linea.endswith(']'):
+                    categoria = linea[1:-1].strip()
+                    if categoria not in (BLOQUEAR, REVISAR):
+                        raise ValueError(f'{ruta}:{numero}: sección desconocida {linea}')
+                elif categoria is None:
+                    raise ValueError(f'{ruta}:{numero}: término fuera de una sección')
+                else:
+                    terminos.append((categoria, linea))
+        return cls(terminos)
+
+    def buscar(self, texto):
+        # Términos del léxico que aparecen en el texto ya normalizado, con su categoría
+        if self.patron is None:
+            return []
+        return [(self.categorias[termino], termino) for termino in self.patron.findall(texto)]
+
+    def clasificar(self, texto, aprobar_limpios=True, max_caracteres=600):
+        coincidencias = self.buscar(normalizar(texto))
+        categorias = {categoria for categoria, _ in coincidencias}
+        if BLOQUEAR in categorias:
+            return Clasificacion(RECHAZAR, coincidencias)
+        # Bajo riesgo: sin coincidencias, corto y sin enlaces (que suelen ser spam)
+        minusculas = texto.lower()
+        bajo_riesgo = (
+            not coincidencias and len(texto) <= max_caracteres
+            and not any(enlace in minusculas for enlace in _ENLACES)
+        )
+        if aprobar_limpios and bajo_riesgo:
+            return Clasificacion(APROBAR, coincidencias)
+        return Clasificacion(CONSULTAR, coincidencias)
+
+
+@lru_cache(maxsize=None)
+def cargar(ruta):
+    # Un léxico compilado por archivo y proceso: la fachada arma un aprobador en cada petición
+    return Lexico.desde_archivo(ruta)
+
+
+def _compilar(categorias, prefijos):
+    # Trie de los términos convertido en una expresión regular: (?:hij(?:o de puta|ueputa)|...)
+    # Los términos completos exigen que después no siga una letra o número.
+    trie = {}
+    for termino in categorias:
+        nodo = trie
+        for caracter in termino:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = termino in prefijos
+    patron = _patron_trie(trie)
+    # findall retorna el grupo: el término sin el límite de palabra
+    return re.compile(rf'(?<![a-z0-9])({patron})')
+
+
+def _patron_trie(nodo):
+    ramas = []
+    for caracter in sorted(c for c in nodo if c):
+        ramas.append(re.escape(caracter) + _patron_trie(nodo[caracter]))
+    if '' in nodo:
+        # Un término termina aquí: se prueba antes lo más largo y después este final
+        ramas.append('' if nodo[''] else '(?![a-z0-9])')
+    if len(ramas) == 1:
+        return ramas[0]
+    return '(?:' + '|'.join(ramas) + ')'
@@ -0,0 +1,200 @@
+"""
+Importa reseñas históricas desde un archivo JSONL o CSV.
+Las filas se leen en streaming y se insertan con bulk_create por lotes, que no dispara
+los signals de la actualización incremental de estadísticas. Al terminar se recalculan
+una sola vez, con consultas agrupadas, los profesores que recibieron reseñas.
+
+Cada fila tiene las claves: profesor (id o nombre), materia (id o nombre, opcional),
+usuario (username, opcional con --usuario), contenido, rating, fecha (semestre),
+aprobado_por_ia y anonimo (opcionales). Las reseñas no aprobadas quedan pendientes en la
+cola de moderación, para que las revise el comando moderate_reviews (una llamada al proveedor
+de moderación por reseña). Con --sin-moderacion se guardan directamente como rechazadas y no
+se encolan: para históricos que ya pasaron por otra moderación, o que no vale la pena revisar.
+"""
+
+import csv
+import json
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from profesores.models import Profesor, Materia
+from review.estadisticas import recalcular_profesores
+from review.models import Comentario, TareaModeracion
+
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí', 'yes', 'x'}
+ERRORES_A_MOSTRAR = 10
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Importa reseñas desde JSONL o CSV con bulk_create y recalcula las estadísticas al final.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o '-' para leer de la entrada estándar.")
+        parser.add_argument('--formato', choices=['jsonl', 'csv'], default=None,
+                            help='Formato del archivo (por defecto según la extensión).')
+        parser.add_argument('--lote', type=int, default=2000,
+                            help='Cantidad de reseñas por bulk_create.')
+        parser.add_argument('--usuario', default=None,
+                            help='Username a usar en las filas que no indican usuario.')
+        parser.add_argument('--aprobados', action='store_true',
+                            help='Marca como aprobadas las filas que no indican aprobado_por_ia.')
+        parser.add_argument('--sin-moderacion', action='store_true',
+                            help='Guarda las filas no aprobadas como rechazadas, sin encolarlas para moderate_reviews.')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('csv' if options['archivo'].endswith('.csv') else 'jsonl')
+        self.aprobados = options['aprobados']
+        self.estado_no_aprobados = Comentario.RECHAZADO if options['sin_moderacion'] else Comentario.PENDIENTE
+        self.usuarios = {}
+        try:
+            self.usuario_defecto = self._usuario(options['usuario']) if options['usuario'] else None
+        except FilaInvalida as e:
+            raise CommandError(str(e))
+        self.profesores = self._indice(Profesor)
+        self.materias = self._indice(Materia)
+
+        importadas = errores = 0
+        self.encoladas = 0
+        profesor_ids = set()
+        inicio = time.perf_counter()
+        with self._abrir(options['archivo']) as archivo:
+            lote = []
+            for numero, fila in self._filas(archivo, formato):
+                try:
+                    lote.append(self._comentario(fila))
+                except FilaInvalida as e:
+                    errores += 1
+                    if errores <= ERRORES_A_MOSTRAR:
+                        self.stderr.write(f'Fila {numero}: {e}')
+                if len(lote) >= options['lote']:
+                    importadas += self._insertar(lote, profesor_ids)
+                    lote = []
+            importadas += self._insertar(lote, profesor_ids)
+        duracion_carga = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        recalcular_profesores(profesor_ids)
+        duracion_recalculo = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f'{importadas} reseñas importadas en {duracion_carga:.2f} s '
+            f'({importadas / duracion_carga if duracion_carga else 0:.0f} filas/s), {errores} filas con errores, '
+            f'{self.encoladas} en la cola de moderación.'
+        )
+        self.stdout.write(
+            f'Estadísticas de {len(profesor_ids)} profesores recalculadas en {duracion_recalculo:.2f} s.'
+        )
+
+    def _abrir(self, ruta):
+        if ruta == '-':
+            return open(sys.stdin.fileno(), encoding='utf-8', closefd=False)
+        try:
+            return open(ruta, encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir {ruta}: {e}')
+
+    def _filas(self, archivo, formato):
+        # Genera (número de fila, diccionario) sin cargar el archivo completo en memoria.
+        if formato == 'csv':
+            for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+                yield numero, fila
+            return
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                yield numero, json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield numero, e
+
+    def _insertar(self, lote, profesor_ids):
+        # Un lote por transacción: si algo falla, los lotes anteriores quedan guardados.
+        # Las reseñas no aprobadas quedan en la cola de moderación, como las de la fachada.
+        if lote:
+            with transaction.atomic():
+                Comentario.objects.bulk_create(lote)
+                ahora = timezone.now()
+                tareas = TareaModeracion.objects.bulk_create(
+                    TareaModeracion(comentario=comentario, disponible_en=ahora)
+                    for comentario in lote if comentario.estado_moderacion == Comentario.PENDIENTE
+                )
+            self.encoladas += len(tareas)
+            profesor_ids.update(comentario.profesor_id for comentario in lote)
+        return len(lote)
+
+    def _indice(self, modelo):
+        # Profesores y materias se buscan por id o por nombre sin una consulta por fila.
+        indice = {}
+        for pk, nombre in modelo.objects.values_list('pk', 'nombre'):
+            indice[str(pk)] = pk
+            indice.setdefault(nombre.strip().lower(), pk)
+        return indice
+
+    def _usuario(self, username):
+        if username not in self.usuarios:
+            pk = User.objects.filter(username=username).values_list('pk', flat=True).first()
+            if pk is None:
+                raise FilaInvalida(f'el usuario {username!r} no existe')
+            self.usuarios[username] = pk
+        return self.usuarios[username]
+
+    def _comentario(self, fila):
+        if isinstance(fila, Exception):
+            raise FilaInvalida(f'JSON inválido ({fila})')
+        if not isinstance(fila, dict):
+            raise FilaInvalida('se esperaba un objeto JSON')
+
+        profesor_id = self.profesores.get(str(fila.get('profesor') or '').strip().lower())
+        if profesor_id is None:
+            raise FilaInvalida(f"el profesor {fila.get('profesor')!r} no existe")
+
+        materia = str(fila.get('materia') or '').strip()
+        materia_id = self.materias.get(materia.lower()) if materia else None
+        if materia and materia_id is None:
+            raise FilaInvalida(f'la materia {materia!r} no existe')
+
+        usuario = str(fila.get('usuario') or '').strip()
+        usuario_id = self._usuario(usuario) if usuario else self.usuario_defecto
+        if usuario_id is None:
+            raise FilaInvalida('la fila no indica usuario y no se pasó --usuario')
+
+        try:
+            rating = int(fila.get('rating'))
+        except (TypeError, ValueError):
+            rating = None
+        if rating not in range(1, 6):
+            raise FilaInvalida(f"rating inválido {fila.get('rating')!r}")
+
+        fecha = str(fila.get('fecha') or '').strip()
+        if fecha not in dict(Comentario.SEMESTRES):
+            raise FilaInvalida(f'semestre inválido {fecha!r}')
+
+        aprobado = self._booleano(fila.get('aprobado_por_ia'), self.aprobados)
+        return Comentario(
+            profesor_id=profesor_id,
+            materia_id=materia_id,
+            usuario_id=usuario_id,
+            contenido=str(fila.get('contenido') or ''),
+            rating=rating,
+            fecha=fecha,
+            aprobado_por_ia=aprobado,
+            estado_moderacion=Comentario.APROBADO if aprobado else self.estado_no_aprobados,
+            anonimo=self._booleano(fila.get('anonimo'), False),
+        )
+
+    def _booleano(self, valor, defecto):
+        if valor is None or valor == '':
+            return defecto
+        if isinstance(valor, bool):
+            return valor
+        return str(valor).strip().lower() in VALORES_VERDADEROS
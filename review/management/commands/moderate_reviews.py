@@ -0,0 +1,94 @@
+"""
+Worker de moderación: revisa con la API de OpenAI las reseñas que ComentarioFacade dejó en
+la cola y publica las aprobadas (ver review/moderacion.py). Se ejecuta como un proceso
+aparte del servidor web; con --una-vez procesa lo pendiente y termina, para usarlo desde cron.
+"""
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from review import moderacion
+from review.aprobadores import (
+    AprobadorDegradado, AprobadorPorLotes, CacheVeredictos, FiltroLexico, ProveedorResiliente, construir_aprobador,
+)
+
+
+class Command(BaseCommand):
+    help = 'Modera en segundo plano las reseñas pendientes, con concurrencia limitada y reintentos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=None,
+                            help='Llamadas simultáneas a la API (por defecto MODERACION_CONCURRENCIA).')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Termina cuando no quedan tareas disponibles en lugar de esperar nuevas.')
+        parser.add_argument('--espera', type=float, default=2.0,
+                            help='Segundos entre consultas a la cola cuando está vacía.')
+        parser.add_argument('--reintentar-fallidas', action='store_true',
+                            help='Antes de empezar, devuelve a la cola las tareas que agotaron sus intentos.')
+
+    def handle(self, *args, **options):
+        if options['concurrencia'] is not None and options['concurrencia'] < 1:
+            raise CommandError('--concurrencia debe ser mayor que 0.')
+        if options['reintentar_fallidas']:
+            self.stdout.write(f'{moderacion.reintentar_fallidas()} tareas fallidas devueltas a la cola.')
+
+        moderador = moderacion.Moderador(construir_aprobador(), concurrencia=options['concurrencia'])
+        # Al recibir SIGTERM o Ctrl+C se terminan las revisiones en curso antes de salir
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(senal, lambda *args: moderador.detener())
+
+        inicio = time.perf_counter()
+        conteo = moderador.ejecutar(hasta_vaciar=options['una_vez'], espera=options['espera'])
+        self.stdout.write(
+            f"{conteo['aprobadas']} aprobadas, {conteo['rechazadas']} rechazadas, "
+            f"{conteo['reintentos']} reintentos programados, {conteo['aplazadas']} aplazadas "
+            f"por falta de API y {conteo['fallidas']} fallidas "
+            f"en {time.perf_counter() - inicio:.1f} s."
+        )
+        self._imprimir_metricas(moderador.aprobador)
+
+    def _imprimir_metricas(self, aprobador):
+        # Recorre los decoradores del aprobador (filtro léxico, degradación, caché, lotes, API)
+        # y reporta los de cada uno
+        while aprobador is not None:
+            if isinstance(aprobador, CacheVeredictos):
+                metricas = aprobador.metricas()
+                self.stdout.write(
+                    f"Caché de veredictos: {metricas['aciertos']} de {metricas['consultas']} "
+                    f"({metricas['tasa_aciertos']:.0%}) sin llamar a la API, unos "
+                    f"{metricas['segundos_ahorrados']:.1f} s de API ahorrados."
+                )
+            elif isinstance(aprobador, FiltroLexico):
+                metricas = aprobador.metricas()
+                self.stdout.write(
+                    f"Filtro léxico: {metricas['rechazadas']} rechazadas y {metricas['aprobadas']} "
+                    f"aprobadas sin la IA, {metricas['consultadas']} enviadas a la IA "
+                    f"({metricas['microsegundos_promedio']:.0f} µs por reseña)."
+                )
+            elif isinstance(aprobador, AprobadorDegradado):
+                metricas = aprobador.metricas()
+                self.stdout.write(
+                    f"Sin API (política '{aprobador.politica}'): {metricas['aprobadas']} aprobadas, "
+                    f"{metricas['rechazadas']} rechazadas y {metricas['encoladas']} devueltas a la cola."
+                )
+            elif isinstance(aprobador, ProveedorResiliente):
+                metricas = aprobador.metricas()
+                self.stdout.write(
+                    f"API: {metricas['intentos']} intentos, {metricas['tasa_errores']:.0%} con error "
+                    f"({metricas['timeouts']} por timeout), {metricas['reintentos']} reintentos, "
+                    f"circuito {metricas['estado']} (abierto {metricas['aperturas']} veces), "
+                    f"p50 {metricas['p50_ms']} ms, p95 {metricas['p95_ms']} ms."
+                )
+                self.stdout.write('Latencias (ms): ' + ', '.join(
+                    f'{grupo}: {cantidad}' for grupo, cantidad in metricas['histograma_ms'].items()
+                ))
+            elif isinstance(aprobador, AprobadorPorLotes):
+                metricas = aprobador.metricas()
+                self.stdout.write(
+                    f"Lotes: {metricas['comentarios']} reseñas en {metricas['lotes']} llamadas "
+                    f"({metricas['promedio_por_lote']:.1f} por llamada), "
+                    f"{metricas['lotes_invalidos']} respuestas inválidas revisadas una a una."
+                )
+            aprobador = getattr(aprobador, 'aprobador', None)
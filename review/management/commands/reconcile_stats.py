@@ -0,0 +1,262 @@
+"""
+Detecta y corrige diferencias entre las estadísticas guardadas y las reseñas reales.
+Las estadísticas se mantienen de forma incremental con signals; si una escritura los
+salta (borrados masivos desde el admin, SQL directo, un proceso que murió a mitad de
+una transacción) quedan desfasadas. Este comando recalcula, con GROUP BY por rangos de
+ids, las estadísticas de profesores, materias y resúmenes, las compara con las guardadas
+y escribe en bloque solo las filas que cambiaron.
+
+La primera pasada solo detecta los rangos con diferencias, sin transacción y en paralelo.
+Cada rango con diferencias se vuelve a calcular y se escribe dentro de una transacción que
+antes bloquea sus filas: así un delta de los signals confirmado entre la lectura y la
+escritura no se pierde (la reseña que lo causó ya está en el cálculo, o espera al bloqueo
+y se suma después sobre los valores corregidos).
+
+Con SQLite la detección usa un solo hilo salvo que se pida --workers: los rangos son
+consultas cortas sobre un mismo archivo y los hilos solo suman conexiones. Con --workers N
+cada hilo abre su propia conexión y la cierra al terminar su rango (también con SQLite).
+"""
+
+import math
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Avg, F
+
+from profesores import rankings
+from profesores.models import Profesor, Materia, puntaje_bayesiano
+from review.estadisticas import CAMPOS_RESUMEN, agregados_comentarios
+from review.models import Comentario, ResumenCalificacion
+
+
+HISTOGRAMA = CAMPOS_RESUMEN[2:]
+CAMPOS_PROFESOR = ['suma_ratings', 'numcomentarios', 'calificacion_media', 'puntaje_bayesiano'] + HISTOGRAMA
+CAMPOS_MATERIA = ['suma_ratings', 'numcomentarios', 'calificacion_media']
+
+
+class Revision:
+    # Cambios encontrados en un rango de ids, listos para aplicar en bloque.
+
+    def __init__(self):
+        self.profesores = []
+        self.materias = []
+        self.resumenes_nuevos = []
+        self.resumenes_cambiados = []
+        self.resumenes_sobrantes = []
+        self.detalles = []
+        # Ids cuyos datos de gráficas cambiaron, para invalidar su caché con version_datos
+        self.profesores_afectados = []
+        self.materias_afectadas = []
+
+    def unir(self, otra):
+        for campo, valor in vars(otra).items():
+            getattr(self, campo).extend(valor)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las estadísticas de profesores, materias y resúmenes y corrige las que no coinciden.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo reporta las diferencias, sin escribir.')
+        parser.add_argument('--lote', type=int, default=2000,
+                            help='Cantidad de ids de profesores o materias por consulta agrupada.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Hilos que calculan los rangos en paralelo (las escrituras son secuenciales). '
+                                 'Por defecto 4, o 1 con SQLite, que no se beneficia de lecturas en paralelo.')
+        parser.add_argument('--mostrar', type=int, default=20,
+                            help='Cantidad de diferencias a detallar en el reporte.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        tareas = [
+            (self._revisar_profesores, rango) for rango in self._rangos(Profesor, options['lote'])
+        ] + [
+            (self._revisar_materias, rango) for rango in self._rangos(Materia, options['lote'])
+        ]
+
+        revision = Revision()
+        # Ver el docstring del módulo: con SQLite, un hilo salvo que se pida --workers
+        workers = options['workers'] or (1 if connection.vendor == 'sqlite' else 4)
+        if options['verbosity'] > 1:
+            self.stdout.write(f'Revisando {len(tareas)} rangos con {workers} hilo(s).')
+        con_diferencias = []
+        for tarea, parcial in zip(tareas, self._ejecutar(tareas, workers)):
+            revision.unir(parcial)
+            if parcial.detalles:
+                con_diferencias.append(tarea)
+        duracion = time.perf_counter() - inicio
+
+        for detalle in revision.detalles[:options['mostrar']]:
+            self.stdout.write(f'  {detalle}')
+        self.stdout.write(
+            f'Diferencias: {len(revision.profesores)} profesores, {len(revision.materias)} materias, '
+            f'{len(revision.resumenes_nuevos) + len(revision.resumenes_cambiados) + len(revision.resumenes_sobrantes)} '
+            f'resúmenes (calculado en {duracion:.2f} s).'
+        )
+
+        # Referencia para PUNTAJE_BAYESIANO_MEDIA
+        self.stdout.write(f'Media global de las reseñas aprobadas: {self._media_global():.2f}')
+
+        if not revision.detalles:
+            self.stdout.write(self.style.SUCCESS('Las estadísticas coinciden con las reseñas.'))
+            return
+        if options['dry_run']:
+            self.stdout.write('Modo --dry-run: no se escribió nada.')
+            return
+        inicio = time.perf_counter()
+        corregidas = sum(len(self._corregir(funcion, rango).detalles) for funcion, rango in con_diferencias)
+        self.stdout.write(self.style.SUCCESS(
+            f'{corregidas} correcciones escritas en {time.perf_counter() - inicio:.2f} s.'
+        ))
+
+    def _media_global(self):
+        media = Comentario.objects.filter(aprobado_por_ia=True).aggregate(media=Avg('rating'))['media']
+        return media or 0.0
+
+    def _rangos(self, modelo, tamano):
+        # Rangos [desde, hasta] de ids existentes, para filtrar por BETWEEN sobre la clave primaria
+        ids = list(modelo.objects.order_by('pk').values_list('pk', flat=True))
+        return [(ids[i], ids[min(i + tamano, len(ids)) - 1]) for i in range(0, len(ids), tamano)]
+
+    def _ejecutar(self, tareas, workers):
+        if workers <= 1:
+            return [funcion(*rango) for funcion, rango in tareas]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda tarea: self._en_hilo(*tarea), tareas))
+
+    def _en_hilo(self, funcion, rango):
+        # Cada hilo usa su propia conexión; se cierra al terminar la tarea
+        try:
+            return funcion(*rango)
+        finally:
+            connection.close()
+
+    def _corregir(self, funcion, rango):
+        # Recalcula y escribe un rango en una sola transacción. El UPDATE sin cambios toma el
+        # bloqueo de escritura antes de leer (las filas en PostgreSQL y MySQL, la base completa
+        # en SQLite): los signals de una reseña de esos profesores o materias actualizan
+        # primero su fila, así que esperan a que esta transacción termine.
+        modelo = Profesor if funcion == self._revisar_profesores else Materia
+        with transaction.atomic():
+            modelo.objects.filter(pk__range=rango).update(version_datos=F('version_datos'))
+            revision = funcion(*rango)
+            self._aplicar(revision)
+        return revision
+
+    def _revisar_profesores(self, desde, hasta):
+        revision = Revision()
+        aprobados = Comentario.objects.filter(profesor_id__gte=desde, profesor_id__lte=hasta, aprobado_por_ia=True)
+
+        # Un solo GROUP BY por (profesor, materia, semestre); los totales del profesor salen de sumar sus grupos
+        reales = {
+            (fila.pop('profesor_id'), fila.pop('materia_id'), fila.pop('fecha')): fila
+            for fila in aprobados.values('profesor_id', 'materia_id', 'fecha').annotate(**agregados_comentarios()).order_by()
+        }
+        totales = defaultdict(Counter)
+        for (profesor_id, _, _), fila in reales.items():
+            totales[profesor_id].update(fila)
+
+        for guardado in Profesor.objects.filter(pk__range=(desde, hasta)).values('pk', 'nombre', *CAMPOS_PROFESOR):
+            real = totales[guardado['pk']]
+            esperado = {
+                'suma_ratings': real['suma'],
+                'numcomentarios': real['cantidad'],
+                'calificacion_media': _promedio(real['suma'], real['cantidad']),
+                'puntaje_bayesiano': puntaje_bayesiano(real['suma'], real['cantidad']),
+                **{campo: real[campo] for campo in HISTOGRAMA},
+            }
+            cambios = _cambios(guardado, esperado)
+            if cambios:
+                revision.profesores.append(Profesor(pk=guardado['pk'], **esperado))
+                revision.profesores_afectados.append(guardado['pk'])
+                revision.detalles.append(f"Profesor {guardado['nombre']} ({guardado['pk']}): {cambios}")
+
+        guardados = ResumenCalificacion.objects.filter(profesor_id__gte=desde, profesor_id__lte=hasta).values(
+            'pk', 'profesor_id', 'materia_id', 'fecha', *CAMPOS_RESUMEN
+        )
+        for guardado in guardados:
+            clave = (guardado['profesor_id'], guardado['materia_id'], guardado['fecha'])
+            real = reales.pop(clave, None)
+            if real is None:
+                if not any(guardado[campo] for campo in CAMPOS_RESUMEN):
+                    continue
+                revision.resumenes_sobrantes.append(guardado['pk'])
+                cambios = 'sin reseñas aprobadas'
+            else:
+                cambios = _cambios(guardado, real)
+                if not cambios:
+                    continue
+                revision.resumenes_cambiados.append(ResumenCalificacion(pk=guardado['pk'], **real))
+            revision.detalles.append(f'Resumen {clave}: {cambios}')
+            revision.profesores_afectados.append(clave[0])
+            revision.materias_afectadas.append(clave[1])
+        for (profesor_id, materia_id, fecha), real in reales.items():
+            revision.resumenes_nuevos.append(
+                ResumenCalificacion(profesor_id=profesor_id, materia_id=materia_id, fecha=fecha, **real)
+            )
+            revision.detalles.append(f'Resumen {(profesor_id, materia_id, fecha)}: faltaba')
+            revision.profesores_afectados.append(profesor_id)
+            revision.materias_afectadas.append(materia_id)
+        return revision
+
+    def _revisar_materias(self, desde, hasta):
+        revision = Revision()
+        reales = {
+            materia_id: (suma, cantidad)
+            for materia_id, suma, cantidad in (
+                Comentario.objects.filter(materia_id__gte=desde, materia_id__lte=hasta, aprobado_por_ia=True)
+                .values_list('materia_id')
+                .annotate(**{campo: agregados_comentarios()[campo] for campo in ('suma', 'cantidad')})
+                .order_by()
+            )
+        }
+        for guardado in Materia.objects.filter(pk__range=(desde, hasta)).values('pk', 'nombre', *CAMPOS_MATERIA):
+            suma, cantidad = reales.get(guardado['pk'], (0, 0))
+            esperado = {
+                'suma_ratings': suma,
+                'numcomentarios': cantidad,
+                'calificacion_media': _promedio(suma, cantidad),
+            }
+            cambios = _cambios(guardado, esperado)
+            if cambios:
+                revision.materias.append(Materia(pk=guardado['pk'], **esperado))
+                revision.materias_afectadas.append(guardado['pk'])
+                revision.detalles.append(f"Materia {guardado['nombre']} ({guardado['pk']}): {cambios}")
+        return revision
+
+    def _aplicar(self, revision):
+        with transaction.atomic():
+            Profesor.objects.bulk_update(revision.profesores, CAMPOS_PROFESOR, batch_size=500)
+            Materia.objects.bulk_update(revision.materias, CAMPOS_MATERIA, batch_size=500)
+            ResumenCalificacion.objects.filter(pk__in=revision.resumenes_sobrantes).delete()
+            ResumenCalificacion.objects.bulk_update(revision.resumenes_cambiados, CAMPOS_RESUMEN, batch_size=500)
+            ResumenCalificacion.objects.bulk_create(revision.resumenes_nuevos, batch_size=500)
+
+            # Las gráficas en caché de lo que cambió dejan de ser válidas
+            Profesor.objects.filter(pk__in=set(revision.profesores_afectados)).update(
+                version_datos=F('version_datos') + 1
+            )
+            Materia.objects.filter(pk__in=set(revision.materias_afectadas) - {None}).update(
+                version_datos=F('version_datos') + 1
+            )
+            if revision.profesores:
+                rankings.invalidar_por_campos(CAMPOS_PROFESOR)
+
+
+def _promedio(suma, cantidad):
+    return suma / cantidad if cantidad else 0.0
+
+
+def _cambios(guardado, esperado):
+    # Texto con los campos que no coinciden, o '' si todo coincide.
+    diferencias = []
+    for campo, valor in esperado.items():
+        actual = guardado[campo]
+        iguales = math.isclose(actual, valor, abs_tol=1e-9) if isinstance(valor, float) else actual == valor
+        if not iguales:
+            diferencias.append(f'{campo} {actual} -> {valor}')
+    return ', '.join(diferencias)
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:57
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def construir_resumenes(apps, schema_editor):
+    # Llena los resúmenes y las estadísticas de cada materia con las reseñas aprobadas existentes.
+    Comentario = apps.get_model('review', 'Comentario')
+    ResumenCalificacion = apps.get_model('review', 'ResumenCalificacion')
+    Materia = apps.get_model('profesores', 'Materia')
+
+    grupos = (
+        Comentario.objects.filter(aprobado_por_ia=True)
+        .values('profesor_id', 'materia_id', 'fecha')
+        .annotate(
+            suma=Sum('rating'),
+            cantidad=Count('id'),
+            **{f'estrellas_{r}': Count('id', filter=Q(rating=r)) for r in range(1, 6)},
+        )
+        .order_by()
+    )
+    ResumenCalificacion.objects.bulk_create([ResumenCalificacion(**grupo) for grupo in grupos])
+
+    totales = (
+        ResumenCalificacion.objects.filter(materia__isnull=False)
+        .values('materia_id')
+        .annotate(total_suma=Sum('suma'), total_cantidad=Sum('cantidad'))
+        .order_by()
+    )
+    for total in totales:
+        Materia.objects.filter(pk=total['materia_id']).update(
+            suma_ratings=total['total_suma'],
+            numcomentarios=total['total_cantidad'],
+            calificacion_media=total['total_suma'] / total['total_cantidad'] if total['total_cantidad'] else 0.0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0006_materia_suma_ratings'),
+        ('review', '0008_comentario_materia_alter_comentario_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCalificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.CharField(choices=[('2024-2', '2024-2'), ('2024-1', '2024-1'), ('2023-2', '2023-2'), ('2023-1', '2023-1'), ('2022-2', '2022-2'), ('2022-1', '2022-1'), ('2021-2', '2021-2'), ('2021-1', '2021-1')], max_length=7)),
+                ('suma', models.IntegerField(default=0)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('estrellas_1', models.IntegerField(default=0)),
+                ('estrellas_2', models.IntegerField(default=0)),
+                ('estrellas_3', models.IntegerField(default=0)),
+                ('estrellas_4', models.IntegerField(default=0)),
+                ('estrellas_5', models.IntegerField(default=0)),
+                ('materia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='profesores.materia')),
+                ('profesor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='profesores.profesor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['materia', 'fecha'], name='resumen_materia_fecha_idx')],
+                'constraints': [models.UniqueConstraint(models.F('profesor'), django.db.models.functions.comparison.Coalesce(models.F('materia'), models.Value(0), output_field=models.IntegerField()), models.F('fecha'), name='resumen_unico_por_profesor_materia_semestre')],
+            },
+        ),
+        migrations.RunPython(construir_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profesores', '0009_indices_recomendacion'),
+        ('review', '0009_resumencalificacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(condition=models.Q(('aprobado_por_ia', True)), fields=['profesor', 'materia', 'fecha', 'rating'], name='comentario_aprobado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumencalificacion',
+            index=models.Index(fields=['profesor', 'fecha'], name='resumen_profesor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumencalificacion',
+            index=models.Index(fields=['materia', 'profesor'], name='resumen_materia_profesor_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def marcar_aprobados(apps, schema_editor):
+    # Las reseñas publicadas antes de la moderación asíncrona ya pasaron la revisión
+    Comentario = apps.get_model('review', 'Comentario')
+    Comentario.objects.filter(aprobado_por_ia=True).update(estado_moderacion='aprobado')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0010_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comentario',
+            name='estado_moderacion',
+            field=models.CharField(choices=[('pendiente', 'Pendiente de moderación'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado')], default='pendiente', max_length=10),
+        ),
+        migrations.RunPython(marcar_aprobados, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='TareaModeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('fallida', 'Fallida')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('disponible_en', models.DateTimeField()),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('comentario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tarea_moderacion', to='review.comentario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'disponible_en'], name='tarea_moderacion_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0011_moderacion_asincrona'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VeredictoModeracion',
+            fields=[
+                ('clave', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('aprobado', models.BooleanField()),
+                ('creado', models.DateTimeField()),
+                ('aciertos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['creado'], name='veredicto_creado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def encolar_pendientes(apps, schema_editor):
+    # La migración 0011 dejó como pendientes las reseñas no aprobadas (y import_reviews las
+    # importaba así) sin crear su tarea, así que el worker de moderación nunca las veía
+    Comentario = apps.get_model('review', 'Comentario')
+    TareaModeracion = apps.get_model('review', 'TareaModeracion')
+    ahora = timezone.now()
+    sin_tarea = Comentario.objects.filter(estado_moderacion='pendiente', tarea_moderacion__isnull=True)
+    TareaModeracion.objects.bulk_create(
+        (TareaModeracion(comentario_id=pk, disponible_en=ahora) for pk in sin_tarea.values_list('pk', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0012_veredictos_moderacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(encolar_pendientes, migrations.RunPython.noop),
+    ]
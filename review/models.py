@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
-from profesores.models import Profesor
-from django.db.models.signals import post_save, post_delete
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
+from .estadisticas import estado_comentario, registrar_cambio, reasignar_resumenes_materia
 
 
 class Comentario(models.Model):
@@ -30,28 +31,143 @@ class Comentario(models.Model):
     rating = models.IntegerField(choices=((1, '1 Estrella'), (2, '2 Estrellas'), 
                                           (3, '3 Estrellas'), (4, '4 Estrellas'), 
                                           (5, '5 Estrellas')), default=1)
+    PENDIENTE = 'pendiente'
+    APROBADO = 'aprobado'
+    RECHAZADO = 'rechazado'
+    ESTADOS_MODERACION = [
+        (PENDIENTE, 'Pendiente de moderación'),
+        (APROBADO, 'Aprobado'),
+        (RECHAZADO, 'Rechazado'),
+    ]
     aprobado_por_ia = models.BooleanField(default=False)
+    # Resultado de la moderación (ver moderacion.py); solo los aprobados se publican y cuentan
+    # en las estadísticas, a través de aprobado_por_ia
+    estado_moderacion = models.CharField(max_length=10, choices=ESTADOS_MODERACION, default=PENDIENTE)
     anonimo = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Filtros de los comentarios en el detalle del profesor. Es parcial: solo incluye
+            # las reseñas aprobadas, que son las únicas que se muestran y se agregan
+            models.Index(
+                fields=['profesor', 'materia', 'fecha', 'rating'],
+                condition=models.Q(aprobado_por_ia=True),
+                name='comentario_aprobado_idx',
+            ),
+        ]
+
     def __str__(self):
         return f'Comentario de {self.usuario} sobre {self.profesor}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guarda el estado leído de la base de datos para saber qué cambió al editar.
+        instance = super().from_db(db, field_names, values)
+        instance._estado_original = estado_comentario(instance)
+        return instance
+
+
+class ResumenCalificacion(models.Model):
+    # Resumen de las reseñas aprobadas por (profesor, materia, semestre).
+    # Lo mantienen los signals de Comentario de forma incremental, y de aquí salen las
+    # gráficas y estadísticas sin recorrer la tabla de comentarios.
+    profesor = models.ForeignKey('profesores.Profesor', related_name='resumenes', on_delete=models.CASCADE)
+    materia = models.ForeignKey('profesores.Materia', related_name='resumenes', on_delete=models.CASCADE, null=True, blank=True)
+    fecha = models.CharField(max_length=7, choices=Comentario.SEMESTRES)
+    suma = models.IntegerField(default=0)
+    cantidad = models.IntegerField(default=0)
+    # Histograma: cantidad de reseñas con cada número de estrellas
+    estrellas_1 = models.IntegerField(default=0)
+    estrellas_2 = models.IntegerField(default=0)
+    estrellas_3 = models.IntegerField(default=0)
+    estrellas_4 = models.IntegerField(default=0)
+    estrellas_5 = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Coalesce para que las reseñas sin materia también tengan una sola fila
+            models.UniqueConstraint(
+                models.F('profesor'),
+                Coalesce(models.F('materia'), models.Value(0), output_field=models.IntegerField()),
+                models.F('fecha'),
+                name='resumen_unico_por_profesor_materia_semestre',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['materia', 'fecha'], name='resumen_materia_fecha_idx'),
+            # Semestres y promedios por semestre de un profesor, agrupados en el orden del índice
+            models.Index(fields=['profesor', 'fecha'], name='resumen_profesor_fecha_idx'),
+            # Promedio de cada profesor en una materia (gráfica de dispersión)
+            models.Index(fields=['materia', 'profesor'], name='resumen_materia_profesor_idx'),
+        ]
+
+    def __str__(self):
+        return f'Resumen de {self.profesor} en {self.materia} ({self.fecha})'
+
+
+class TareaModeracion(models.Model):
+    # Cola de moderación en la base de datos: una fila por reseña que espera su revisión.
+    # El comando moderate_reviews las toma, las revisa y borra las terminadas; las que
+    # agotan los reintentos quedan como fallidas.
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (FALLIDA, 'Fallida'),
+    ]
+    comentario = models.OneToOneField(Comentario, related_name='tarea_moderacion', on_delete=models.CASCADE)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    # Pendiente: desde cuándo se puede tomar (los reintentos esperan). En proceso: hasta
+    # cuándo la tiene el worker que la tomó; vencido ese plazo otro worker la puede retomar.
+    disponible_en = models.DateTimeField()
+    ultimo_error = models.TextField(blank=True, default='')
+    creada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_moderacion_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f'Moderación de {self.comentario_id} ({self.estado})'
+
+
+class VeredictoModeracion(models.Model):
+    # Veredicto ya obtenido para un contenido (ver CacheVeredictos en aprobadores.py). La clave
+    # es el hash del contenido normalizado y de la versión del aprobador (modelo y prompt).
+    clave = models.CharField(max_length=64, primary_key=True)
+    aprobado = models.BooleanField()
+    creado = models.DateTimeField()
+    # Veces que se respondió desde la caché en lugar de llamar a la API
+    aciertos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Vencimiento y desalojo de los más antiguos
+            models.Index(fields=['creado'], name='veredicto_creado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{'Aprobado' if self.aprobado else 'Rechazado'} ({self.clave[:12]})"
+
+
 @receiver(post_save, sender=Comentario)
-def actualizar_calificacion_media(sender, instance, **kwargs):
-    profesor = instance.profesor
-    comentarios = Comentario.objects.filter(profesor=profesor)
-    promedio = comentarios.aggregate(models.Avg('rating'))['rating__avg']
-    profesor.calificacion_media = promedio if promedio is not None else 0.0
-    cantidad_de_comentarios = comentarios.count()
-    profesor.numcomentarios = cantidad_de_comentarios
-    profesor.save()
+def actualizar_calificacion_media(sender, instance, created, **kwargs):
+    # Aplica solo la diferencia entre el estado anterior y el nuevo de la reseña (O(1)).
+    anterior = None if created else getattr(instance, '_estado_original', None)
+    nuevo = estado_comentario(instance)
+    registrar_cambio(anterior, nuevo)
+    instance._estado_original = nuevo
 
 @receiver(post_delete, sender=Comentario)
 def actualizar_calificacion_media_eliminar(sender, instance, **kwargs):
-    profesor = instance.profesor
-    comentarios = Comentario.objects.filter(profesor=profesor)
-    promedio = comentarios.aggregate(models.Avg('rating'))['rating__avg']
-    profesor.calificacion_media = promedio if promedio is not None else 0.0
-    cantidad_de_comentarios = comentarios.count()
-    profesor.numcomentarios = cantidad_de_comentarios
-    profesor.save()
\ No newline at end of file
+    anterior = getattr(instance, '_estado_original', None) or estado_comentario(instance)
+    registrar_cambio(anterior, None)
+
+
+@receiver(pre_delete, sender='profesores.Materia')
+def conservar_resumenes_materia(sender, instance, **kwargs):
+    reasignar_resumenes_materia(instance.pk)
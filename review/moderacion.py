@@ -0,0 +1,171 @@
+"""
+Moderación asíncrona de reseñas.
+Revisar una reseña con la API de OpenAI tarda segundos. Si se hiciera dentro de la petición,
+el worker web y la transacción de escritura de SQLite quedarían ocupados todo ese tiempo y
+bloquearían a los demás escritores. Por eso ComentarioFacade guarda la reseña como pendiente
+(aprobado_por_ia=False, así que no se publica ni cuenta en las estadísticas) y la encola con
+encolar(), en la misma transacción.
+
+El comando moderate_reviews corre como un proceso aparte con un Moderador. El Moderador
+toma tareas de la cola TareaModeracion, hace las llamadas a la API en un pool de hilos de
+tamaño MODERACION_CONCURRENCIA y escribe cada resultado en el hilo principal con una
+transacción corta. Al aprobar una reseña, aprobado_por_ia pasa a True y el signal de
+Comentario suma su calificación a las estadísticas. Una llamada que falla se reintenta más
+tarde con espera exponencial, y tras MODERACION_MAX_INTENTOS la tarea queda como fallida.
+Si la API no está disponible (ProveedorNoDisponible) la tarea se aplaza sin gastar un intento.
+
+Para tomar una tarea se hace un UPDATE condicionado a su estado y disponible_en, así que
+dos workers nunca toman la misma. Mientras la tarea está en proceso, disponible_en indica
+el plazo del worker: si el worker muere, otro la retoma al vencer ese plazo.
+"""
+
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .aprobadores import ProveedorNoDisponible
+from .models import Comentario, TareaModeracion
+
+
+def encolar(comentario):
+    # Deja la reseña (ya guardada como pendiente) en la cola, o la reinicia si ya estaba
+    TareaModeracion.objects.update_or_create(
+        comentario=comentario,
+        defaults={
+            'estado': TareaModeracion.PENDIENTE,
+            'intentos': 0,
+            'disponible_en': timezone.now(),
+            'ultimo_error': '',
+        },
+    )
+
+
+def tomar(cantidad, plazo):
+    # Toma hasta `cantidad` tareas: las pendientes cuya espera terminó y las en proceso cuyo
+    # plazo venció. Retorna las tareas tomadas, con su comentario.
+    ahora = timezone.now()
+    disponibles = (
+        TareaModeracion.objects
+        .filter(estado__in=(TareaModeracion.PENDIENTE, TareaModeracion.EN_PROCESO), disponible_en__lte=ahora)
+        .order_by('disponible_en')
+        .values_list('pk', 'estado', 'disponible_en')[:cantidad]
+    )
+    tomadas = [
+        pk for pk, estado, disponible_en in disponibles
+        # Si otro worker la tomó primero, su estado o su plazo ya no coinciden
+        if TareaModeracion.objects.filter(pk=pk, estado=estado, disponible_en=disponible_en).update(
+            estado=TareaModeracion.EN_PROCESO,
+            disponible_en=ahora + timedelta(seconds=plazo),
+            intentos=F('intentos') + 1,
+        )
+    ]
+    return list(TareaModeracion.objects.filter(pk__in=tomadas).select_related('comentario'))
+
+
+def reintentar_fallidas():
+    # Devuelve a la cola las tareas que agotaron sus intentos; retorna cuántas
+    return TareaModeracion.objects.filter(estado=TareaModeracion.FALLIDA).update(
+        estado=TareaModeracion.PENDIENTE, intentos=0, disponible_en=timezone.now(),
+    )
+
+
+class Moderador:
+    # Procesa la cola con un aprobador (ver aprobadores.py). Solo las llamadas al aprobador
+    # van a los hilos del pool; la cola y las reseñas se leen y escriben en el hilo que llama
+    # a ejecutar().
+
+    def __init__(self, aprobador, concurrencia=None, max_intentos=None, plazo=None, reintento_base=None):
+        self.aprobador = aprobador
+        self.concurrencia = concurrencia or settings.MODERACION_CONCURRENCIA
+        self.max_intentos = max_intentos or settings.MODERACION_MAX_INTENTOS
+        self.plazo = plazo or settings.MODERACION_PLAZO
+        self.reintento_base = settings.MODERACION_REINTENTO_BASE if reintento_base is None else reintento_base
+        self.conteo = Counter()
+        self.detenido = False
+
+    def detener(self):
+        # Deja de tomar tareas; ejecutar() retorna cuando terminan las que están en curso
+        self.detenido = True
+
+    def ejecutar(self, hasta_vaciar=True, espera=1.0):
+        # Con hasta_vaciar retorna cuando no quedan tareas disponibles; si no, espera nuevas
+        # (consultando cada `espera` segundos) hasta que se llame a detener().
+        en_curso = {}
+        with ThreadPoolExecutor(self.concurrencia, thread_name_prefix='moderacion') as pool:
+            while True:
+                libres = self.concurrencia - len(en_curso)
+                if libres and not self.detenido:
+                    for tarea in tomar(libres, self.plazo):
+                        en_curso[pool.submit(self._aprobar, tarea.comentario.contenido)] = tarea
+                if not en_curso:
+                    if hasta_vaciar or self.detenido:
+                        return self.conteo
+                    time.sleep(espera)
+                    continue
+                terminadas, _ = wait(en_curso, timeout=espera, return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    tarea = en_curso.pop(futuro)
+                    try:
+                        aprobado = futuro.result()
+                    except Exception as e:
+                        self._fallo(tarea, e)
+                    else:
+                        self._resolver(tarea, aprobado)
+
+    def _aprobar(self, contenido):
+        # Corre en un hilo del pool. Si el aprobador usó la base de datos (la caché de
+        # veredictos), se cierra la conexión de este hilo en lugar de dejarla abierta
+        try:
+            return self.aprobador.aprobar(contenido)
+        finally:
+            connections.close_all()
+
+    def _sigue_siendo_nuestra(self, tarea):
+        # Filtro de la tarea tal como la tomamos: si la reseña se editó (y se volvió a encolar)
+        # o si se venció el plazo y otro worker la retomó, el resultado ya no aplica
+        return TareaModeracion.objects.filter(
+            pk=tarea.pk, estado=TareaModeracion.EN_PROCESO, disponible_en=tarea.disponible_en,
+        )
+
+    def _resolver(self, tarea, aprobado):
+        with transaction.atomic():
+            borradas, _ = self._sigue_siendo_nuestra(tarea).delete()
+            comentario = Comentario.objects.filter(pk=tarea.comentario_id).first()
+            if not borradas or comentario is None:
+                self.conteo['descartadas'] += 1
+                return
+            comentario.aprobado_por_ia = bool(aprobado)
+            comentario.estado_moderacion = Comentario.APROBADO if aprobado else Comentario.RECHAZADO
+            # El signal de post_save aplica a las estadísticas la diferencia con el estado anterior
+            comentario.save(update_fields=['aprobado_por_ia', 'estado_moderacion'])
+        self.conteo['aprobadas' if aprobado else 'rechazadas'] += 1
+
+    def _fallo(self, tarea, error):
+        ultimo_error = f'{type(error).__name__}: {error}'[:1000]
+        if isinstance(error, ProveedorNoDisponible):
+            # La API no está disponible (circuito abierto o sin respuesta): la tarea se aplaza
+            # sin gastar uno de sus intentos, que son para los errores de la propia reseña
+            cambios = {
+                'estado': TareaModeracion.PENDIENTE,
+                'intentos': F('intentos') - 1,
+                'disponible_en': timezone.now() + timedelta(seconds=self.reintento_base),
+            }
+            self.conteo['aplazadas'] += 1
+        elif tarea.intentos >= self.max_intentos:
+            cambios = {'estado': TareaModeracion.FALLIDA}
+            self.conteo['fallidas'] += 1
+        else:
+            # Espera exponencial: reintento_base, el doble, el cuádruple...
+            espera = self.reintento_base * 2 ** (tarea.intentos - 1)
+            cambios = {
+                'estado': TareaModeracion.PENDIENTE,
+                'disponible_en': timezone.now() + timedelta(seconds=espera),
+            }
+            self.conteo['reintentos'] += 1
+        self._sigue_siendo_nuestra(tarea).update(ultimo_error=ultimo_error, **cambios)
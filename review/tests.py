@@ -1,3 +1,688 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from profesores.models import Profesor, Materia, puntaje_bayesiano
+from . import agregaciones, moderacion
+from .aprobadores import (
+    AprobadorDegradado, AprobadorPorLotes, CacheVeredictos, ComentarioAprobador, ComentarioAprobadorIA,
+    FiltroLexico, ProveedorNoDisponible, ProveedorResiliente, RespuestaLoteInvalida, construir_aprobador,
+    obtener_lotes,
+)
+from .lexico import Lexico, normalizar
+from .facades import ComentarioFacade
+from .models import Comentario, ResumenCalificacion, TareaModeracion, VeredictoModeracion
+
+
+def crear_comentario(profesor, usuario, rating, aprobado=True):
+    return Comentario.objects.create(
+        profesor=profesor,
+        usuario=usuario,
+        contenido='Comentario de prueba',
+        rating=rating,
+        aprobado_por_ia=aprobado,
+    )
+
+
+class EstadisticasIncrementalesTests(TestCase):
+    # Los signals aplican la diferencia de cada escritura a suma_ratings/numcomentarios.
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estudiante', password='clave')
+        self.profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+
+    def test_crear_editar_y_eliminar(self):
+        primero = crear_comentario(self.profesor, self.usuario, 5)
+        crear_comentario(self.profesor, self.usuario, 2)
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.suma_ratings, self.profesor.numcomentarios), (7, 2))
+        self.assertAlmostEqual(self.profesor.calificacion_media, 3.5)
+
+        # Editar aplica solo la diferencia entre el rating anterior y el nuevo
+        primero = Comentario.objects.get(pk=primero.pk)
+        primero.rating = 3
+        primero.save()
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.suma_ratings, self.profesor.numcomentarios), (5, 2))
+        self.assertAlmostEqual(self.profesor.calificacion_media, 2.5)
+
+        self.assertAlmostEqual(self.profesor.puntaje_bayesiano, puntaje_bayesiano(5, 2))
+
+        primero.delete()
+        Comentario.objects.get(rating=2).delete()
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.suma_ratings, self.profesor.numcomentarios), (0, 0))
+        self.assertEqual(self.profesor.calificacion_media, 0.0)
+        self.assertAlmostEqual(self.profesor.puntaje_bayesiano, puntaje_bayesiano(0, 0))
+
+    def test_histograma_del_profesor(self):
+        for rating in (5, 5, 4, 2):
+            crear_comentario(self.profesor, self.usuario, rating)
+        Comentario.objects.filter(rating=2).get().delete()
+        self.profesor.refresh_from_db()
+        self.assertEqual(self.profesor.histograma(), [(4, 1), (5, 2)])
+        self.assertEqual(self.profesor.histograma(), agregaciones.conteo_ratings(profesor=self.profesor))
+        self.assertEqual((self.profesor.percentil(25), self.profesor.mediana), (4, 5))
+
+    def test_mover_comentario_a_otro_profesor(self):
+        otro = Profesor.objects.create(nombre='Luis Gómez', departamento='Ingeniería')
+        comentario = crear_comentario(self.profesor, self.usuario, 4)
+        comentario.profesor = otro
+        comentario.save()
+        self.profesor.refresh_from_db()
+        otro.refresh_from_db()
+        self.assertEqual((self.profesor.suma_ratings, self.profesor.numcomentarios), (0, 0))
+        self.assertEqual((otro.suma_ratings, otro.numcomentarios), (4, 1))
+
+    def test_solo_cuentan_los_aprobados(self):
+        comentario = crear_comentario(self.profesor, self.usuario, 1, aprobado=False)
+        self.profesor.refresh_from_db()
+        self.assertEqual(self.profesor.numcomentarios, 0)
+
+        comentario.aprobado_por_ia = True
+        comentario.save()
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.suma_ratings, self.profesor.numcomentarios), (1, 1))
+
+
+class ResumenCalificacionTests(TestCase):
+    # Los resúmenes por (profesor, materia, semestre) siguen a las reseñas y alimentan las agregaciones.
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estudiante', password='clave')
+        self.profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+        self.materia = Materia.objects.create(nombre='Cálculo')
+
+    def test_resumenes_y_agregaciones(self):
+        for rating, fecha in ((5, '2024-1'), (3, '2024-1'), (4, '2024-2')):
+            Comentario.objects.create(
+                profesor=self.profesor, materia=self.materia, usuario=self.usuario,
+                contenido='Comentario de prueba', rating=rating, fecha=fecha, aprobado_por_ia=True,
+            )
+        self.assertEqual(
+            agregaciones.promedios_por_semestre(profesor=self.profesor),
+            [('2024-1', 4.0, 2), ('2024-2', 4.0, 1)],
+        )
+        self.assertEqual(agregaciones.conteo_ratings(materia=self.materia), [(3, 1), (4, 1), (5, 1)])
+        self.assertEqual(agregaciones.promedios_por_profesor(self.materia), [])
+
+        self.materia.refresh_from_db()
+        self.assertEqual((self.materia.suma_ratings, self.materia.numcomentarios), (12, 3))
+
+        # Al borrar la materia los resúmenes pasan a la fila sin materia
+        self.materia.delete()
+        resumen = ResumenCalificacion.objects.get(profesor=self.profesor, materia=None, fecha='2024-1')
+        self.assertEqual((resumen.suma, resumen.cantidad, resumen.estrellas_5), (8, 2, 1))
+
+
+class ReconciliarEstadisticasTests(TestCase):
+    # reconcile_stats reporta las estadísticas desfasadas y las corrige sin pisar deltas concurrentes.
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='estudiante')
+        self.profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+        self.materia = Materia.objects.create(nombre='Cálculo')
+        for rating in (5, 3):
+            Comentario.objects.create(
+                profesor=self.profesor, materia=self.materia, usuario=self.usuario,
+                contenido='Comentario de prueba', rating=rating, aprobado_por_ia=True,
+            )
+
+    def corromper(self):
+        # Escrituras que saltan los signals
+        Profesor.objects.filter(pk=self.profesor.pk).update(numcomentarios=7, estrellas_5=0)
+        Materia.objects.filter(pk=self.materia.pk).update(suma_ratings=1)
+        ResumenCalificacion.objects.all().delete()
+
+    def reconciliar(self, *args):
+        salida = io.StringIO()
+        call_command('reconcile_stats', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_reporte_dry_run_y_correccion(self):
+        self.assertIn('coinciden', self.reconciliar())
+        self.corromper()
+
+        salida = self.reconciliar('--dry-run')
+        self.assertIn('Diferencias: 1 profesores, 1 materias, 1 resúmenes', salida)
+        self.assertIn('numcomentarios 7 -> 2', salida)
+        self.assertIn('no se escribió nada', salida)
+        self.assertEqual(Profesor.objects.get().numcomentarios, 7)
+
+        self.assertIn('3 correcciones escritas', self.reconciliar())
+        self.profesor.refresh_from_db()
+        self.materia.refresh_from_db()
+        self.assertEqual((self.profesor.numcomentarios, self.profesor.estrellas_5, self.profesor.calificacion_media), (2, 1, 4.0))
+        self.assertEqual((self.materia.suma_ratings, self.materia.numcomentarios), (8, 2))
+        self.assertEqual(agregaciones.promedios_por_semestre(profesor=self.profesor), [('2024-2', 4.0, 2)])
+        self.assertIn('coinciden', self.reconciliar())
+
+    def test_no_pisa_un_delta_entre_la_deteccion_y_la_escritura(self):
+        from review.management.commands.reconcile_stats import Command
+
+        self.corromper()
+        detectar = Command._ejecutar
+
+        def detectar_y_resenar(comando, tareas, workers):
+            revisiones = detectar(comando, tareas, workers)
+            # Una reseña nueva aplica su delta después de que el comando leyó los valores
+            Comentario.objects.create(
+                profesor=self.profesor, materia=self.materia, usuario=self.usuario,
+                contenido='Comentario de prueba', rating=1, aprobado_por_ia=True,
+            )
+            return revisiones
+
+        with mock.patch.object(Command, '_ejecutar', detectar_y_resenar):
+            self.reconciliar()
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.numcomentarios, self.profesor.suma_ratings), (3, 9))
+
+
+class ReconciliarEnParaleloTests(TransactionTestCase):
+    # Con --workers los rangos se revisan en hilos, cada uno con su conexión (que cierra al terminar).
+    # Los hilos no ven las escrituras sin confirmar de un TestCase, por eso TransactionTestCase.
+
+    setUp = ReconciliarEstadisticasTests.setUp
+    corromper = ReconciliarEstadisticasTests.corromper
+    reconciliar = ReconciliarEstadisticasTests.reconciliar
+
+    def test_workers_en_hilos(self):
+        from review.management.commands.reconcile_stats import Command
+
+        self.corromper()
+        en_hilo = Command._en_hilo
+        hilos = []
+
+        def registrar(comando, funcion, rango):
+            revision = en_hilo(comando, funcion, rango)
+            hilos.append((threading.get_ident(), connection.connection is None))
+            return revision
+
+        with mock.patch.object(Command, '_en_hilo', registrar):
+            salida = self.reconciliar('--workers', '2', '--dry-run')
+        self.assertIn('Diferencias: 1 profesores, 1 materias, 1 resúmenes', salida)
+        # Un rango de profesores y uno de materias, fuera del hilo principal y con la conexión cerrada
+        self.assertEqual(len(hilos), 2)
+        self.assertNotIn(threading.get_ident(), [hilo for hilo, _ in hilos])
+        self.assertTrue(all(cerrada for _, cerrada in hilos))
+
+        with mock.patch.object(Command, '_en_hilo', registrar):
+            self.assertIn('3 correcciones escritas', self.reconciliar('--workers', '2'))
+        self.assertIn('coinciden', self.reconciliar('--workers', '2'))
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.numcomentarios, self.profesor.estrellas_5), (2, 1))
+        self.assertIn('coinciden', self.reconciliar())
+
+
+class ImportarResenasTests(TestCase):
+    # La importación masiva no pasa por los signals pero deja las estadísticas exactas.
+
+    def test_importar_jsonl(self):
+        User.objects.create_user('estudiante', password='clave')
+        profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+        materia = Materia.objects.create(nombre='Cálculo')
+        filas = [
+            {'profesor': profesor.id, 'materia': 'cálculo', 'usuario': 'estudiante',
+             'rating': rating, 'fecha': '2024-1', 'aprobado_por_ia': rating != 1}
+            for rating in (5, 4, 1)
+        ] + [{'profesor': 'Nadie', 'rating': 3, 'fecha': '2024-1'}]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as archivo:
+            archivo.write('\n'.join(json.dumps(fila) for fila in filas))
+        self.addCleanup(os.remove, archivo.name)
+
+        call_command('import_reviews', archivo.name, lote=2, stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(Comentario.objects.count(), 3)
+        profesor.refresh_from_db()
+        materia.refresh_from_db()
+        self.assertEqual((profesor.suma_ratings, profesor.numcomentarios, profesor.estrellas_5), (9, 2, 1))
+        self.assertEqual((materia.suma_ratings, materia.numcomentarios), (9, 2))
+        self.assertEqual(agregaciones.promedios_por_semestre(profesor=profesor), [('2024-1', 4.5, 2)])
+
+    def test_las_no_aprobadas_van_a_la_cola(self):
+        User.objects.create(username='estudiante')
+        profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+        filas = [
+            {'profesor': profesor.id, 'usuario': 'estudiante', 'contenido': 'Explica muy bien',
+             'rating': 5, 'fecha': '2024-1', 'aprobado_por_ia': False},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as archivo:
+            archivo.write('\n'.join(json.dumps(fila) for fila in filas))
+        self.addCleanup(os.remove, archivo.name)
+
+        call_command('import_reviews', archivo.name, stdout=io.StringIO(), stderr=io.StringIO())
+        comentario = Comentario.objects.get()
+        self.assertEqual(TareaModeracion.objects.get().comentario_id, comentario.pk)
+
+        with mock.patch('review.management.commands.moderate_reviews.construir_aprobador', AprobadorContador):
+            call_command('moderate_reviews', '--una-vez', stdout=io.StringIO())
+        comentario.refresh_from_db()
+        self.assertEqual((comentario.aprobado_por_ia, comentario.estado_moderacion), (True, Comentario.APROBADO))
+        self.assertFalse(TareaModeracion.objects.exists())
+        profesor.refresh_from_db()
+        self.assertEqual(profesor.numcomentarios, 1)
+
+    def test_sin_moderacion_no_encola(self):
+        User.objects.create(username='estudiante')
+        profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+        filas = [
+            {'profesor': profesor.id, 'usuario': 'estudiante', 'contenido': 'Explica muy bien',
+             'rating': rating, 'fecha': '2024-1', 'aprobado_por_ia': rating == 5}
+            for rating in (5, 2)
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as archivo:
+            archivo.write('\n'.join(json.dumps(fila) for fila in filas))
+        self.addCleanup(os.remove, archivo.name)
+
+        salida = io.StringIO()
+        call_command('import_reviews', archivo.name, '--sin-moderacion', stdout=salida, stderr=io.StringIO())
+        self.assertIn('0 en la cola de moderación', salida.getvalue())
+        self.assertFalse(TareaModeracion.objects.exists())
+        self.assertEqual(
+            sorted(Comentario.objects.values_list('rating', 'aprobado_por_ia', 'estado_moderacion')),
+            [(2, False, Comentario.RECHAZADO), (5, True, Comentario.APROBADO)],
+        )
+        profesor.refresh_from_db()
+        self.assertEqual(profesor.numcomentarios, 1)
+
+
+class ModeracionAsincronaTests(TestCase):
+    # Las reseñas se guardan pendientes y el worker las publica (o no) al moderarlas.
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='estudiante')
+        self.profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+
+    def crear(self, contenido, rating=4):
+        aprobador = mock.Mock()
+        exito, comentario, _ = ComentarioFacade(aprobador, moderacion_asincrona=True).crear_comentario(
+            {'contenido': contenido, 'rating': rating, 'fecha': '2024-1'}, self.profesor, self.usuario,
+        )
+        self.assertTrue(exito)
+        # La petición no espera a la API
+        aprobador.aprobar.assert_not_called()
+        return comentario
+
+    def test_publica_solo_las_aprobadas(self):
+        buena = self.crear('Explica muy bien', 5)
+        mala = self.crear('Contenido ofensivo', 1)
+        self.profesor.refresh_from_db()
+        self.assertEqual(self.profesor.numcomentarios, 0)
+        self.assertEqual(TareaModeracion.objects.count(), 2)
+
+        aprobador = mock.Mock()
+        aprobador.aprobar.side_effect = lambda contenido: 'ofensivo' not in contenido
+        conteo = moderacion.Moderador(aprobador, concurrencia=2).ejecutar()
+        self.assertEqual((conteo['aprobadas'], conteo['rechazadas']), (1, 1))
+        self.assertFalse(TareaModeracion.objects.exists())
+
+        buena.refresh_from_db()
+        mala.refresh_from_db()
+        self.assertEqual((buena.aprobado_por_ia, buena.estado_moderacion), (True, Comentario.APROBADO))
+        self.assertEqual((mala.aprobado_por_ia, mala.estado_moderacion), (False, Comentario.RECHAZADO))
+        self.profesor.refresh_from_db()
+        self.assertEqual((self.profesor.numcomentarios, self.profesor.suma_ratings), (1, 5))
+
+        # Editar el contenido la retira hasta volver a moderarla
+        ComentarioFacade(mock.Mock(), moderacion_asincrona=True).editar_comentario(
+            buena.pk, self.usuario, {'contenido': 'Explica bien, pero califica duro'},
+        )
+        self.profesor.refresh_from_db()
+        self.assertEqual(self.profesor.numcomentarios, 0)
+        self.assertEqual(TareaModeracion.objects.get().comentario_id, buena.pk)
+
+    def test_reintentos_y_fallidas(self):
+        comentario = self.crear('Explica muy bien')
+        aprobador = mock.Mock()
+        aprobador.aprobar.side_effect = [TimeoutError('sin respuesta'), True]
+
+        # El primer error deja la tarea esperando su reintento
+        moderador = moderacion.Moderador(aprobador, max_intentos=3, reintento_base=60)
+        self.assertEqual(moderador.ejecutar()['reintentos'], 1)
+        tarea = TareaModeracion.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), (TareaModeracion.PENDIENTE, 1))
+        self.assertGreater(tarea.disponible_en, timezone.now() + timedelta(seconds=50))
+        self.assertIn('sin respuesta', tarea.ultimo_error)
+
+        TareaModeracion.objects.update(disponible_en=timezone.now())
+        self.assertEqual(moderador.ejecutar()['aprobadas'], 1)
+        comentario.refresh_from_db()
+        self.assertTrue(comentario.aprobado_por_ia)
+
+        # Sin reintentos disponibles la tarea queda fallida, y se puede devolver a la cola
+        otro = self.crear('Clases amenas')
+        aprobador.aprobar.side_effect = TimeoutError('sin respuesta')
+        conteo = moderacion.Moderador(aprobador, max_intentos=2, reintento_base=0).ejecutar()
+        self.assertEqual((conteo['reintentos'], conteo['fallidas']), (1, 1))
+        self.assertEqual(TareaModeracion.objects.get(comentario=otro).estado, TareaModeracion.FALLIDA)
+        self.assertEqual(moderacion.reintentar_fallidas(), 1)
+
+        # Una tarea en proceso cuyo plazo venció (el worker murió) se retoma
+        TareaModeracion.objects.update(estado=TareaModeracion.EN_PROCESO, disponible_en=timezone.now())
+        aprobador.aprobar.side_effect = None
+        aprobador.aprobar.return_value = True
+        self.assertEqual(moderacion.Moderador(aprobador).ejecutar()['aprobadas'], 1)
+
+
+class AprobadorContador(ComentarioAprobador):
+    version = 'prueba-v1'
+
+    def __init__(self):
+        self.llamadas = []
+
+    def aprobar(self, comentario):
+        self.llamadas.append(comentario)
+        return 'ofensivo' not in comentario
+
+
+class CacheVeredictosTests(TestCase):
+    # Los contenidos ya revisados (sin distinguir mayúsculas ni espacios) no llaman a la API.
+
+    def test_aciertos_y_metricas(self):
+        interno = AprobadorContador()
+        cache = CacheVeredictos(interno, ttl=3600, maximo=100)
+        self.assertTrue(cache.aprobar('Explica muy bien'))
+        self.assertTrue(cache.aprobar('  explica   MUY bien '))
+        self.assertFalse(cache.aprobar('Algo ofensivo'))
+        self.assertFalse(cache.aprobar('algo ofensivo'))
+        # Las tildes cuentan: pueden cambiar el sentido de la palabra
+        cache.aprobar('Explica muy bién')
+        self.assertEqual(len(interno.llamadas), 3)
+
+        metricas = cache.metricas()
+        self.assertEqual((metricas['consultas'], metricas['aciertos'], metricas['llamadas_api']), (5, 2, 3))
+        self.assertAlmostEqual(metricas['tasa_aciertos'], 0.4)
+        self.assertEqual(sum(VeredictoModeracion.objects.values_list('aciertos', flat=True)), 2)
+
+        # Otra versión del prompt no reutiliza los veredictos
+        interno.version = 'prueba-v2'
+        CacheVeredictos(interno).aprobar('Explica muy bien')
+        self.assertEqual(len(interno.llamadas), 4)
+
+    def test_vencimiento_y_desalojo(self):
+        interno = AprobadorContador()
+        cache = CacheVeredictos(interno, ttl=3600, maximo=3)
+        cache.aprobar('Primera reseña')
+        VeredictoModeracion.objects.update(creado=timezone.now() - timedelta(hours=2))
+        cache.aprobar('Primera reseña')
+        self.assertEqual(len(interno.llamadas), 2)
+
+        # Con más de `maximo` veredictos se desalojan los más antiguos
+        for n in range(5):
+            cache.aprobar(f'Reseña número {n}')
+            VeredictoModeracion.objects.filter(pk=cache.clave(f'Reseña número {n}')).update(
+                creado=timezone.now() - timedelta(minutes=10 - n),
+            )
+        cache.podar()
+        self.assertEqual(VeredictoModeracion.objects.count(), 3)
+        cache.aprobar('Reseña número 4')
+        cache.aprobar('Reseña número 0')
+        self.assertEqual(len(interno.llamadas), 8)
+
+
+class AprobadorPorLotesTests(TestCase):
+    # Las llamadas concurrentes se revisan juntas y los veredictos vuelven a cada una.
+
+    def aprobar_en_hilos(self, aprobador, comentarios):
+        resultados = {}
+
+        def aprobar(comentario):
+            try:
+                resultados[comentario] = aprobador.aprobar(comentario)
+            except Exception as e:
+                resultados[comentario] = e
+
+        hilos = [threading.Thread(target=aprobar, args=(comentario,)) for comentario in comentarios]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    def test_lotes_y_respuesta_invalida(self):
+        interno = AprobadorContador()
+        lotes = []
+        interno.aprobar_lote = lambda comentarios: lotes.append(list(comentarios)) or [
+            'ofensivo' not in comentario for comentario in comentarios
+        ]
+        comentarios = [f'Reseña {n}' for n in range(5)] + ['Reseña ofensiva']
+        resultados = self.aprobar_en_hilos(AprobadorPorLotes(interno, tamano=3, ventana=5), comentarios)
+        self.assertEqual(resultados, {comentario: 'ofensivo' not in comentario for comentario in comentarios})
+        self.assertEqual(sorted(len(lote) for lote in lotes), [3, 3])
+        self.assertEqual(interno.llamadas, [])
+
+        # Con una respuesta inválida cada comentario se revisa por separado; un error los alcanza a todos
+        def invalida(comentarios):
+            raise RespuestaLoteInvalida('sin arreglo')
+        interno.aprobar_lote = invalida
+        lotes_aprobador = AprobadorPorLotes(interno, tamano=2, ventana=5)
+        resultados = self.aprobar_en_hilos(lotes_aprobador, ['Buena', 'Algo ofensivo'])
+        self.assertEqual(resultados, {'Buena': True, 'Algo ofensivo': False})
+        self.assertEqual(sorted(interno.llamadas), ['Algo ofensivo', 'Buena'])
+        self.assertEqual(lotes_aprobador.metricas()['lotes_invalidos'], 1)
+
+        interno.aprobar_lote = mock.Mock(side_effect=TimeoutError('sin respuesta'))
+        resultados = self.aprobar_en_hilos(AprobadorPorLotes(interno, tamano=2, ventana=5), ['Una', 'Otra'])
+        self.assertTrue(all(isinstance(resultado, TimeoutError) for resultado in resultados.values()))
+
+    @override_settings(MODERACION_LOTE_TAMANO=2, MODERACION_LOTE_VENTANA=5,
+                       MODERACION_CACHE=False, MODERACION_LEXICO='')
+    def test_un_solo_agrupador_por_proceso(self):
+        # Dos peticiones arman cada una su aprobador, pero sus reseñas van en la misma llamada
+        interno = AprobadorContador()
+        interno.aprobar_lote = mock.Mock(side_effect=lambda comentarios: [True] * len(comentarios))
+        with mock.patch('review.aprobadores._proveedor', interno), mock.patch('review.aprobadores._lotes', None):
+            resultados = {}
+
+            def revisar(comentario):
+                resultados[comentario] = construir_aprobador().aprobar(comentario)
+
+            hilos = [threading.Thread(target=revisar, args=(comentario,)) for comentario in ('Una', 'Otra')]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            self.assertIs(obtener_lotes(), obtener_lotes())
+        self.assertEqual(resultados, {'Una': True, 'Otra': True})
+        interno.aprobar_lote.assert_called_once()
+        self.assertEqual(sorted(interno.aprobar_lote.call_args.args[0]), ['Otra', 'Una'])
+
+    def test_prompt_de_lote(self):
+        def respuesta(contenido):
+            return {'choices': [{'message': {'content': contenido}}]}
+
+        openai = mock.Mock()
+        with mock.patch('review.aprobadores.obtener_openai', return_value=openai):
+            openai.ChatCompletion.create.return_value = respuesta('Veredictos: ["aprobado", "NO"]')
+            self.assertEqual(ComentarioAprobadorIA().aprobar_lote(['Buena', 'Línea 1\n2. Línea 2']), [True, False])
+            mensaje = openai.ChatCompletion.create.call_args.kwargs['messages'][1]['content']
+            self.assertIn('1. "Buena"', mensaje)
+            self.assertIn('2. "Línea 1\\n2. Línea 2"', mensaje)
+
+            for contenido in ('["aprobado"]', 'aprobado, no', '["aprobado", "tal vez"]'):
+                openai.ChatCompletion.create.return_value = respuesta(contenido)
+                with self.assertRaises(RespuestaLoteInvalida):
+                    ComentarioAprobadorIA().aprobar_lote(['Una', 'Otra'])
+
+
+class FiltroLexicoTests(TestCase):
+    # Los casos obvios se resuelven con el léxico; solo los dudosos llegan al aprobador.
+
+    def setUp(self):
+        self.lexico = Lexico([('bloquear', 'hijueputa*'), ('bloquear', 'puta'), ('revisar', 'mierda')])
+
+    def test_normalizacion_y_limites_de_palabra(self):
+        self.assertEqual(normalizar('  H1JUEPUT4AAAA,  Año  2024 '), 'hijueputa, ano 2024')
+        buscar = lambda texto: self.lexico.buscar(normalizar(texto))
+        self.assertEqual(buscar('Son unos hijueputas'), [('bloquear', 'hijueputa')])
+        self.assertEqual(buscar('¡PUTA!'), [('bloquear', 'puta')])
+        self.assertEqual(buscar('Usa la computadora, puta... no'), [('bloquear', 'puta')])
+        self.assertEqual(buscar('Computadora, disputa, putamadre'), [])
+
+    def test_caminos_y_metricas(self):
+        interno = AprobadorContador()
+        filtro = FiltroLexico(interno, lexico=self.lexico, aprobar_limpios=True, max_caracteres=50)
+        comentarios = [
+            'Explica muy bien',                  # limpio y corto: se aprueba
+            'Es un h1jueput4',                   # bloquear: se rechaza
+            'Una mierda de clase',               # revisar: va al aprobador
+            'Buen profesor ' * 5,                # largo: va al aprobador
+            'Ver www.ejemplo.com',               # enlace: va al aprobador
+        ]
+        self.assertEqual(filtro.aprobar_lote(comentarios), [True, False, True, True, True])
+        self.assertEqual(interno.llamadas, comentarios[2:])
+        self.assertFalse(filtro.aprobar('Algo ofensivo y muy largo para aprobarlo sin la IA, de verdad'))
+        metricas = filtro.metricas()
+        self.assertEqual(
+            (metricas['aprobadas'], metricas['rechazadas'], metricas['consultadas'], metricas['total']), (1, 1, 4, 6),
+        )
+
+        # Sin la aprobación rápida, todo lo que no se rechaza pasa por el aprobador
+        filtro = FiltroLexico(AprobadorContador(), lexico=self.lexico, aprobar_limpios=False)
+        filtro.aprobar('Explica muy bien')
+        self.assertEqual(filtro.aprobador.llamadas, ['Explica muy bien'])
+
+    def test_lexico_del_proyecto_en_microsegundos(self):
+        filtro = FiltroLexico(AprobadorContador())
+        self.assertFalse(filtro.aprobar('Ese man es un malparidoooo'))
+        self.assertTrue(filtro.aprobar('Buena clase, muy recomendado'))
+        self.assertEqual(filtro.aprobador.llamadas, [])
+        texto = 'La clase es buenísima, el profesor explica con ejemplos claros y los parciales son justos. ' * 3
+        for _ in range(1000):
+            filtro.clasificar(texto)
+        self.assertLess(filtro.metricas()['microsegundos_promedio'], 1000)
+
+
+class ProveedorResilienteTests(TestCase):
+    # Plazos, reintentos y circuito alrededor de la API, y la degradación mientras no responde.
+
+    def test_reintentos_plazo_y_circuito(self):
+        interno = mock.Mock(version='prueba-v1')
+        interno.aprobar.side_effect = [ConnectionError('caída'), ConnectionError('caída'), True]
+        proveedor = ProveedorResiliente(interno, timeout=1, plazo=5, reintentos=2, espera_base=0, umbral=3)
+        self.assertTrue(proveedor.aprobar('Explica muy bien'))
+        metricas = proveedor.metricas()
+        self.assertEqual((metricas['intentos'], metricas['errores'], metricas['reintentos']), (3, 2, 2))
+        self.assertEqual(sum(metricas['histograma_ms'].values()), 3)
+        self.assertEqual(metricas['estado'], ProveedorResiliente.CERRADO)
+
+        # Un intento que no responde se abandona al vencer su timeout
+        interno.aprobar.side_effect = lambda comentario: time.sleep(1)
+        proveedor = ProveedorResiliente(interno, timeout=0.05, plazo=0.1, reintentos=1, espera_base=0, umbral=5)
+        inicio = time.monotonic()
+        with self.assertRaises(ProveedorNoDisponible):
+            proveedor.aprobar('Explica muy bien')
+        self.assertLess(time.monotonic() - inicio, 0.5)
+        self.assertEqual(proveedor.metricas()['timeouts'], 2)
+
+        # Tras `umbral` fallos el circuito se abre y las llamadas no llegan a la API
+        interno.aprobar.side_effect = ConnectionError('caída')
+        proveedor = ProveedorResiliente(interno, reintentos=0, umbral=2, enfriamiento=0.1)
+        for _ in range(3):
+            with self.assertRaises(ProveedorNoDisponible):
+                proveedor.aprobar('Explica muy bien')
+        metricas = proveedor.metricas()
+        self.assertEqual((metricas['intentos'], metricas['rechazadas_circuito']), (2, 1))
+        self.assertEqual(metricas['estado'], ProveedorResiliente.ABIERTO)
+
+        # Al terminar el enfriamiento un intento de prueba exitoso lo cierra
+        time.sleep(0.15)
+        interno.aprobar.side_effect = None
+        interno.aprobar.return_value = True
+        self.assertTrue(proveedor.aprobar('Explica muy bien'))
+        self.assertEqual(proveedor.estado, ProveedorResiliente.CERRADO)
+
+    def test_politicas_de_degradacion(self):
+        caida = mock.Mock(version='prueba-v1')
+        caida.aprobar.side_effect = ProveedorNoDisponible('circuito abierto')
+        lexico = Lexico([('bloquear', 'hijueputa*'), ('revisar', 'mierda')])
+
+        with self.assertRaises(ProveedorNoDisponible):
+            AprobadorDegradado(caida, politica='encolar').aprobar('Explica muy bien')
+        self.assertTrue(AprobadorDegradado(caida, politica='manual').aprobar('Una mierda de clase'))
+
+        degradado = AprobadorDegradado(caida, politica='lexico', lexico=lexico)
+        self.assertTrue(degradado.aprobar('Explica muy bien'))
+        self.assertFalse(degradado.aprobar('Es un hijueputa'))
+        with self.assertRaises(ProveedorNoDisponible):
+            degradado.aprobar('Una mierda de clase')
+        self.assertEqual(degradado.metricas(), {'aprobadas': 1, 'rechazadas': 1, 'encoladas': 1})
+
+    def test_sin_api_la_resena_queda_en_la_cola(self):
+        usuario = User.objects.create(username='estudiante')
+        profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+        caida = mock.Mock(version='prueba-v1')
+        caida.aprobar.side_effect = ProveedorNoDisponible('circuito abierto')
+
+        # Con moderación síncrona, la fachada deja la reseña pendiente en lugar de fallar
+        exito, comentario, _ = ComentarioFacade(caida, moderacion_asincrona=False).crear_comentario(
+            {'contenido': 'Explica muy bien', 'rating': 5, 'fecha': '2024-1'}, profesor, usuario,
+        )
+        self.assertTrue(exito)
+        self.assertEqual(comentario.estado_moderacion, Comentario.PENDIENTE)
+
+        # El worker la aplaza sin gastar uno de sus intentos
+        conteo = moderacion.Moderador(caida, max_intentos=1, reintento_base=60).ejecutar()
+        self.assertEqual((conteo['aplazadas'], conteo['fallidas']), (1, 0))
+        tarea = TareaModeracion.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), (TareaModeracion.PENDIENTE, 0))
+
+
+class EstadisticasConcurrentesTests(TransactionTestCase):
+    # Muchos hilos escribiendo reseñas del mismo profesor no deben perder actualizaciones.
+
+    HILOS = 8
+    COMENTARIOS_POR_HILO = 25
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('estudiante', password='clave')
+        self.profesor = Profesor.objects.create(nombre='Ana Pérez', departamento='Ciencias')
+
+    def test_escrituras_concurrentes_son_exactas(self):
+        errores = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def escribir(indice):
+            try:
+                barrera.wait()
+                for n in range(self.COMENTARIOS_POR_HILO):
+                    comentario = crear_comentario(self.profesor, self.usuario, (indice + n) % 5 + 1)
+                    if n % 5 == 0:
+                        # Mezclar ediciones con cambio de rating y eliminaciones
+                        comentario = Comentario.objects.get(pk=comentario.pk)
+                        comentario.rating = 5
+                        comentario.save()
+                    elif n % 7 == 0:
+                        comentario.delete()
+            except Exception as e:  # pragma: no cover - se reporta en el hilo principal
+                errores.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        esperados = Comentario.objects.filter(profesor=self.profesor, aprobado_por_ia=True)
+        suma = sum(esperados.values_list('rating', flat=True))
+        cantidad = esperados.count()
+
+        self.profesor.refresh_from_db()
+        self.assertEqual(self.profesor.numcomentarios, cantidad)
+        self.assertEqual(self.profesor.suma_ratings, suma)
+        self.assertAlmostEqual(self.profesor.calificacion_media, suma / cantidad)
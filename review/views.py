@@ -2,68 +2,28 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import Comentario
 from profesores.models import Profesor, Materia
+from profesores import busqueda
 from django.http import HttpResponseForbidden
 from django.contrib import messages
-import openai
-import os
 from account.models import UserProfile
 from django.contrib.auth.models import User
 from django.db.models import Avg
-from dotenv import load_dotenv, find_dotenv
 # Importar la Facade para usar el patrón Facade
 from .facades import ComentarioFacade
-
-_ = load_dotenv('keys.env')
-# Inicializar el cliente de OpenAI
-
-openai.api_key = os.environ.get('OPENAI_API_KEY')
+# Las estrategias de aprobación viven en aprobadores.py, donde openai se importa
+# solo cuando se revisa el primer comentario.
+from .aprobadores import (
+    ComentarioAprobador,
+    ComentarioAprobadorManual,
+    ComentarioAprobadorIA,
+    revisar_comentario_por_ia,
+)
 
 # Función para verificar si el usuario es administrador
 def is_admin(user):
     return user.is_staff
 
 
-class ComentarioAprobador:
-    def aprobar(self, comentario):
-        raise NotImplementedError("Debes implementar el método aprobar.")
-
-class ComentarioAprobadorManual(ComentarioAprobador):
-    def aprobar(self, comentario):
-        return True
-
-class ComentarioAprobadorIA(ComentarioAprobador):
-    def aprobar(self, comentario):
-        openai.api_key = os.environ.get('OPENAI_API_KEY')
-        respuesta = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Eres un asistente que revisa comentarios para identificar si contienen palabras ofensivas."},
-                {"role": "user", "content": f"Revisa el siguiente comentario y devuelve 'aprobado' si es apropiado o 'no' si contiene palabras ofensivas:\n\nComentario: \"{comentario}\""}
-            ],
-            max_tokens=3,
-            temperature=0
-        )
-        resultado = respuesta['choices'][0]['message']['content'].strip().lower()
-        return resultado == 'aprobado'
-
-
-def revisar_comentario_por_ia(contenido):    
-        respuesta = openai.ChatCompletion.create(
-        model="gpt-4",  
-        messages=[
-            {"role": "system", "content": "Eres un asistente que revisa comentarios para identificar si contienen palabras ofensivas."},
-            {"role": "user", "content": f"Revisa el siguiente comentario y devuelve 'aprobado' si es apropiado o 'no' si contiene palabras ofensivas:\n\nComentario: \"{contenido}\""}
-        ],
-        max_tokens=3,  # Reducido para ahorrar tokens
-        temperature=0
-    )
-        resultado = respuesta['choices'][0]['message']['content'].strip().lower()
-        if resultado.lower() == 'aprobado':
-            return True
-        else:
-            return False
-
-
 
 # Home con búsqueda de profesores
 def home(request):
@@ -71,20 +31,13 @@ def home(request):
     searchMateria = request.GET.get('searchMateria', '')
     searchDepartamento = request.GET.get('searchDepartamento', '')
 
-    # Inicialmente, selecciona todos los profesores
-    profesores = Profesor.objects.all()
-
-    # Filtra por nombre si se proporciona un valor
-    if searchNombre:
-        profesores = profesores.filter(nombre__icontains=searchNombre)
-    
-    # Filtra por materia si se proporciona un valor
-    if searchMateria:
-        profesores = profesores.filter(materia__icontains=searchMateria)
-    
-    # Filtra por departamento si se proporciona un valor
-    if searchDepartamento:
-        profesores = profesores.filter(departamento__icontains=searchDepartamento)
+    # Filtra por nombre, materias y departamento con el índice de búsqueda (sin distinguir tildes)
+    profesores = busqueda.filtrar(
+        Profesor.objects.all(),
+        nombre=searchNombre,
+        materia=searchMateria,
+        departamento=searchDepartamento,
+    )
 
     return render(request, 'home.html', {
         'profesores': profesores,
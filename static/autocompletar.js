@@ -0,0 +1,58 @@
+// Autocompletado de los campos <input data-autocompletar="URL">: mientras se escribe se piden
+// sugerencias al endpoint JSON y se muestran en un <datalist>. data-tipo limita el tipo de
+// sugerencia (profesor, materia, departamento) y data-navegar lleva a la página de la
+// sugerencia elegida en lugar de solo completar el texto.
+(function () {
+    const ESPERA_MS = 150;
+
+    function iniciar(input) {
+        const lista = document.createElement('datalist');
+        lista.id = input.id + '-sugerencias';
+        input.setAttribute('list', lista.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(lista);
+
+        let urls = {};
+        let temporizador = null;
+        let peticion = null;
+
+        input.addEventListener('input', function (evento) {
+            // Elegir una opción del datalist también dispara 'input'
+            if (input.dataset.navegar !== undefined && urls[input.value]) {
+                window.location.href = urls[input.value];
+                return;
+            }
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function () {
+                const texto = input.value.trim();
+                if (!texto) {
+                    lista.replaceChildren();
+                    return;
+                }
+                if (peticion) {
+                    peticion.abort();
+                }
+                peticion = new AbortController();
+                const parametros = new URLSearchParams({ q: texto });
+                if (input.dataset.tipo) {
+                    parametros.set('tipo', input.dataset.tipo);
+                }
+                fetch(input.dataset.autocompletar + '?' + parametros, { signal: peticion.signal })
+                    .then(function (respuesta) { return respuesta.json(); })
+                    .then(function (datos) {
+                        urls = {};
+                        lista.replaceChildren(...datos.resultados.map(function (sugerencia) {
+                            urls[sugerencia.texto] = sugerencia.url;
+                            const opcion = document.createElement('option');
+                            opcion.value = sugerencia.texto;
+                            opcion.label = sugerencia.tipo + ' · ' + sugerencia.comentarios + ' reseñas';
+                            return opcion;
+                        }));
+                    })
+                    .catch(function () { /* petición cancelada por otra más reciente */ });
+            }, ESPERA_MS);
+        });
+    }
+
+    document.querySelectorAll('input[data-autocompletar]').forEach(iniciar);
+})();
@@ -0,0 +1,60 @@
+// Modo de gráficas en el cliente: cada <canvas data-chart-url> pide los datos JSON
+// generados por ChartFactory.create_payload y los dibuja con Chart.js.
+(function () {
+    const COLOR = 'rgba(135, 206, 235, 0.8)';
+    const BORDE = 'rgba(0, 0, 0, 0.8)';
+
+    function configuracion(datos) {
+        switch (datos.type) {
+            case 'bar':
+            case 'frequency':
+                return {
+                    type: 'bar',
+                    data: {
+                        labels: datos.labels,
+                        datasets: [{ label: 'Frecuencia', data: datos.values, backgroundColor: COLOR, borderColor: BORDE, borderWidth: 1 }]
+                    },
+                    options: { scales: { y: { beginAtZero: true, ticks: { precision: 0 } } } }
+                };
+            case 'line':
+            case 'semester_line':
+                return {
+                    type: 'line',
+                    data: {
+                        labels: datos.labels,
+                        datasets: [{ label: 'Rating Promedio', data: datos.values, borderColor: 'blue', pointRadius: 4 }]
+                    },
+                    options: { plugins: { title: { display: Boolean(datos.title), text: datos.title } } }
+                };
+            case 'scatter':
+                // Cada punto es [nombre, promedio, cantidad]; el radio refleja la cantidad de reseñas
+                return {
+                    type: 'bubble',
+                    data: {
+                        labels: datos.points.map(p => p[0]),
+                        datasets: [{
+                            label: 'Calificación promedio',
+                            data: datos.points.map((p, i) => ({ x: i, y: p[1], r: Math.max(3, Math.sqrt(p[2]) * 3) })),
+                            backgroundColor: 'rgba(31, 119, 180, 0.5)'
+                        }]
+                    },
+                    options: {
+                        scales: { x: { ticks: { callback: (valor) => datos.points[valor] ? datos.points[valor][0] : '' } } }
+                    }
+                };
+            default:
+                return null;
+        }
+    }
+
+    document.querySelectorAll('canvas[data-chart-url]').forEach(function (canvas) {
+        fetch(canvas.dataset.chartUrl)
+            .then(respuesta => respuesta.ok ? respuesta.json() : null)
+            .then(function (datos) {
+                const config = datos && configuracion(datos);
+                if (config) {
+                    new Chart(canvas, config);
+                }
+            });
+    });
+})();